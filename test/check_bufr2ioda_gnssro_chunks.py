@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# regression test of the chunked decoding of ush/ioda/bufr2ioda/bufr2ioda_gnssro.py
+# a GNSS-RO tank is converted at once and chunk_size messages at a time, the
+# two IODA files must hold the same variables
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import netCDF4 as nc
+import numpy as np
+
+CYCLE_TYPE = 'gdas'
+
+
+def render_config(template, cycle, dump_dir, ioda_dir, chunk_size):
+    with open(template, 'r') as f:
+        text = f.read()
+    for pattern, value in [('{{ RUN }}', CYCLE_TYPE), ('{{ current_cycle | to_YMDH }}', cycle),
+                           ('{{ DMPDIR }}', dump_dir), ('{{ COM_OBS }}', ioda_dir)]:
+        text = text.replace(pattern, value)
+    config = json.loads(text)
+    config['chunk_size'] = chunk_size
+    return config
+
+
+def stage_tank(bufr_file, dump_dir, cycle):
+    # the converter reads $dump_directory/gdas.YYYYMMDD/HH/atmos/gdas.tHHz.gpsro.tm00.bufr_d
+    atmos_dir = os.path.join(dump_dir, f"{CYCLE_TYPE}.{cycle[0:8]}", cycle[8:10], 'atmos')
+    os.makedirs(atmos_dir, exist_ok=True)
+    tank = os.path.join(atmos_dir, f"{CYCLE_TYPE}.t{cycle[8:10]}z.gpsro.tm00.bufr_d")
+    if not os.path.lexists(tank):
+        os.symlink(os.path.abspath(bufr_file), tank)
+
+
+def variables(group, prefix=''):
+    for name, variable in group.variables.items():
+        yield f"{prefix}{name}", variable
+    for name, subgroup in group.groups.items():
+        yield from variables(subgroup, f"{prefix}{name}/")
+
+
+def compare(reference_file, chunked_file):
+    failures = []
+    with nc.Dataset(reference_file, 'r') as ncref, nc.Dataset(chunked_file, 'r') as ncchunk:
+        reference = dict(variables(ncref))
+        chunked = dict(variables(ncchunk))
+        if sorted(reference) != sorted(chunked):
+            return [f"{chunked_file}: variables {sorted(chunked)}, expected {sorted(reference)}"]
+        for name, variable in reference.items():
+            expected = variable[:]
+            actual = chunked[name][:]
+            if expected.shape != actual.shape:
+                failures.append(f"{name}: shape {actual.shape}, expected {expected.shape}")
+            elif not np.array_equal(np.ma.getmaskarray(expected), np.ma.getmaskarray(actual)):
+                failures.append(f"{name}: mask differs from the unchunked conversion")
+            elif not np.array_equal(np.ma.filled(expected), np.ma.filled(actual)):
+                failures.append(f"{name}: differs from the unchunked conversion")
+        logging.info(f"{os.path.basename(chunked_file)}: {len(reference)} variables compared")
+    return failures
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('gdasapp_dir', type=str, help='GDASApp source directory')
+    parser.add_argument('bufr_file', type=str, help='GNSS-RO BUFR tank')
+    parser.add_argument('cycle', type=str, help='cycle of the tank, YYYYMMDDHH')
+    parser.add_argument('work_dir', type=str, help='directory of the IODA files written by the test')
+    parser.add_argument('--chunk-size', type=int, default=10, help='number of messages decoded at a time')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.join(args.gdasapp_dir, 'ush', 'ioda', 'bufr2ioda'))
+    from wxflow import Logger
+    from bufr2ioda_gnssro import bufr_to_ioda
+
+    template = os.path.join(args.gdasapp_dir, 'parm', 'ioda', 'bufr2ioda', 'bufr2ioda_gnssro.json')
+    dump_dir = os.path.join(args.work_dir, 'dump')
+    stage_tank(args.bufr_file, dump_dir, args.cycle)
+
+    outputs = {}
+    for chunk_size in [0, args.chunk_size]:
+        ioda_dir = os.path.join(args.work_dir, f"chunk_size_{chunk_size}")
+        os.makedirs(ioda_dir, exist_ok=True)
+        bufr_to_ioda(render_config(template, args.cycle, dump_dir, ioda_dir, chunk_size),
+                     Logger('bufr2ioda_gnssro.py', level='INFO', colored_log=False))
+        outputs[chunk_size] = sorted(glob.glob(os.path.join(ioda_dir, '*.nc*')))
+
+    failures = []
+    if not outputs[0]:
+        failures.append(f"no IODA file written from {args.bufr_file}")
+    elif [os.path.basename(f) for f in outputs[0]] != [os.path.basename(f) for f in outputs[args.chunk_size]]:
+        failures.append(f"IODA files {outputs[args.chunk_size]}, expected the names of {outputs[0]}")
+    else:
+        for reference_file, chunked_file in zip(outputs[0], outputs[args.chunk_size]):
+            failures += compare(reference_file, chunked_file)
+
+    for failure in failures:
+        logging.error(failure)
+    sys.exit(1 if failures else 0)
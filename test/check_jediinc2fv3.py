@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# regression test of ush/jediinc2fv3.py
+# the delp and delz increments are compared to the original, level by level,
+# implementation kept below, in double precision, in single precision and
+# streamed over chunks of levels
+import argparse
+import logging
+import os
+import sys
+import netCDF4 as nc
+import numpy as np
+
+# relative tolerances, scaled by the largest increment; the original computed
+# the virtual temperatures in the single precision of the input fields
+TOLERANCES = {'float64': 1.0e-4, 'float32': 1.0e-3}
+
+
+def reference_fv3inc(ncges, ncin):
+    """delp and delz increments computed as in the original jediinc2fv3.py"""
+    ps_ges = ncges.variables['pressfc'][:]
+    t_ges = ncges.variables['tmp'][:]
+    q_ges = ncges.variables['spfh'][:]
+    tinc = 'T' if 'T' in ncin.variables else 't'
+    ps_inc = ncin.variables['ps'][:]
+    t_inc = ncin.variables[tinc][:]
+    q_inc = ncin.variables['sphum'][:]
+    nlevs, nlats, nlons = t_ges.shape[1:]
+
+    ps_anl = ps_ges + ps_inc
+
+    grav = 9.80665
+    airmw = 28.965
+    h2omw = 18.015
+    runiv = 8314.47
+    rdry = runiv/airmw
+    rvap = runiv/h2omw
+    cpdry = 3.5*rdry
+    fv = (rvap/rdry)-1
+    rdog = rdry/grav
+    kappa = rdry/cpdry
+    kap1 = kappa+1.0
+    kapr = 1.0/kappa
+
+    ak = ncges.getncattr('ak')
+    bk = ncges.getncattr('bk')
+
+    prsi_ges = np.zeros((nlevs+1, nlats, nlons), float)
+    prsi_anl = np.zeros((nlevs+1, nlats, nlons), float)
+    for k in range(0, nlevs+1):
+        prsi_ges[k, :, :] = ak[k]+bk[k]*ps_ges[:, :]
+        prsi_anl[k, :, :] = ak[k]+bk[k]*ps_anl[:, :]
+
+    delp_inc = np.zeros((nlevs, nlats, nlons), float)
+    prsl_ges = np.zeros((nlevs, nlats, nlons), float)
+    prsl_anl = np.zeros((nlevs, nlats, nlons), float)
+    for k in range(0, nlevs):
+        dbk = bk[k+1] - bk[k]
+        delp_inc[k, :, :] = ps_inc[:, :] * dbk
+        prsl_ges[k, :, :] = ((prsi_ges[k+1, :, :]**kap1 - prsi_ges[k, :, :]**kap1) / (kap1*(prsi_ges[k+1, :, :] - prsi_ges[k, :, :])))**kapr
+        prsl_anl[k, :, :] = ((prsi_anl[k+1, :, :]**kap1 - prsi_anl[k, :, :]**kap1) / (kap1*(prsi_anl[k+1, :, :] - prsi_anl[k, :, :])))**kapr
+
+    t_anl = t_ges + t_inc
+    q_anl = q_ges + q_inc
+    tv_ges = t_ges * (1.0 + fv*q_ges)
+    tv_anl = t_anl * (1.0 + fv*q_anl)
+
+    delz_inc = np.zeros((nlevs, nlats, nlons), float)
+    for k in range(0, nlevs):
+        if k == 0:
+            delz_ges = rdog * tv_ges[:, k, :, :] * np.log(prsl_ges[k, :, :]/prsi_ges[k+1, :, :])
+            delz_anl = rdog * tv_anl[:, k, :, :] * np.log(prsl_anl[k, :, :]/prsi_anl[k+1, :, :])
+        else:
+            delz_ges = rdog * tv_ges[:, k, :, :] * np.log(prsi_ges[k, :, :]/prsi_ges[k+1, :, :])
+            delz_anl = rdog * tv_anl[:, k, :, :] * np.log(prsi_anl[k, :, :]/prsi_anl[k+1, :, :])
+        delz_inc[k, :, :] = delz_anl - delz_ges
+
+    return {'delp_inc': delp_inc.astype(np.float32), 'delz_inc': delz_inc.astype(np.float32)}
+
+
+def compare(fv3inc, reference, tolerance):
+    failures = []
+    with nc.Dataset(fv3inc, 'r') as ncout:
+        for name, expected in reference.items():
+            actual = ncout.variables[name][:]
+            error = np.abs(actual - expected).max() / np.abs(expected).max()
+            logging.info(f"{os.path.basename(fv3inc)} {name}: max relative error {error:.3e}")
+            if error > tolerance:
+                failures.append(f"{fv3inc} {name}: relative error {error:.3e} > {tolerance:.1e}")
+    return failures
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('ush_dir', type=str, help='ush directory of GDASApp')
+    parser.add_argument('FV3background', type=str, help='Input FV3 background file')
+    parser.add_argument('FV3JEDIincrement', type=str, help='Input FV3-JEDI LatLon Increment File')
+    parser.add_argument('output_dir', type=str, help='Directory of the FV3 increments written by the test')
+    args = parser.parse_args()
+
+    sys.path.insert(0, args.ush_dir)
+    from jediinc2fv3 import jedi_inc_to_fv3
+
+    with nc.Dataset(args.FV3background, 'r') as ncges, nc.Dataset(args.FV3JEDIincrement, 'r') as ncin:
+        reference = reference_fv3inc(ncges, ncin)
+        nlevs = len(ncin.dimensions['lev'])
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    failures = []
+    fv3incs = []
+    for dtype, level_chunk in [(np.float64, None), (np.float64, max(nlevs // 3, 1)), (np.float32, None)]:
+        fv3inc = os.path.join(args.output_dir, f"fv_increment_{np.dtype(dtype).name}_{level_chunk or nlevs}.nc")
+        jedi_inc_to_fv3(args.FV3background, args.FV3JEDIincrement, fv3inc, dtype=dtype, level_chunk=level_chunk)
+        failures += compare(fv3inc, reference, TOLERANCES[np.dtype(dtype).name])
+        fv3incs.append(fv3inc)
+
+    # streaming over levels must not change the result
+    with nc.Dataset(fv3incs[0], 'r') as ncall, nc.Dataset(fv3incs[1], 'r') as ncchunk:
+        for name in ncall.variables:
+            if not np.array_equal(ncall.variables[name][:], ncchunk.variables[name][:]):
+                failures.append(f"{fv3incs[1]} {name}: differs from {fv3incs[0]}")
+
+    for failure in failures:
+        logging.error(failure)
+    sys.exit(1 if failures else 0)
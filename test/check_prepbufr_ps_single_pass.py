@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# regression test of the single-pass decoding of
+# ush/ioda/bufr2ioda/bufr2ioda_conventional_prepbufr_ps.py
+# a prepbufr file is converted with all subsets decoded at once and with one
+# decoding per subset (single_pass: false); the two IODA files must have the
+# same number of locations and the same hash for every variable
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import netCDF4 as nc
+import numpy as np
+
+CYCLE_TYPE = 'gdas'
+
+
+def render_config(template, cycle, dump_dir, ioda_dir, single_pass):
+    with open(template, 'r') as f:
+        text = f.read()
+    for pattern, value in [('{{ RUN }}', CYCLE_TYPE), ('{{ current_cycle | to_YMDH }}', cycle),
+                           ('{{ DMPDIR }}', dump_dir), ('{{ COM_OBS }}', ioda_dir)]:
+        text = text.replace(pattern, value)
+    config = json.loads(text)
+    config['single_pass'] = single_pass
+    return config
+
+
+def stage_prepbufr(prepbufr_file, dump_dir, cycle):
+    # the converter reads $dump_directory/gdas.YYYYMMDD/HH/atmos/gdas.tHHz.prepbufr
+    atmos_dir = os.path.join(dump_dir, f"{CYCLE_TYPE}.{cycle[0:8]}", cycle[8:10], 'atmos')
+    os.makedirs(atmos_dir, exist_ok=True)
+    prepbufr = os.path.join(atmos_dir, f"{CYCLE_TYPE}.t{cycle[8:10]}z.prepbufr")
+    if not os.path.lexists(prepbufr):
+        os.symlink(os.path.abspath(prepbufr_file), prepbufr)
+
+
+def variable_hashes(ioda_file):
+    """number of locations and sha256 of the values and mask of every variable"""
+    hashes = {}
+    with nc.Dataset(ioda_file, 'r') as ncf:
+        groups = [('', ncf)]
+        while groups:
+            prefix, group = groups.pop()
+            for name, variable in group.variables.items():
+                values = variable[:]
+                digest = hashlib.sha256()
+                digest.update(np.ascontiguousarray(np.ma.getmaskarray(values)).tobytes())
+                if values.dtype.kind in 'OSU':
+                    # strings are hashed by content, object arrays hold pointers
+                    digest.update('\0'.join(str(v) for v in np.ma.filled(values, '').ravel()).encode())
+                else:
+                    digest.update(np.ascontiguousarray(np.ma.filled(values)).tobytes())
+                hashes[f"{prefix}{name}"] = digest.hexdigest()
+            groups += [(f"{prefix}{name}/", subgroup) for name, subgroup in group.groups.items()]
+        locations = len(ncf.dimensions['Location'])
+    return locations, hashes
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('gdasapp_dir', type=str, help='GDASApp source directory')
+    parser.add_argument('prepbufr_file', type=str, help='prepbufr file with ADPSFC, SFCSHP and ADPUPA reports')
+    parser.add_argument('cycle', type=str, help='cycle of the prepbufr file, YYYYMMDDHH')
+    parser.add_argument('work_dir', type=str, help='directory of the IODA files written by the test')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.join(args.gdasapp_dir, 'ush', 'ioda', 'bufr2ioda'))
+    from wxflow import Logger
+    from bufr2ioda_conventional_prepbufr_ps import bufr_to_ioda
+
+    template = os.path.join(args.gdasapp_dir, 'parm', 'ioda', 'bufr2ioda', 'bufr2ioda_conventional_prepbufr_ps.json')
+    dump_dir = os.path.join(args.work_dir, 'dump')
+    stage_prepbufr(args.prepbufr_file, dump_dir, args.cycle)
+
+    results = {}
+    for mode, single_pass in [('per_subset', False), ('single_pass', True)]:
+        ioda_dir = os.path.join(args.work_dir, mode)
+        os.makedirs(ioda_dir, exist_ok=True)
+        bufr_to_ioda(render_config(template, args.cycle, dump_dir, ioda_dir, single_pass),
+                     Logger('bufr2ioda_conventional_prepbufr_ps.py', level='INFO', colored_log=False))
+        ioda_files = sorted(os.listdir(ioda_dir))
+        if len(ioda_files) != 1:
+            logging.error(f"{mode}: expected one IODA file in {ioda_dir}, found {ioda_files}")
+            sys.exit(1)
+        results[mode] = variable_hashes(os.path.join(ioda_dir, ioda_files[0]))
+
+    (reference_locations, reference), (locations, hashes) = results['per_subset'], results['single_pass']
+    failures = []
+    if locations != reference_locations:
+        failures.append(f"{locations} locations, {reference_locations} decoding each subset on its own")
+    for name in sorted(set(reference) | set(hashes)):
+        if reference.get(name) != hashes.get(name):
+            failures.append(f"{name}: hash {hashes.get(name)}, {reference.get(name)} decoding each subset on its own")
+    logging.info(f"{locations} locations, {len(reference)} variables compared")
+
+    for failure in failures:
+        logging.error(failure)
+    sys.exit(1 if failures else 0)
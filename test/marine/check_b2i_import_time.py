@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# benchmark of the import of the b2iconverter ocean basin lookup
+# every marine converter process pays for this import; the test fails if
+# the plotting stack is loaded with it. The import time is only reported,
+# wall-clock timings vary too much between machines to gate on, unless a
+# threshold is given with --max-seconds
+import argparse
+import json
+import logging
+import subprocess
+import sys
+
+# modules only needed to make plots, see b2iconverter/ocean_plot.py
+PLOTTING_MODULES = ['matplotlib', 'cartopy', 'xarray']
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import b2iconverter.ocean
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'modules': sorted(sys.modules)}))
+"""
+
+
+def time_import(b2i_dir):
+    # a fresh interpreter for each sample, the import is cached otherwise
+    result = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=b2i_dir,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def check_b2i_import_time(b2i_dir, max_seconds, repeat):
+    logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s', level=logging.INFO, datefmt='%Y-%m-%d %H:%M:%S')
+
+    samples = [time_import(b2i_dir) for _ in range(repeat)]
+    best = min(sample['seconds'] for sample in samples)
+    logging.info(f'import b2iconverter.ocean: best of {repeat} = {best:.3f} s')
+
+    nfailed = 0
+    loaded = [module for module in samples[0]['modules'] if module.split('.')[0] in PLOTTING_MODULES]
+    if loaded:
+        logging.error(f'plotting modules loaded by import b2iconverter.ocean: {", ".join(loaded)}')
+        nfailed += 1
+    if max_seconds is not None and best > max_seconds:
+        logging.error(f'import b2iconverter.ocean took {best:.3f} s, more than {max_seconds:.3f} s')
+        nfailed += 1
+    if nfailed > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('b2i_dir', type=str, help='directory of the b2iconverter package')
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help='largest accepted import time, the time is only reported if not given')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed imports')
+    args = parser.parse_args()
+    check_b2i_import_time(args.b2i_dir, args.max_seconds, args.repeat)
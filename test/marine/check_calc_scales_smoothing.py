@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# validation of the variable-sigma smoothing of ush/soca/calc_scales.py
+# the exact and banded row smoothings are compared to the original
+# implementation, one full 2-D gaussian filter per row, on a synthetic field
+import argparse
+import logging
+import sys
+import numpy as np
+from scipy.ndimage import gaussian_filter
+
+# relative tolerances, scaled by the range of the field
+TOLERANCES = {'exact': 1.0e-5, 'banded': 1.0e-2}
+
+
+def reference_smoothing(field, sigma):
+    smoothed = np.empty_like(field)
+    for j in range(field.shape[0]):
+        smoothed[j, :] = gaussian_filter(field, sigma=sigma[j], mode='nearest')[j, :]
+    return smoothed
+
+
+def synthetic_case(nj=180, ni=360):
+    # scales that shrink towards the poles, as the rossby radius, with noise
+    # and land cells filled with zeros
+    rng = np.random.default_rng(0)
+    lat = np.linspace(-80.0, 90.0, nj)
+    field = 200.0e3 * np.cos(np.deg2rad(lat))[:, np.newaxis] + 10.0e3 * rng.standard_normal((nj, ni))
+    field[rng.random((nj, ni)) < 0.3] = 0.0
+    sigma = 1.0 + 6.0 * np.cos(np.deg2rad(lat)) ** 2
+    return field.astype(np.float32), sigma
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('soca_ush_dir', type=str, help='ush/soca directory of GDASApp')
+    args = parser.parse_args()
+
+    sys.path.insert(0, args.soca_ush_dir)
+    from calc_scales import smooth_rows
+
+    field, sigma = synthetic_case()
+    reference = reference_smoothing(field, sigma)
+    scale = np.ptp(field)
+
+    failures = []
+    for method, tolerance in TOLERANCES.items():
+        error = np.abs(smooth_rows(field, sigma, method).astype(np.float64) - reference).max() / scale
+        logging.info(f"{method}: max relative error {error:.3e}")
+        if error > tolerance:
+            failures.append(f"{method}: relative error {error:.3e} > {tolerance:.1e}")
+
+    for failure in failures:
+        logging.error(failure)
+    sys.exit(1 if failures else 0)
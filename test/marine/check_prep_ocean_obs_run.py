@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# smoke test of PrepOceanObs.run on a stub conversion list
+# a stub converter stands for the ioda converters: it writes a small IODA
+# file for one obs space and fails for the other; only the successful
+# conversion must be saved, both must be in the conversion report
+import argparse
+import os
+import stat
+import sys
+import tempfile
+import yaml
+
+STUB_CONVERTER = """#!{python}
+import sys
+import netCDF4
+name = sys.argv[1].replace('2ioda.yaml', '')
+if name == 'failing':
+    sys.exit(3)
+with netCDF4.Dataset(name + '.nc4', 'w') as ncf:
+    ncf.createDimension('Location', 7)
+"""
+
+
+def stub_conversion_list(data_dir):
+    converter = os.path.join(data_dir, 'stub2ioda.py')
+    with open(converter, 'w') as f:
+        f.write(STUB_CONVERTER.format(python=sys.executable))
+    os.chmod(converter, os.stat(converter).st_mode | stat.S_IXUSR)
+
+    observations = []
+    for name in ['working', 'failing']:
+        input_file = f"{name}.nc"
+        with open(os.path.join(data_dir, input_file), 'wb') as f:
+            f.write(b'\0' * 1000)
+        observations.append({'obs space': {'name': name,
+                                           'type': 'nc',
+                                           'input files': [input_file],
+                                           'conversion config file': f"{name}2ioda.yaml",
+                                           'output file': f"{name}.nc4"}})
+    with open(os.path.join(data_dir, 'conversion_list.yaml'), 'w') as f:
+        yaml.safe_dump({'observations': observations}, f)
+    return converter
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('ush_dir', type=str, help='ush directory of GDASApp')
+    args = parser.parse_args()
+
+    sys.path.insert(0, args.ush_dir)
+    sys.path.insert(0, os.path.join(args.ush_dir, 'ioda', 'bufr2ioda'))
+    from wxflow import AttrDict
+    from soca.prep_ocean_obs import PrepOceanObs
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        converter = stub_conversion_list(data_dir)
+
+        # run() only needs the task configuration, skip the Task constructor
+        task = PrepOceanObs.__new__(PrepOceanObs)
+        task.task_config = AttrDict(DATA=data_dir,
+                                    COMIN_OBS=data_dir,
+                                    OCNOBS2IODAEXEC=converter,
+                                    conversion_list_file='conversion_list.yaml',
+                                    save_list_file='save_list.yaml',
+                                    conversion_report_file='conversion_report.yaml',
+                                    PREP_OCEAN_OBS_NPROC=2)
+        # the job runs the task from DATA (wxflow chdir is a context manager
+        # that run() calls bare), the ctest from its working directory
+        cwd = os.getcwd()
+        os.chdir(data_dir)
+        try:
+            task.run()
+        finally:
+            os.chdir(cwd)
+
+        with open(os.path.join(data_dir, 'save_list.yaml'), 'r') as f:
+            saved = [obs_space['name'] for obs_space in yaml.safe_load(f)['observations']]
+        with open(os.path.join(data_dir, 'conversion_report.yaml'), 'r') as f:
+            report = {record['name']: record for record in yaml.safe_load(f)['conversions']}
+
+    assert saved == ['working'], f"save list {saved}, expected ['working']"
+    assert report['working']['status'] == 'success' and report['working']['locations'] == 7, report['working']
+    assert report['failing']['status'] == 'failed' and report['failing']['return code'] == 3, report['failing']
+    print("PrepOceanObs.run smoke test passed")
@@ -19,23 +19,8 @@ from pyiodaconv import bufr
 from collections import namedtuple
 from pyioda import ioda_obs_space as ioda_ospace
 from wxflow import Logger
-
-
-def Compute_dateTime(cycleTimeSinceEpoch, dhr):
-
-    int64_fill_value = np.int64(0)
-
-    dateTime = np.zeros(dhr.shape, dtype=np.int64)
-    for i in range(len(dateTime)):
-        if ma.is_masked(dhr[i]):
-            continue
-        else:
-            dateTime[i] = np.int64(dhr[i]*3600) + cycleTimeSinceEpoch
-
-    dateTime = ma.array(dateTime)
-    dateTime = ma.masked_values(dateTime, int64_fill_value)
-
-    return dateTime
+from kernels import Compute_dateTime
+from prepbufr_utils import Mask_typ_for_var
 
 
 def Compute_typ_other(typ, var):
@@ -45,11 +30,7 @@ def Compute_typ_other(typ, var):
     typ_var[(typ_var > 400) & (typ_var < 500)] -= 300
     typ_var[(typ_var > 500) & (typ_var < 600)] -= 400
 
-    for i in range(len(typ_var)):
-        if ma.is_masked(var[i]):
-            typ_var[i] = typ_var.fill_value
-
-    return typ_var
+    return Mask_typ_for_var(typ_var, var)
 
 
 def Compute_typ_uv(typ, var):
@@ -59,11 +40,7 @@ def Compute_typ_uv(typ, var):
     typ_var[(typ_var > 400) & (typ_var < 500)] -= 200
     typ_var[(typ_var > 500) & (typ_var < 600)] -= 300
 
-    for i in range(len(typ_var)):
-        if ma.is_masked(var[i]):
-            typ_var[i] = typ_var.fill_value
-
-    return typ_var
+    return Mask_typ_for_var(typ_var, var)
 
 
 def bufr_to_ioda(config, logger):
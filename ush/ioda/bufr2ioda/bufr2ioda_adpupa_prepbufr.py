@@ -18,8 +18,10 @@ import os
 from datetime import datetime
 from pyioda import ioda_obs_space as ioda_ospace
 from wxflow import Logger
+from kernels import Compute_dateTime
 from pyiodaconv import bufr
 from collections import namedtuple
+from prepbufr_utils import Mask_typ_for_var
 import warnings
 # suppress warnings
 warnings.filterwarnings('ignore')
@@ -33,32 +35,6 @@ warnings.filterwarnings('ignore')
 # ====================================================================
 
 
-def Compute_dateTime(cycleTimeSinceEpoch, hrdr):
-
-    int64_fill_value = np.int64(0)
-    dateTime = np.zeros(hrdr.shape, dtype=np.int64)
-    for i in range(len(dateTime)):
-        if ma.is_masked(hrdr[i]):
-            continue
-        else:
-            dateTime[i] = np.int64(hrdr[i]*3600) + cycleTimeSinceEpoch
-
-    dateTime = ma.array(dateTime)
-    dateTime = ma.masked_values(dateTime, int64_fill_value)
-
-    return dateTime
-
-
-def Mask_typ_for_var(typ, var):
-
-    typ_var = copy.deepcopy(typ)
-    for i in range(len(typ_var)):
-        if ma.is_masked(var[i]):
-            typ_var[i] = typ.fill_value
-
-    return typ_var
-
-
 def bufr_to_ioda(config, logger):
 
     subsets = config["subsets"]
@@ -19,52 +19,47 @@ from pyiodaconv import bufr
 from collections import namedtuple
 from pyioda import ioda_obs_space as ioda_ospace
 from wxflow import Logger
-
-
-def Compute_dateTime(cycleTimeSinceEpoch, dhr):
-
-    int64_fill_value = np.int64(0)
-
-    dateTime = np.zeros(dhr.shape, dtype=np.int64)
-    for i in range(len(dateTime)):
-        if ma.is_masked(dhr[i]):
-            continue
-        else:
-            dateTime[i] = np.int64(dhr[i]*3600) + cycleTimeSinceEpoch
-
-    dateTime = ma.array(dateTime)
-    dateTime = ma.masked_values(dateTime, int64_fill_value)
-
-    return dateTime
-
-
-def Mask_typ_for_var(typ, var):
-
-    typ_var = copy.deepcopy(typ)
-    for i in range(len(typ_var)):
-        if ma.is_masked(var[i]):
-            typ_var[i] = typ.fill_value
-
-    return typ_var
-
-
-def Compute_ObsSubType(typ, t29):
-
-    obssubtype1 = np.array([], dtype=np.int32)
-
-    for i in range(len(typ)):
-        if ((typ[i] == 180) or (typ[i] == 280)):
-            if (t29[i] > 555) and (t29[i] < 565):
-                obssubtype1 = np.append(obssubtype1, 0)
-            else:
-                obssubtype1 = np.append(obssubtype1, 1)
-        else:
-            obssubtype1 = np.append(obssubtype1, 0)
-
-    obssubtype = ma.array(obssubtype1)
-    obssubtype = ma.masked_values(obssubtype, typ.fill_value)
-
-    return obssubtype
+from kernels import Compute_dateTime
+from prepbufr_utils import subset_arrays, Mask_typ_for_var, Compute_ObsSubType
+
+
+class SubsetResultSet:
+    """
+    View of a ResultSet obtained from a QuerySet spanning several subsets.
+
+    Fields of each subset are added to the QuerySet as '<subset>_<name>'
+    with queries rooted at the subset mnemonic, so a field is missing in
+    every message that belongs to another subset. get() mimics
+    ResultSet.get() for one subset and drops those foreign rows, using the
+    'key' field (always present in the subset) to tell them apart. Without
+    a key (a ResultSet of this subset alone), no row is dropped.
+    """
+
+    def __init__(self, resultset, subset, key, logger):
+        self.resultset = resultset
+        self.subset = subset
+        self.key = key
+        self.logger = logger
+        self.rows = {}
+
+    def _name(self, name):
+        return f"{self.subset}_{name}" if name else name
+
+    def _get(self, name, group_by='', type=''):
+        if type:
+            return self.resultset.get(self._name(name), self._name(group_by), type=type)
+        return self.resultset.get(self._name(name), self._name(group_by))
+
+    def get(self, name, group_by='', type=''):
+        if self.key is None:
+            return self._get(name, group_by, type)
+        if group_by not in self.rows:
+            rows = ~ma.getmaskarray(self._get(self.key, group_by))
+            self.logger.info(f"{self.subset}: {np.count_nonzero(rows)} rows kept, "
+                             f"{rows.size - np.count_nonzero(rows)} rows of other subsets dropped"
+                             f"{' (grouped by ' + group_by + ')' if group_by else ''}")
+            self.rows[group_by] = rows
+        return self._get(name, group_by, type)[self.rows[group_by]]
 
 
 def bufr_to_ioda(config, logger):
@@ -84,6 +79,8 @@ def bufr_to_ioda(config, logger):
     dump_dir = config["dump_directory"]
     ioda_dir = config["ioda_directory"]
     cycle = config["cycle_datetime"]
+    # decode the file once for all subsets, or once per subset
+    single_pass = config.get("single_pass", True)
 
     # Get derived parameters
     yyyymmdd = cycle[0:8]
@@ -113,108 +110,111 @@ def bufr_to_ioda(config, logger):
     start_time = time.time()
 
     logger.debug('Making QuerySet ...')
-    q = bufr.QuerySet(["ADPSFC"])
-    r = bufr.QuerySet(["SFCSHP"])
-    s = bufr.QuerySet(["ADPUPA"])
+    if single_pass:
+        q = bufr.QuerySet(subsets)
+        queries = {subset: q for subset in subsets}
+    else:
+        queries = {subset: bufr.QuerySet([subset]) for subset in subsets}
 
     for i in range(len(subsets)):
+        q = queries[subsets[i]]
         if subsets[i] == "ADPSFC":
             logger.debug("Making QuerySet for ADPSFC")
 
             # ObsType
-            q.add('observationType', '*/TYP')
+            q.add('ADPSFC_observationType', 'ADPSFC/TYP')
 
             # MetaData
-            q.add('stationIdentification', '*/SID')
-            q.add('prepbufrDataLevelCategory', '*/CAT')
-            q.add('temperatureEventCode', '*/T___INFO/T__EVENT{1}/TPC')
-            q.add('latitude', '*/YOB')
-            q.add('longitude', '*/XOB')
-            q.add('t29', '*/T29')
-            q.add('obsTimeMinusCycleTime', '*/DHR')
-            q.add('height', '*/Z___INFO/Z__EVENT{1}/ZOB')
-            q.add('pressure', '*/P___INFO/P__EVENT{1}/POB')
+            q.add('ADPSFC_stationIdentification', 'ADPSFC/SID')
+            q.add('ADPSFC_prepbufrDataLevelCategory', 'ADPSFC/CAT')
+            q.add('ADPSFC_temperatureEventCode', 'ADPSFC/T___INFO/T__EVENT{1}/TPC')
+            q.add('ADPSFC_latitude', 'ADPSFC/YOB')
+            q.add('ADPSFC_longitude', 'ADPSFC/XOB')
+            q.add('ADPSFC_t29', 'ADPSFC/T29')
+            q.add('ADPSFC_obsTimeMinusCycleTime', 'ADPSFC/DHR')
+            q.add('ADPSFC_height', 'ADPSFC/Z___INFO/Z__EVENT{1}/ZOB')
+            q.add('ADPSFC_pressure', 'ADPSFC/P___INFO/P__EVENT{1}/POB')
 
             # QualityMarker
-            q.add('qualityMarkerStationPressure', '*/P___INFO/P__EVENT{1}/PQM')
-            q.add('qualityMarkerAirTemperature', '*/T___INFO/T__EVENT{1}/TQM')
-            q.add('qualityMarkerVirtualTemperature', '*/T___INFO/T__EVENT{1}/TQM')
-            q.add('qualityMarkerStationElevation', '*/Z___INFO/Z__EVENT{1}/ZQM')
+            q.add('ADPSFC_qualityMarkerStationPressure', 'ADPSFC/P___INFO/P__EVENT{1}/PQM')
+            q.add('ADPSFC_qualityMarkerAirTemperature', 'ADPSFC/T___INFO/T__EVENT{1}/TQM')
+            q.add('ADPSFC_qualityMarkerVirtualTemperature', 'ADPSFC/T___INFO/T__EVENT{1}/TQM')
+            q.add('ADPSFC_qualityMarkerStationElevation', 'ADPSFC/Z___INFO/Z__EVENT{1}/ZQM')
 
             # ObsError
-            q.add('obsErrorStationPressure', '*/P___INFO/P__BACKG{1}/POE')
-            q.add('obsErrorAirTemperature', '*/T___INFO/T__BACKG{1}/TOE')
-            q.add('obsErrorVirtualTemperature', '*/T___INFO/T__BACKG{1}/TOE')
+            q.add('ADPSFC_obsErrorStationPressure', 'ADPSFC/P___INFO/P__BACKG{1}/POE')
+            q.add('ADPSFC_obsErrorAirTemperature', 'ADPSFC/T___INFO/T__BACKG{1}/TOE')
+            q.add('ADPSFC_obsErrorVirtualTemperature', 'ADPSFC/T___INFO/T__BACKG{1}/TOE')
 
             # ObsValue
-            q.add('stationElevation', '*/ELV')
-            q.add('stationPressure', '*/P___INFO/P__EVENT{1}/POB')
-            q.add('airTemperature', '*/T___INFO/T__EVENT{1}/TOB')
+            q.add('ADPSFC_stationElevation', 'ADPSFC/ELV')
+            q.add('ADPSFC_stationPressure', 'ADPSFC/P___INFO/P__EVENT{1}/POB')
+            q.add('ADPSFC_airTemperature', 'ADPSFC/T___INFO/T__EVENT{1}/TOB')
 
         elif subsets[i] == "SFCSHP":
             logger.debug("Making QuerySet for SFCSHP")
 
             # ObsType
-            r.add('observationType', '*/TYP')
+            q.add('SFCSHP_observationType', 'SFCSHP/TYP')
 
             # MetaData
-            r.add('stationIdentification', '*/SID')
-            r.add('prepbufrDataLevelCategory', '*/CAT')
-            r.add('temperatureEventCode', '*/T___INFO/T__EVENT{1}/TPC')
-            r.add('latitude', '*/YOB')
-            r.add('longitude', '*/XOB')
-            r.add('t29', '*/T29')
-            r.add('obsTimeMinusCycleTime', '*/DHR')
-            r.add('height', '*/Z___INFO/Z__EVENT{1}/ZOB')
-            r.add('pressure', '*/P___INFO/P__EVENT{1}/POB')
+            q.add('SFCSHP_stationIdentification', 'SFCSHP/SID')
+            q.add('SFCSHP_prepbufrDataLevelCategory', 'SFCSHP/CAT')
+            q.add('SFCSHP_temperatureEventCode', 'SFCSHP/T___INFO/T__EVENT{1}/TPC')
+            q.add('SFCSHP_latitude', 'SFCSHP/YOB')
+            q.add('SFCSHP_longitude', 'SFCSHP/XOB')
+            q.add('SFCSHP_t29', 'SFCSHP/T29')
+            q.add('SFCSHP_obsTimeMinusCycleTime', 'SFCSHP/DHR')
+            q.add('SFCSHP_height', 'SFCSHP/Z___INFO/Z__EVENT{1}/ZOB')
+            q.add('SFCSHP_pressure', 'SFCSHP/P___INFO/P__EVENT{1}/POB')
 
             # QualityMarker
-            r.add('qualityMarkerStationPressure', '*/P___INFO/P__EVENT{1}/PQM')
-            r.add('qualityMarkerAirTemperature', '*/T___INFO/T__EVENT{1}/TQM')
-            r.add('qualityMarkerVirtualTemperature', '*/T___INFO/T__EVENT{1}/TQM')
-            r.add('qualityMarkerStationElevation', '*/Z___INFO/Z__EVENT{1}/ZQM')
+            q.add('SFCSHP_qualityMarkerStationPressure', 'SFCSHP/P___INFO/P__EVENT{1}/PQM')
+            q.add('SFCSHP_qualityMarkerAirTemperature', 'SFCSHP/T___INFO/T__EVENT{1}/TQM')
+            q.add('SFCSHP_qualityMarkerVirtualTemperature', 'SFCSHP/T___INFO/T__EVENT{1}/TQM')
+            q.add('SFCSHP_qualityMarkerStationElevation', 'SFCSHP/Z___INFO/Z__EVENT{1}/ZQM')
 
             # ObsError
-            r.add('obsErrorStationPressure', '*/P___INFO/P__BACKG{1}/POE')
-            r.add('obsErrorAirTemperature', '*/T___INFO/T__BACKG{1}/TOE')
-            r.add('obsErrorVirtualTemperature', '*/T___INFO/T__BACKG{1}/TOE')
+            q.add('SFCSHP_obsErrorStationPressure', 'SFCSHP/P___INFO/P__BACKG{1}/POE')
+            q.add('SFCSHP_obsErrorAirTemperature', 'SFCSHP/T___INFO/T__BACKG{1}/TOE')
+            q.add('SFCSHP_obsErrorVirtualTemperature', 'SFCSHP/T___INFO/T__BACKG{1}/TOE')
 
             # ObsValue
-            r.add('stationElevation', '*/ELV')
-            r.add('stationPressure', '*/P___INFO/P__EVENT{1}/POB')
-            r.add('airTemperature', '*/T___INFO/T__EVENT{1}/TOB')
+            q.add('SFCSHP_stationElevation', 'SFCSHP/ELV')
+            q.add('SFCSHP_stationPressure', 'SFCSHP/P___INFO/P__EVENT{1}/POB')
+            q.add('SFCSHP_airTemperature', 'SFCSHP/T___INFO/T__EVENT{1}/TOB')
 
         elif subsets[i] == "ADPUPA":
             logger.debug("Making QuerySet for ADPUPA")
             # ObsType
-            s.add('observationType', '*/TYP')
+            q.add('ADPUPA_observationType', 'ADPUPA/TYP')
 
             # MetaData
-            s.add('stationIdentification', 'ADPUPA/SID')
-            s.add('prepbufrDataLevelCategory', '*/PRSLEVEL/CAT')
-            s.add('temperatureEventCode', '*/PRSLEVEL/T___INFO/T__EVENT{1}/TPC')
-            s.add('latitude', '*/PRSLEVEL/DRFTINFO/YDR')
-            s.add('longitude', '*/PRSLEVEL/DRFTINFO/XDR')
-            s.add('t29', '*/T29')
-            s.add('height', '*/PRSLEVEL/Z___INFO/Z__EVENT{1}/ZOB')
-            s.add('timeOffset', '*/PRSLEVEL/DRFTINFO/HRDR')
-            s.add('releaseTime', '*/PRSLEVEL/DRFTINFO/HRDR')
-            s.add('pressure', '*/PRSLEVEL/P___INFO/P__EVENT{1}/POB')
+            q.add('ADPUPA_stationIdentification', 'ADPUPA/SID')
+            q.add('ADPUPA_prepbufrDataLevelCategory', 'ADPUPA/PRSLEVEL/CAT')
+            q.add('ADPUPA_temperatureEventCode', 'ADPUPA/PRSLEVEL/T___INFO/T__EVENT{1}/TPC')
+            q.add('ADPUPA_latitude', 'ADPUPA/PRSLEVEL/DRFTINFO/YDR')
+            q.add('ADPUPA_longitude', 'ADPUPA/PRSLEVEL/DRFTINFO/XDR')
+            q.add('ADPUPA_t29', 'ADPUPA/T29')
+            q.add('ADPUPA_height', 'ADPUPA/PRSLEVEL/Z___INFO/Z__EVENT{1}/ZOB')
+            q.add('ADPUPA_timeOffset', 'ADPUPA/PRSLEVEL/DRFTINFO/HRDR')
+            q.add('ADPUPA_releaseTime', 'ADPUPA/PRSLEVEL/DRFTINFO/HRDR')
+            q.add('ADPUPA_pressure', 'ADPUPA/PRSLEVEL/P___INFO/P__EVENT{1}/POB')
 
             # QualityMarker
-            s.add('qualityMarkerStationPressure', '*/PRSLEVEL/P___INFO/P__EVENT{1}/PQM')
-            s.add('qualityMarkerStationElevation', '*/PRSLEVEL/Z___INFO/Z__EVENT{1}/ZQM')
-            s.add('qualityMarkerAirTemperature', '*/PRSLEVEL/T___INFO/T__EVENT{1}/TQM')
-            s.add('qualityMarkerVirtualTemperature', '*/PRSLEVEL/T___INFO/T__EVENT{1}/TQM')
+            q.add('ADPUPA_qualityMarkerStationPressure', 'ADPUPA/PRSLEVEL/P___INFO/P__EVENT{1}/PQM')
+            q.add('ADPUPA_qualityMarkerStationElevation', 'ADPUPA/PRSLEVEL/Z___INFO/Z__EVENT{1}/ZQM')
+            q.add('ADPUPA_qualityMarkerAirTemperature', 'ADPUPA/PRSLEVEL/T___INFO/T__EVENT{1}/TQM')
+            q.add('ADPUPA_qualityMarkerVirtualTemperature', 'ADPUPA/PRSLEVEL/T___INFO/T__EVENT{1}/TQM')
 
             # ObsError
-            s.add('obsErrorStationPressure', '*/PRSLEVEL/P___INFO/P__BACKG{1}/POE')
-            s.add('obsErrorAirTemperature', '*/PRSLEVEL/T___INFO/T__BACKG{1}/TOE')
+            q.add('ADPUPA_obsErrorStationPressure', 'ADPUPA/PRSLEVEL/P___INFO/P__BACKG{1}/POE')
+            q.add('ADPUPA_obsErrorAirTemperature', 'ADPUPA/PRSLEVEL/T___INFO/T__BACKG{1}/TOE')
 
             # ObsValue
-            s.add('stationElevation', '*/ELV')
-            s.add('stationPressure', '*/PRSLEVEL/P___INFO/P__EVENT{1}/POB')
-            s.add('airTemperature', '*/PRSLEVEL/T___INFO/T__EVENT{1}/TOB')
+            q.add('ADPUPA_stationElevation', 'ADPUPA/ELV')
+            q.add('ADPUPA_stationPressure', 'ADPUPA/PRSLEVEL/P___INFO/P__EVENT{1}/POB')
+            q.add('ADPUPA_airTemperature', 'ADPUPA/PRSLEVEL/T___INFO/T__EVENT{1}/TOB')
 
     end_time = time.time()
 
@@ -228,26 +228,36 @@ def bufr_to_ioda(config, logger):
     start_time = time.time()
 
     logger.debug(f"Executing QuerySet to get ResultSet ...")
-    with bufr.File(DATA_PATH) as f:
-        try:
-            t = f.execute(q)
-        except Exception as err:
-            logger.info(f'Return t with {err}')
-            return
-
-    with bufr.File(DATA_PATH) as f:
-        try:
-            u = f.execute(r)
-        except Exception as err:
-            logger.info(f'Return u with {err}')
-            return
-
-    with bufr.File(DATA_PATH) as f:
-        try:
-            v = f.execute(s)
-        except Exception as err:
-            logger.info(f'Return v with {err}')
-            return
+    # In single-pass mode, all subsets are decoded in one pass over the
+    # file and each subset is read back through its own view of the
+    # combined ResultSet; the report type, present in every report of a
+    # subset, tells its rows from those of the other subsets. Otherwise
+    # each subset is decoded on its own, as a reference.
+    if single_pass:
+        with bufr.File(DATA_PATH) as f:
+            try:
+                rs = f.execute(q)
+            except Exception as err:
+                logger.info(f'Return with {err}')
+                return
+        views = {subset: SubsetResultSet(rs, subset, "observationType", logger) for subset in subsets}
+    else:
+        views = {}
+        for subset in subsets:
+            with bufr.File(DATA_PATH) as f:
+                try:
+                    views[subset] = SubsetResultSet(f.execute(queries[subset]), subset, None, logger)
+                except Exception as err:
+                    logger.info(f'Return with {err}')
+                    return
+
+    t = views["ADPSFC"]
+    u = views["SFCSHP"]
+    v = views["ADPUPA"]
+
+    end_time = time.time()
+    running_time = end_time - start_time
+    logger.debug(f"Running time for executing QuerySet: {running_time} seconds")
 
     # ADPSFC
     # ObsType
@@ -289,53 +299,12 @@ def bufr_to_ioda(config, logger):
     toborig1 += 273.15
 
     logger.debug(f" ... Make new arrays for certain Obstypes of ADSPFC")
-    typ1 = np.array([], dtype=np.int32)
-
-    sid1 = np.array([]).astype('str')
-    cat1 = np.array([], dtype=np.int32)
-    tpc1 = np.array([], dtype=np.int32)
-    lat1 = np.array([], dtype=np.float32)
-    lon1 = np.array([], dtype=np.float32)
-    t291 = np.array([], dtype=np.int32)
-    zob1 = np.array([], dtype=np.float32)
-    dhr1 = np.array([], dtype=np.float32)
-    pressure1 = np.array([], dtype=np.float32)
-
-    pobqm1 = np.array([], dtype=np.int32)
-    zobqm1 = np.array([], dtype=np.int32)
-    tobqm1 = np.array([], dtype=np.int32)
-
-    poboe1 = np.array([], dtype=np.float32)
-    toboe1 = ma.array([], dtype=np.float32)
-
-    elv1 = np.array([], dtype=np.float32)
-    pob1 = np.array([], dtype=np.float32)
-    tob1 = np.array([], dtype=np.float32)
-
-    for i in range(len(typorig1)):
-        if typorig1[i] < 200:
-            typ1 = np.append(typ1, typorig1[i])
-
-            sid1 = np.append(sid1, sidorig1[i])
-            cat1 = np.append(cat1, catorig1[i])
-            tpc1 = np.append(tpc1, tpcorig1[i])
-            lat1 = np.append(lat1, latorig1[i])
-            lon1 = np.append(lon1, lonorig1[i])
-            t291 = np.append(t291, t29orig1[i])
-            zob1 = np.append(zob1, zoborig1[i])
-            dhr1 = np.append(dhr1, dhrorig1[i])
-            pressure1 = np.append(pressure1, pressureorig1[i])
-
-            pobqm1 = np.append(pobqm1, pobqmorig1[i]).astype('int32')
-            zobqm1 = np.append(pobqm1, pobqmorig1[i]).astype('int32')
-            tobqm1 = np.append(tobqm1, tobqmorig1[i]).astype('int32')
-
-            poboe1 = np.append(poboe1, poboeorig1[i])
-            toboe1 = np.append(toboe1, toboeorig1[i])
-
-            elv1 = np.append(elv1, elvorig1[i])
-            pob1 = np.append(pob1, poborig1[i])
-            tob1 = np.append(tob1, toborig1[i])
+    (typ1, sid1, cat1, tpc1, lat1, lon1, t291, zob1, dhr1, pressure1,
+     pobqm1, zobqm1, tobqm1, poboe1, toboe1, elv1, pob1, tob1) = subset_arrays(
+        typorig1 < 200,
+        typorig1, sidorig1, catorig1, tpcorig1, latorig1, lonorig1, t29orig1, zoborig1,
+        dhrorig1, pressureorig1, pobqmorig1, zobqmorig1, tobqmorig1, poboeorig1, toboeorig1,
+        elvorig1, poborig1, toborig1)
 
     typ1 = ma.array(typ1)
     typ1 = ma.masked_values(typ1, typorig1.fill_value)
@@ -444,52 +413,12 @@ def bufr_to_ioda(config, logger):
     toborig2 += 273.15
 
     logger.debug(f" ... Make new arrays for certain ObsTypes of SFCSHP")
-    typ2 = np.array([], dtype=np.int32)
-
-    sid2 = np.array([]).astype('str')
-    cat2 = np.array([], dtype=np.int32)
-    tpc2 = np.array([], dtype=np.int32)
-    lat2 = np.array([], dtype=np.float32)
-    lon2 = np.array([], dtype=np.float32)
-    t292 = np.array([], dtype=np.int32)
-    zob2 = np.array([], dtype=np.float32)
-    dhr2 = np.array([], dtype=np.float32)
-    pressure2 = np.array([], dtype=np.float32)
-
-    pobqm2 = np.array([], dtype=np.int32)
-    zobqm2 = np.array([], dtype=np.int32)
-    tobqm2 = np.array([], dtype=np.int32)
-
-    poboe2 = np.array([], dtype=np.float32)
-    toboe2 = np.array([], dtype=np.float32)
-
-    elv2 = np.array([], dtype=np.float32)
-    pob2 = np.array([], dtype=np.float32)
-    tob2 = np.array([], dtype=np.float32)
-
-    for i in range(len(typorig2)):
-        if typorig2[i] < 200:
-            typ2 = np.append(typ2, typorig2[i])
-            sid2 = np.append(sid2, sidorig2[i])
-            cat2 = np.append(cat2, catorig2[i])
-            tpc2 = np.append(tpc2, tpcorig2[i])
-            lat2 = np.append(lat2, latorig2[i])
-            lon2 = np.append(lon2, lonorig2[i])
-            t292 = np.append(t292, t29orig2[i])
-            zob2 = np.append(zob2, zoborig2[i])
-            dhr2 = np.append(dhr2, dhrorig2[i])
-            pressure2 = np.append(pressure2, pressureorig2[i])
-
-            pobqm2 = np.append(pobqm2, pobqmorig2[i])
-            zobqm2 = np.append(zobqm2, pobqmorig2[i])
-            tobqm2 = np.append(tobqm2, tobqmorig2[i])
-
-            poboe2 = np.append(poboe2, poboeorig2[i])
-            toboe2 = np.append(toboe2, toboeorig2[i])
-
-            elv2 = np.append(elv2, elvorig2[i])
-            pob2 = np.append(pob2, poborig2[i])
-            tob2 = np.append(tob2, toborig2[i])
+    (typ2, sid2, cat2, tpc2, lat2, lon2, t292, zob2, dhr2, pressure2,
+     pobqm2, zobqm2, tobqm2, poboe2, toboe2, elv2, pob2, tob2) = subset_arrays(
+        typorig2 < 200,
+        typorig2, sidorig2, catorig2, tpcorig2, latorig2, lonorig2, t29orig2, zoborig2,
+        dhrorig2, pressureorig2, pobqmorig2, zobqmorig2, tobqmorig2, poboeorig2, toboeorig2,
+        elvorig2, poborig2, toborig2)
 
     typ2 = ma.array(typ2)
     typ2 = ma.masked_values(typ2, typorig2.fill_value)
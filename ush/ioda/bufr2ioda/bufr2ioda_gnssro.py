@@ -18,6 +18,7 @@ from pyiodaconv import bufr
 from collections import namedtuple
 from pyioda import ioda_obs_space as ioda_ospace
 from wxflow import Logger
+from kernels import Derive_stationIdentification, Compute_Grid_Location, chunk_count, concatenate_chunks
 
 # ====================================================================
 # GPS-RO BUFR dump file
@@ -25,28 +26,11 @@ from wxflow import Logger
 # NC003010  |    GPS-RO
 # ====================================================================
 
-
-def Derive_stationIdentification(said, ptid):
-
-    stid = []
-    for i in range(len(said)):
-        newval = str(said[i]).zfill(4)+str(ptid[i]).zfill(4)
-        stid.append(str(newval))
-    stid = np.array(stid).astype(dtype='str')
-    stid = ma.array(stid)
-    ma.set_fill_value(stid, "")
-
-    return stid
-
-
-def Compute_Grid_Location(degrees):
-
-    for i in range(len(degrees)):
-        if degrees[i] <= 360 and degrees[i] >= -180:
-            degrees[i] = np.deg2rad(degrees[i])
-    rad = degrees
-
-    return rad
+# variables returned by decode_chunk, in the order bufr_to_ioda unpacks them
+DECODED_VARIABLES = ['clath', 'clonh', 'gclath', 'gclonh', 'timestamp', 'stid', 'said', 'siid',
+                     'sclf', 'ptid', 'elrc', 'geodu', 'heit', 'impp1', 'imph1', 'mefr1', 'pccf',
+                     'ref_pccf', 'bearaz', 'ogce', 'qfro', 'qfro2', 'satasc', 'bnda1', 'arfr',
+                     'bndaoe1', 'arfroe', 'bndaot', 'arfrot']
 
 
 def Compute_imph(impp, elrc):
@@ -56,116 +40,10 @@ def Compute_imph(impp, elrc):
     return imph
 
 
-def bufr_to_ioda(config, logger):
-
-    subsets = config["subsets"]
-    logger.debug(f"Checking subsets = {subsets}")
-
-    # =========================================
-    # Get parameters from configuration
-    # =========================================
-    data_format = config["data_format"]
-    data_type = config["data_type"]
-    bufr_data_type = "gpsro"
-    data_description = config["data_description"]
-    data_provider = config["data_provider"]
-    cycle_type = config["cycle_type"]
-    dump_dir = config["dump_directory"]
-    ioda_dir = config["ioda_directory"]
-    satellite_info_array = config["satellite_info"]
-    cycle = config["cycle_datetime"]
-    yyyymmdd = cycle[0:8]
-    hh = cycle[8:10]
-
-    bufrfile = f"{cycle_type}.t{hh}z.{bufr_data_type}.tm00.{data_format}"
-    DATA_PATH = os.path.join(dump_dir, f"{cycle_type}.{yyyymmdd}", str(hh),
-                             'atmos', bufrfile)
-    if not os.path.isfile(DATA_PATH):
-        logger.info(f"DATA_PATH {DATA_PATH} does not exist")
-        return
-    logger.debug(f"The DATA_PATH is: {DATA_PATH}")
-
-    # ============================================
-    # Make the QuerySet for all the data we want
-    # ============================================
-    start_time = time.time()
-
-    logger.debug(f"Making QuerySet ...")
-    q = bufr.QuerySet(subsets)
-
-    # MetaData
-    q.add('latitude', '*/ROSEQ1/CLATH')
-    q.add('longitude', '*/ROSEQ1/CLONH')
-    q.add('gridLatitude', '*/ROSEQ1/CLATH')
-    q.add('gridLongitude', '*/ROSEQ1/CLONH')
-    q.add('year', '*/YEAR')
-    q.add('year2', '*/YEAR')
-    q.add('month', '*/MNTH')
-    q.add('day', '*/DAYS')
-    q.add('hour', '*/HOUR')
-    q.add('minute', '*/MINU')
-    q.add('second', '*/SECO')
-    q.add('satelliteIdentifier', '*/SAID')
-    q.add('satelliteInstrument', '*/SIID')
-    q.add('satelliteConstellationRO', '*/SCLF')
-    q.add('satelliteTransmitterId', '*/PTID')
-    q.add('earthRadiusCurvature', '*/ELRC')
-#    q.add('observationSequenceNum', '*/SEQNUM')
-    q.add('geoidUndulation', '*/GEODU')
-    q.add('height', '*/ROSEQ3/HEIT')
-    q.add('impactParameterRO_roseq2repl1', '*/ROSEQ1/ROSEQ2{1}/IMPP')
-    q.add('impactParameterRO_roseq2repl2', '*/ROSEQ1/ROSEQ2{2}/IMPP')
-    q.add('impactParameterRO_roseq2repl3', '*/ROSEQ1/ROSEQ2{3}/IMPP')
-    q.add('frequency__roseq2repl1', '*/ROSEQ1/ROSEQ2{1}/MEFR')
-    q.add('frequency__roseq2repl2', '*/ROSEQ1/ROSEQ2{2}/MEFR')
-    q.add('frequency__roseq2repl3', '*/ROSEQ1/ROSEQ2{3}/MEFR')
-#    q.add('pccf', '*/ROSEQ1/PCCF')
-    q.add('pccf', '*/PCCF[1]')
-    q.add('percentConfidence', '*/ROSEQ3/PCCF')
-    q.add('sensorAzimuthAngle', '*/BEARAZ')
-
-    # Processing Center
-    q.add('dataProviderOrigin', '*/OGCE')
-
-    # Quality Information
-    q.add('qualityFlags', '*/QFRO')
-    q.add('qfro', '*/QFRO')
-    q.add('satelliteAscendingFlag', '*/QFRO')
-
-    # ObsValue
-    q.add('bendingAngle_roseq2repl1', '*/ROSEQ1/ROSEQ2{1}/BNDA[1]')
-    q.add('bendingAngle_roseq2repl2', '*/ROSEQ1/ROSEQ2{2}/BNDA[1]')
-    q.add('bendingAngle_roseq2repl3', '*/ROSEQ1/ROSEQ2{3}/BNDA[1]')
-    q.add('atmosphericRefractivity', '*/ROSEQ3/ARFR[1]')
-
-    # ObsError
-    q.add('obsErrorBendingAngle1', '*/ROSEQ1/ROSEQ2{1}/BNDA[2]')
-    q.add('obsErrorBendingAngle2', '*/ROSEQ1/ROSEQ2{2}/BNDA[2]')
-    q.add('obsErrorBendingAngle3', '*/ROSEQ1/ROSEQ2{3}/BNDA[2]')
-    q.add('obsErrorAtmosphericRefractivity', '*/ROSEQ3/ARFR[2]')
-
-    # ObsType
-    q.add('obsTypeBendingAngle', '*/SAID')
-    q.add('obsTypeAtmosphericRefractivity', '*/SAID')
-
-    end_time = time.time()
-    running_time = end_time - start_time
-    logger.debug(f"Running time for making QuerySet: {running_time} seconds")
-
-    # ==============================================================
-    # Open the BUFR file and execute the QuerySet to get ResultSet
-    # Use the ResultSet returned to get numpy arrays of the data
-    # ==============================================================
+def decode_chunk(r, logger):
+    """Get, derive and check the variables of a ResultSet (or of one chunk of it)."""
     start_time = time.time()
 
-    logger.debug(f"Executing QuerySet to get ResultSet ...")
-    with bufr.File(DATA_PATH) as f:
-        try:
-            r = f.execute(q)
-        except Exception as err:
-            logger.info(f'Return with {err}')
-            return
-
     logger.debug(f" ... Executing QuerySet: get MetaData: basic ...")
     # MetaData
     clath = r.get('latitude', 'latitude')
@@ -321,19 +199,14 @@ def bufr_to_ioda(config, logger):
     logger.debug(f"     imph3 min/max = {imph3.min()}, {imph3.max()}")
 
     logger.debug(f"Keep bending angle with Freq = 0.0")
-    for i in range(len(said)):
-        if (mefr2[i] == 0.0):
-            bnda1[i] = bnda2[i]
-            mefr1[i] = mefr2[i]
-            impp1[i] = impp2[i]
-            imph1[i] = imph2[i]
-            bndaoe1[i] = bndaoe2[i]
-        if (mefr3[i] == 0.0):
-            bnda1[i] = bnda3[i]
-            mefr1[i] = mefr3[i]
-            impp1[i] = impp3[i]
-            imph1[i] = imph3[i]
-            bndaoe1[i] = bndaoe3[i]
+    for mefr, bnda, impp, imph, bndaoe in ((mefr2, bnda2, impp2, imph2, bndaoe2),
+                                           (mefr3, bnda3, impp3, imph3, bndaoe3)):
+        freq0 = ma.filled(mefr == 0.0, False)
+        bnda1[freq0] = bnda[freq0]
+        mefr1[freq0] = mefr[freq0]
+        impp1[freq0] = impp[freq0]
+        imph1[freq0] = imph[freq0]
+        bndaoe1[freq0] = bndaoe[freq0]
 
     logger.debug(f"     new bnda1 shape, type, min/max {bnda1.shape}, \
                 {bnda1.dtype}, {bnda1.min()}, {bnda1.max()}")
@@ -347,38 +220,15 @@ def bufr_to_ioda(config, logger):
                 {bndaoe1.dtype}, {bndaoe1.min()}, {bndaoe1.max()}")
 
 #   find ibit for qfro (16bit from left to right)
-    bit3 = []
-    bit5 = []
-    bit6 = []
-    for quality in qfro:
-        if quality & 8192 > 0:
-            bit3.append(1)
-        else:
-            bit3.append(0)
-
-        if quality & 2048 > 0:
-            bit5.append(1)
-        else:
-            bit5.append(0)
-
-        if quality & 1024 > 0:
-            bit6.append(1)
-        else:
-            bit6.append(0)
-    bit3 = np.array(bit3)
-    bit5 = np.array(bit5)
-    bit6 = np.array(bit6)
+    bit3 = ma.filled(qfro & 8192 > 0, False).astype(int)
+    bit5 = ma.filled(qfro & 2048 > 0, False).astype(int)
+    bit6 = ma.filled(qfro & 1024 > 0, False).astype(int)
     logger.debug(f"     new bit3 shape, type, min/max {bit3.shape}, \
                 {bit3.dtype}, {bit3.min()}, {bit3.max()}")
 
 #   overwrite satelliteAscendingFlag and QFRO
-    for quality in range(len(bit3)):
-        satasc[quality] = 0
-        qfro2[quality] = 0.0
-        if bit3[quality] == 1:
-            satasc[quality] = 1
-        if (bit5[quality] == 1) or (bit6[quality] == 1):
-            qfro2[quality] = 1.0
+    satasc[:] = np.where(bit3 == 1, 1, 0)
+    qfro2[:] = np.where((bit5 == 1) | (bit6 == 1), 1.0, 0.0)
 
     logger.debug(f"     new satasc shape, type, min/max {satasc.shape}, \
                 {satasc.dtype}, {satasc.min()}, {satasc.max()}")
@@ -389,6 +239,153 @@ def bufr_to_ioda(config, logger):
     logger.debug(f"Running time for creating derived variables: {running_time} \
                 seconds")
 
+    return {'clath': clath, 'clonh': clonh, 'gclath': gclath, 'gclonh': gclonh,
+            'timestamp': timestamp, 'stid': stid, 'said': said, 'siid': siid, 'sclf': sclf,
+            'ptid': ptid, 'elrc': elrc, 'geodu': geodu, 'heit': heit, 'impp1': impp1,
+            'imph1': imph1, 'mefr1': mefr1, 'pccf': pccf, 'ref_pccf': ref_pccf, 'bearaz': bearaz,
+            'ogce': ogce, 'qfro': qfro, 'qfro2': qfro2, 'satasc': satasc, 'bnda1': bnda1,
+            'arfr': arfr, 'bndaoe1': bndaoe1, 'arfroe': arfroe, 'bndaot': bndaot, 'arfrot': arfrot}
+
+
+def bufr_to_ioda(config, logger):
+
+    subsets = config["subsets"]
+    logger.debug(f"Checking subsets = {subsets}")
+
+    # =========================================
+    # Get parameters from configuration
+    # =========================================
+    data_format = config["data_format"]
+    data_type = config["data_type"]
+    bufr_data_type = "gpsro"
+    data_description = config["data_description"]
+    data_provider = config["data_provider"]
+    cycle_type = config["cycle_type"]
+    dump_dir = config["dump_directory"]
+    ioda_dir = config["ioda_directory"]
+    satellite_info_array = config["satellite_info"]
+    cycle = config["cycle_datetime"]
+    # number of BUFR messages decoded at a time, 0 for the whole file
+    chunk_size = config.get("chunk_size", 0)
+    yyyymmdd = cycle[0:8]
+    hh = cycle[8:10]
+
+    bufrfile = f"{cycle_type}.t{hh}z.{bufr_data_type}.tm00.{data_format}"
+    DATA_PATH = os.path.join(dump_dir, f"{cycle_type}.{yyyymmdd}", str(hh),
+                             'atmos', bufrfile)
+    if not os.path.isfile(DATA_PATH):
+        logger.info(f"DATA_PATH {DATA_PATH} does not exist")
+        return
+    logger.debug(f"The DATA_PATH is: {DATA_PATH}")
+
+    # ============================================
+    # Make the QuerySet for all the data we want
+    # ============================================
+    start_time = time.time()
+
+    logger.debug(f"Making QuerySet ...")
+    q = bufr.QuerySet(subsets)
+
+    # MetaData
+    q.add('latitude', '*/ROSEQ1/CLATH')
+    q.add('longitude', '*/ROSEQ1/CLONH')
+    q.add('gridLatitude', '*/ROSEQ1/CLATH')
+    q.add('gridLongitude', '*/ROSEQ1/CLONH')
+    q.add('year', '*/YEAR')
+    q.add('year2', '*/YEAR')
+    q.add('month', '*/MNTH')
+    q.add('day', '*/DAYS')
+    q.add('hour', '*/HOUR')
+    q.add('minute', '*/MINU')
+    q.add('second', '*/SECO')
+    q.add('satelliteIdentifier', '*/SAID')
+    q.add('satelliteInstrument', '*/SIID')
+    q.add('satelliteConstellationRO', '*/SCLF')
+    q.add('satelliteTransmitterId', '*/PTID')
+    q.add('earthRadiusCurvature', '*/ELRC')
+#    q.add('observationSequenceNum', '*/SEQNUM')
+    q.add('geoidUndulation', '*/GEODU')
+    q.add('height', '*/ROSEQ3/HEIT')
+    q.add('impactParameterRO_roseq2repl1', '*/ROSEQ1/ROSEQ2{1}/IMPP')
+    q.add('impactParameterRO_roseq2repl2', '*/ROSEQ1/ROSEQ2{2}/IMPP')
+    q.add('impactParameterRO_roseq2repl3', '*/ROSEQ1/ROSEQ2{3}/IMPP')
+    q.add('frequency__roseq2repl1', '*/ROSEQ1/ROSEQ2{1}/MEFR')
+    q.add('frequency__roseq2repl2', '*/ROSEQ1/ROSEQ2{2}/MEFR')
+    q.add('frequency__roseq2repl3', '*/ROSEQ1/ROSEQ2{3}/MEFR')
+#    q.add('pccf', '*/ROSEQ1/PCCF')
+    q.add('pccf', '*/PCCF[1]')
+    q.add('percentConfidence', '*/ROSEQ3/PCCF')
+    q.add('sensorAzimuthAngle', '*/BEARAZ')
+
+    # Processing Center
+    q.add('dataProviderOrigin', '*/OGCE')
+
+    # Quality Information
+    q.add('qualityFlags', '*/QFRO')
+    q.add('qfro', '*/QFRO')
+    q.add('satelliteAscendingFlag', '*/QFRO')
+
+    # ObsValue
+    q.add('bendingAngle_roseq2repl1', '*/ROSEQ1/ROSEQ2{1}/BNDA[1]')
+    q.add('bendingAngle_roseq2repl2', '*/ROSEQ1/ROSEQ2{2}/BNDA[1]')
+    q.add('bendingAngle_roseq2repl3', '*/ROSEQ1/ROSEQ2{3}/BNDA[1]')
+    q.add('atmosphericRefractivity', '*/ROSEQ3/ARFR[1]')
+
+    # ObsError
+    q.add('obsErrorBendingAngle1', '*/ROSEQ1/ROSEQ2{1}/BNDA[2]')
+    q.add('obsErrorBendingAngle2', '*/ROSEQ1/ROSEQ2{2}/BNDA[2]')
+    q.add('obsErrorBendingAngle3', '*/ROSEQ1/ROSEQ2{3}/BNDA[2]')
+    q.add('obsErrorAtmosphericRefractivity', '*/ROSEQ3/ARFR[2]')
+
+    # ObsType
+    q.add('obsTypeBendingAngle', '*/SAID')
+    q.add('obsTypeAtmosphericRefractivity', '*/SAID')
+
+    end_time = time.time()
+    running_time = end_time - start_time
+    logger.debug(f"Running time for making QuerySet: {running_time} seconds")
+
+    # ==============================================================
+    # Open the BUFR file and execute the QuerySet to get ResultSet
+    # Use the ResultSet returned to get numpy arrays of the data
+    # ==============================================================
+    start_time = time.time()
+
+    logger.debug(f"Executing QuerySet to get ResultSet ...")
+    with bufr.File(DATA_PATH) as f:
+        if chunk_size > 0:
+            # decode chunk_size messages at a time, until all the messages
+            # are read, and keep only the derived variables of each chunk
+            chunks = []
+            for _ in range(chunk_count(DATA_PATH, chunk_size)):
+                try:
+                    r = f.execute(q, next=chunk_size)
+                except Exception as err:
+                    logger.info(f'Return with {err}')
+                    return
+                if len(r.get('latitude', 'latitude')) == 0:
+                    continue
+                chunks.append(decode_chunk(r, logger))
+                del r
+            if not chunks:
+                logger.info(f'Return with no data in {DATA_PATH}')
+                return
+            data = concatenate_chunks(chunks)
+            del chunks
+        else:
+            try:
+                r = f.execute(q)
+            except Exception as err:
+                logger.info(f'Return with {err}')
+                return
+            data = decode_chunk(r, logger)
+            del r
+
+    clath, clonh, gclath, gclonh, timestamp, stid, said, siid, sclf, ptid, elrc, geodu, heit, \
+        impp1, imph1, mefr1, pccf, ref_pccf, bearaz, ogce, qfro, qfro2, satasc, bnda1, arfr, \
+        bndaoe1, arfroe, bndaot, arfrot = \
+        (data[name] for name in DECODED_VARIABLES)
+
     # =====================================
     # Create IODA ObsSpace
     # Write IODA output
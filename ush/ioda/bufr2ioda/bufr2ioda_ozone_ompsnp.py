@@ -12,6 +12,7 @@ import os
 from datetime import datetime
 from pyioda import ioda_obs_space as ioda_ospace
 from wxflow import Logger
+from satellite_split import SatelliteSplitter
 
 # ==================================================================================================
 # Subset    |  Description (OMPS NP)                                                               |
@@ -279,8 +280,16 @@ def bufr_to_ioda(config, logger):
     # =====================================
     logger.info('Split data based on satellite id, Create IODA ObsSpace and Write IODA output')
 
+    # Sort the observations by satellite once, so that each satellite is a
+    # contiguous slice of the sorted arrays
+    splitter = SatelliteSplitter(satid1, satellite_info_array)
+    (lon1, lat1, satid1, solzenang1, timestamp1, pressure1, presv1, ptop1, pbot1, toqc1, poqc1,
+     o3val1) = splitter.sort(
+        lon1, lat1, satid1, solzenang1, timestamp1, pressure1, presv1, ptop1, pbot1, toqc1, poqc1,
+        o3val1)
+
     # Find unique satellite identifiers in data to process
-    unique_satids = np.unique(satid)
+    unique_satids = splitter.satids
     logger.info(f'Number of Unique satellite identifiers : {len(unique_satids)}')
     logger.info(f'Unique satellite identifiers: {unique_satids}')
 
@@ -289,19 +298,16 @@ def bufr_to_ioda(config, logger):
     for sat in unique_satids.tolist():
         start_time = time.time()
 
-        matched = False
-        for satellite_info in satellite_info_array:
-            if (satellite_info["satellite_id"] == sat):
-                matched = True
-                satellite_id = satellite_info["satellite_id"]
-                satellite_name = satellite_info["satellite_name"]
-                satinst = sensor_name.lower()+'_'+satellite_name.lower()
-                logger.debug(f'Split data for {satinst} satid = {sat}')
-
+        satellite_info = splitter.info(sat)
+        matched = satellite_info is not None
         if matched:
+            satellite_id = satellite_info["satellite_id"]
+            satellite_name = satellite_info["satellite_name"]
+            satinst = sensor_name.lower()+'_'+satellite_name.lower()
+            logger.debug(f'Split data for {satinst} satid = {sat}')
 
-            # Define a boolean mask to subset data from the original data object
-            mask = satid1 == sat
+            # Contiguous slice of the sorted data for this satellite
+            mask = splitter[sat]
             # MetaData
             lon2 = np.flip(lon1[mask], axis=0)
             lat2 = np.flip(lat1[mask], axis=0)
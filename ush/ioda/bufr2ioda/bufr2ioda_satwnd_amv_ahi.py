@@ -12,6 +12,8 @@ import os
 from datetime import datetime
 from pyioda import ioda_obs_space as ioda_ospace
 from wxflow import Logger
+from satellite_split import SatelliteSplitter
+from ioda_schema import load_schema, write_schema_variables
 
 # ====================================================================
 # Satellite Winds (AMV) BUFR dump file for AHI/Himawari
@@ -260,8 +262,19 @@ def bufr_to_ioda(config, logger):
     # =====================================
     logger.info('Create IODA ObsSpace and Write IODA output based on satellite ID')
 
+    # IODA variables written for each satellite
+    schema = load_schema('satwnd_amv_ioda_schema.yaml')
+
+    # Sort the observations by satellite once, so that each satellite is a
+    # contiguous slice of the sorted arrays
+    splitter = SatelliteSplitter(satid, satellite_info_array)
+    (lon, lat, timestamp, satid, satzenang, chanfreq, obstype, pressure, height, stnelev, ogce,
+     qifn, swcm, wdir, wspd, uob, vob) = splitter.sort(
+        lon, lat, timestamp, satid, satzenang, chanfreq, obstype, pressure, height, stnelev, ogce,
+        qifn, swcm, wdir, wspd, uob, vob)
+
     # Find unique satellite identifiers in data to process
-    unique_satids = np.unique(satid)
+    unique_satids = splitter.satids
     logger.info(f'Number of Unique satellite identifiers: {len(unique_satids)}')
     logger.info(f'Unique satellite identifiers: {unique_satids}')
 
@@ -270,19 +283,16 @@ def bufr_to_ioda(config, logger):
     for sat in unique_satids.tolist():
         start_time = time.time()
 
-        matched = False
-        for satellite_info in satellite_info_array:
-            if (satellite_info["satellite_id"] == sat):
-                matched = True
-                satellite_id = satellite_info["satellite_id"]
-                satellite_name = satellite_info["satellite_name"]
-                satinst = sensor_name.lower()+'_'+satellite_name.lower()
-                logger.debug(f'Split data for {satinst} satid = {sat}')
-
+        satellite_info = splitter.info(sat)
+        matched = satellite_info is not None
         if matched:
+            satellite_id = satellite_info["satellite_id"]
+            satellite_name = satellite_info["satellite_name"]
+            satinst = sensor_name.lower()+'_'+satellite_name.lower()
+            logger.debug(f'Split data for {satinst} satid = {sat}')
 
-            # Define a boolean mask to subset data from the original data object
-            mask = satid == sat
+            # Contiguous slice of the sorted data for this satellite
+            mask = splitter[sat]
             # MetaData
             lon2 = lon[mask]
             lat2 = lat[mask]
@@ -347,98 +357,12 @@ def bufr_to_ioda(config, logger):
 
             # Create IODA variables
             logger.debug('Write variables: name, type, units, and attributes')
-            # Longitude
-            obsspace.create_var('MetaData/longitude', dtype=lon2.dtype, fillval=lon2.fill_value) \
-                .write_attr('units', 'degrees_east') \
-                .write_attr('valid_range', np.array([-180, 180], dtype=np.float32)) \
-                .write_attr('long_name', 'Longitude') \
-                .write_data(lon2)
-
-            # Latitude
-            obsspace.create_var('MetaData/latitude', dtype=lat.dtype, fillval=lat2.fill_value) \
-                .write_attr('units', 'degrees_north') \
-                .write_attr('valid_range', np.array([-90, 90], dtype=np.float32)) \
-                .write_attr('long_name', 'Latitude') \
-                .write_data(lat2)
-
-            # Datetime
-            obsspace.create_var('MetaData/dateTime', dtype=np.int64, fillval=int64_fill_value) \
-                .write_attr('units', 'seconds since 1970-01-01T00:00:00Z') \
-                .write_attr('long_name', 'Datetime') \
-                .write_data(timestamp2)
-
-            # Satellite Identifier
-            obsspace.create_var('MetaData/satelliteIdentifier', dtype=satid2.dtype, fillval=satid2.fill_value) \
-                .write_attr('long_name', 'Satellite Identifier') \
-                .write_data(satid2)
-
-            # Sensor Zenith Angle
-            obsspace.create_var('MetaData/satelliteZenithAngle', dtype=satzenang2.dtype, fillval=satzenang2.fill_value) \
-                .write_attr('units', 'degree') \
-                .write_attr('valid_range', np.array([0, 90], dtype=np.float32)) \
-                .write_attr('long_name', 'Satellite Zenith Angle') \
-                .write_data(satzenang2)
-
-            # Sensor Centrall Frequency
-            obsspace.create_var('MetaData/sensorCentralFrequency', dtype=chanfreq2.dtype, fillval=chanfreq2.fill_value) \
-                .write_attr('units', 'Hz') \
-                .write_attr('long_name', 'Satellite Channel Center Frequency') \
-                .write_data(chanfreq2)
-
-            # Data Provider
-            obsspace.create_var('MetaData/dataProviderOrigin', dtype=ogce2.dtype, fillval=ogce2.fill_value) \
-                .write_attr('long_name', 'Identification of Originating/Generating Center') \
-                .write_data(ogce2)
-
-            # Quality: Percent Confidence - Quality Information Without Forecast
-            obsspace.create_var('MetaData/qiWithoutForecast', dtype=qifn2.dtype, fillval=qifn2.fill_value) \
-                .write_attr('long_name', 'QI Without Forecast') \
-                .write_data(qifn2)
-
-            # Wind Computation Method
-            obsspace.create_var('MetaData/windComputationMethod', dtype=swcm2.dtype, fillval=swcm2.fill_value) \
-                .write_attr('long_name', 'Satellite-derived Wind Computation Method') \
-                .write_data(swcm2)
-
-            # Pressure
-            obsspace.create_var('MetaData/pressure', dtype=pressure2.dtype, fillval=pressure2.fill_value) \
-                .write_attr('units', 'pa') \
-                .write_attr('long_name', 'Pressure') \
-                .write_data(pressure2)
-
-            # Height (mimic prepbufr)
-            obsspace.create_var('MetaData/height', dtype=height2.dtype, fillval=height2.fill_value) \
-                .write_attr('units', 'm') \
-                .write_attr('long_name', 'Height of Observation') \
-                .write_data(height2)
-
-            # Station Elevation (mimic prepbufr)
-            obsspace.create_var('MetaData/stationElevation', dtype=stnelev2.dtype, fillval=stnelev2.fill_value) \
-                .write_attr('units', 'm') \
-                .write_attr('long_name', 'Station Elevation') \
-                .write_data(stnelev2)
-
-            # ObsType based on computation method/spectral band
-            obsspace.create_var('ObsType/windEastward', dtype=obstype2.dtype, fillval=swcm2.fill_value) \
-                .write_attr('long_name', 'Observation Type based on Satellite-derived Wind Computation Method and Spectral Band') \
-                .write_data(obstype2)
-
-            # ObsType based on computation method/spectral band
-            obsspace.create_var('ObsType/windNorthward', dtype=obstype2.dtype, fillval=swcm2.fill_value) \
-                .write_attr('long_name', 'Observation Type based on Satellite-derived Wind Computation Method and Spectral Band') \
-                .write_data(obstype2)
-
-            # U-Wind Component
-            obsspace.create_var('ObsValue/windEastward', dtype=uob2.dtype, fillval=wspd2.fill_value) \
-                .write_attr('units', 'm s-1') \
-                .write_attr('long_name', 'Eastward Wind Component') \
-                .write_data(uob2)
-
-            # V-Wind Component
-            obsspace.create_var('ObsValue/windNorthward', dtype=vob2.dtype, fillval=wspd2.fill_value) \
-                .write_attr('units', 'm s-1') \
-                .write_attr('long_name', 'Northward Wind Component') \
-                .write_data(vob2)
+            write_schema_variables(obsspace, schema, {
+                'lon': lon2, 'lat': lat2, 'timestamp': timestamp2, 'satid': satid2,
+                'satzenang': satzenang2, 'chanfreq': chanfreq2, 'ogce': ogce2, 'qifn': qifn2,
+                'swcm': swcm2, 'pressure': pressure2, 'height': height2, 'stnelev': stnelev2,
+                'obstype': obstype2, 'uob': uob2, 'vob': vob2, 'wspd': wspd2
+            })
 
             end_time = time.time()
             running_time = end_time - start_time
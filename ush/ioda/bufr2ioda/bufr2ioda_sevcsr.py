@@ -11,6 +11,7 @@ from datetime import datetime
 import numpy as np
 import numpy.ma as ma
 from wxflow import Logger
+from satellite_split import SatelliteSplitter
 
 from pyioda import ioda_obs_space as ioda_ospace
 from pyiodaconv import bufr
@@ -214,8 +215,25 @@ def bufr_to_ioda(config, logger):
     # =====================================
     logger.info("Create IODA ObsSpace and Write IODA output based on satellite ID")
 
-    # Find nique satellite identifiers in data to process
-    unique_satids = np.unique(satid)
+    # Sort the observations by satellite once, so that each satellite is a
+    # contiguous slice of the sorted arrays
+    splitter = SatelliteSplitter(satid, satellite_info_array)
+    (
+        lon, lat, timestamp, satid, instid, satzenang, scanpos, solzenang,
+        cldFree, cloudAmount, BT, clrStdDev,
+    ) = splitter.sort(
+        lon, lat, timestamp, satid, instid, satzenang, scanpos, solzenang,
+        cldFree, cloudAmount, BT, clrStdDev,
+    )
+    viewang, sataziang, solaziang = splitter.sort(
+        viewang.flatten(), sataziang.flatten(), solaziang.flatten()
+    )
+
+    # Define a boolean mask based on the condition 0 < satzenang < 80
+    satzenang_mask = np.logical_and(0 < satzenang, satzenang < 80)
+
+    # Find unique satellite identifiers in data to process
+    unique_satids = splitter.satids
     logger.info(f"Number of Unique satellite identifiers: {len(unique_satids)}")
     logger.info(f"Unique satellite identifiers: {unique_satids}")
     logger.debug(f"Loop through unique satellite identifier {unique_satids}")
@@ -223,16 +241,14 @@ def bufr_to_ioda(config, logger):
     for sat in unique_satids.tolist():
         start_time = time.time()
 
-        matched = False
-        for satellite_info in satellite_info_array:
-            if satellite_info["satellite_id"] == sat:
-                matched = True
-                satellite_id = satellite_info["satellite_id"]
-                satellite_name = satellite_info["satellite_name"]
-                satinst = sensor_name.lower() + "_" + satellite_name.lower()
-                logger.debug(f"Split data for {satinst} satid = {sat}")
-
+        satellite_info = splitter.info(sat)
+        matched = satellite_info is not None
         if matched:
+            satellite_id = satellite_info["satellite_id"]
+            satellite_name = satellite_info["satellite_name"]
+            satinst = sensor_name.lower() + "_" + satellite_name.lower()
+            logger.debug(f"Split data for {satinst} satid = {sat}")
+
             if satellite_id in wavenum_values_dict:
                 # Extract the wavenum values for the current satellite ID
                 Wavenum = wavenum_values_dict[satellite_id]
@@ -240,38 +256,35 @@ def bufr_to_ioda(config, logger):
                 # If the satellite ID is not in the dictionary
                 logger.debug(f"satellite ID is not in the dictionary {satellite_id}")
 
-            # Define a boolean mask to subset data from the original data object
-            satelite_mask = satid == sat
-
-            # Define a boolean mask based on the condition 0 < satzenang2 < 80
-            satzenang_mask = np.logical_and(0 < satzenang, satzenang < 80)
+            # Contiguous slice of the sorted data for this satellite
+            satellite_slice = splitter[sat]
 
-            combined_mask = satzenang_mask * satelite_mask
+            combined_mask = ma.filled(satzenang_mask[satellite_slice], False)
 
             # MetaData
-            lon2 = lon[combined_mask]
-            lat2 = lat[combined_mask]
-            timestamp2 = timestamp[combined_mask]
-            satid2 = satid[combined_mask]
-            instid2 = instid[combined_mask]
-            satzenang2 = satzenang[combined_mask]
+            lon2 = lon[satellite_slice][combined_mask]
+            lat2 = lat[satellite_slice][combined_mask]
+            timestamp2 = timestamp[satellite_slice][combined_mask]
+            satid2 = satid[satellite_slice][combined_mask]
+            instid2 = instid[satellite_slice][combined_mask]
+            satzenang2 = satzenang[satellite_slice][combined_mask]
             chanfreq2 = chanfreq[3:11]
 
             # Convert scanpos to np.int32 before applying the mask
-            scanpos2 = scanpos.astype(np.int32)[combined_mask]
+            scanpos2 = scanpos[satellite_slice].astype(np.int32)[combined_mask]
             # Replace masked values with the fill value before writing to IODA variable
             scanpos2 = np.where(scanpos2.mask, int32_fill_value, scanpos2)
-            solzenang2 = solzenang[combined_mask]
-            cldFree2 = cldFree[combined_mask]
-            cloudAmount2 = cloudAmount[combined_mask]
-            BT2 = BT[combined_mask]
+            solzenang2 = solzenang[satellite_slice][combined_mask]
+            cldFree2 = cldFree[satellite_slice][combined_mask]
+            cloudAmount2 = cloudAmount[satellite_slice][combined_mask]
+            BT2 = BT[satellite_slice][combined_mask]
 
             # Extract only channels 4 to 11
             BT2 = BT2[:, 3:11]
-            clrStdDev2 = clrStdDev[combined_mask]
-            viewang2 = viewang.flatten()[combined_mask]
-            sataziang2 = sataziang.flatten()[combined_mask]
-            solaziang2 = solaziang.flatten()[combined_mask]
+            clrStdDev2 = clrStdDev[satellite_slice][combined_mask]
+            viewang2 = viewang[satellite_slice][combined_mask]
+            sataziang2 = sataziang[satellite_slice][combined_mask]
+            solaziang2 = solaziang[satellite_slice][combined_mask]
 
             # Timestamp Range
             timestamp2_min = datetime.fromtimestamp(timestamp2.min())
@@ -17,14 +17,7 @@ from pyiodaconv import bufr
 from collections import namedtuple
 from pyioda import ioda_obs_space as ioda_ospace
 from wxflow import Logger
-
-
-def Compute_dateTime(cycleTimeSinceEpoch, dhr):
-
-    dhr = np.int64(dhr*3600)
-    dateTime = dhr + cycleTimeSinceEpoch
-
-    return dateTime
+from kernels import Compute_dateTime
 
 
 def bufr_to_ioda(config, logger):
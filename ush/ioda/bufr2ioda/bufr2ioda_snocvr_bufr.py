@@ -17,6 +17,7 @@ from pyiodaconv import bufr
 from collections import namedtuple
 from pyioda import ioda_obs_space as ioda_ospace
 from wxflow import Logger
+from kernels import Fill_missing
 
 
 def bufr_to_ioda(config, logger):
@@ -104,9 +105,7 @@ def bufr_to_ioda(config, logger):
     snod = r.get('totalSnowDepth')
 
     logger.debug(f" ... Repalcing missed WGOSLID with local Sation ID ...")
-    for i in range(len(sid)):
-        if (str(sid[i]) == "--"):
-            sid[i] = sidl[i]
+    sid = Fill_missing(sid, sidl)
 
     logger.debug(f" ... Convering snow depth unit from m into mm ...")
     snod *= 1000
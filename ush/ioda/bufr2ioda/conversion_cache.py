@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# (C) Copyright 2024 NOAA/NWS/NCEP/EMC
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+
+# Content-addressed cache of IODA converter outputs. A conversion is keyed
+# on its input files (size and mtime, or their content), its rendered
+# config and the version of the converter; when a cycle is rerun with the
+# same key the previous outputs are hard-linked (or copied) instead of
+# running the converter again. Entries unused for max_age_days are
+# dropped, then the least recently used ones until the cache fits in
+# max_size_gb.
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from wxflow import Logger
+
+logger = Logger('conversion_cache.py', level='INFO', colored_log=True)
+
+# files that make up the version of a python converter
+CONVERTER_SOURCE_SUFFIXES = ('.py', '.yaml', '.json')
+CHUNK_SIZE = 1 << 20
+# default bounds of the cache
+MAX_SIZE_GB = 100.0
+MAX_AGE_DAYS = 30.0
+
+
+def file_digest(path):
+    """sha256 of the content of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(src, dst):
+    """Hard-link src to dst, or copy it across file systems."""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class ConversionCache:
+    """
+    Cache of converter outputs under cache_dir, one directory per key.
+
+    By default the input files enter the key through their size and
+    modification time; with hash_inputs their content is hashed instead,
+    which also catches a dump rewritten in place with the same size.
+    A bound set to None is not enforced.
+    """
+
+    def __init__(self, cache_dir, hash_inputs=False, max_size_gb=MAX_SIZE_GB, max_age_days=MAX_AGE_DAYS):
+        self.cache_dir = cache_dir
+        self.hash_inputs = hash_inputs
+        self.max_bytes = max_size_gb * 1.0e9 if max_size_gb is not None else None
+        self.max_age = max_age_days * 86400.0 if max_age_days is not None else None
+        self.versions = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def converter_version(self, converter):
+        """
+        Digest of a converter. A python converter is versioned with all the
+        sources of its directory, so that a change to a shared module also
+        invalidates its outputs; an executable with its own content.
+        """
+        if converter not in self.versions:
+            if converter.endswith('.py'):
+                digest = hashlib.sha256()
+                converter_dir = os.path.dirname(os.path.realpath(converter))
+                for root, dirs, files in os.walk(converter_dir):
+                    dirs.sort()
+                    for filename in sorted(files):
+                        if filename.endswith(CONVERTER_SOURCE_SUFFIXES):
+                            path = os.path.join(root, filename)
+                            digest.update(os.path.relpath(path, converter_dir).encode())
+                            digest.update(file_digest(path).encode())
+                self.versions[converter] = digest.hexdigest()
+            else:
+                self.versions[converter] = file_digest(converter)
+        return self.versions[converter]
+
+    def key(self, converter, configfile, input_files):
+        """
+        Key of a conversion, or None if it cannot be cached because its
+        inputs are unknown or missing.
+        """
+        if not input_files or not all(os.path.isfile(f) for f in input_files):
+            return None
+
+        digest = hashlib.sha256()
+        digest.update(os.path.basename(converter).encode())
+        digest.update(self.converter_version(converter).encode())
+        digest.update(file_digest(configfile).encode())
+        for input_file in sorted(input_files):
+            digest.update(os.path.basename(input_file).encode())
+            if self.hash_inputs:
+                digest.update(file_digest(input_file).encode())
+            else:
+                stat = os.stat(input_file)
+                digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()
+
+    def restore(self, key, output_dir):
+        """
+        Link the outputs cached under key into output_dir. Returns the list
+        of restored files, or None on a cache miss. The restored files share
+        their inode with the cache: they must be replaced, never modified in
+        place (link_or_copy removes its destination first).
+        """
+        if key is None:
+            return None
+        entry = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(entry):
+            return None
+
+        restored = []
+        for filename in sorted(os.listdir(entry)):
+            output_file = os.path.join(output_dir, filename)
+            link_or_copy(os.path.join(entry, filename), output_file)
+            restored.append(output_file)
+        # the mtime of an entry is its last use, for the pruning
+        os.utime(entry)
+        logger.info(f"Cache hit {key[:12]}: restored {len(restored)} file(s) to {output_dir}")
+        return restored
+
+    def store(self, key, output_files):
+        """
+        Cache a copy of the outputs of a conversion under key. The entry is
+        assembled in a temporary directory and renamed, so that a failed or
+        concurrent store never leaves a partial entry behind. The outputs
+        are copied, not linked, so that they stay independent of the cache
+        and keep their permissions.
+        """
+        if key is None or not output_files:
+            return
+        entry = os.path.join(self.cache_dir, key)
+        if os.path.isdir(entry):
+            return
+
+        tmp_entry = tempfile.mkdtemp(prefix=f".{key}.", dir=self.cache_dir)
+        try:
+            for output_file in output_files:
+                cached_file = os.path.join(tmp_entry, os.path.basename(output_file))
+                shutil.copy2(output_file, cached_file)
+            os.rename(tmp_entry, entry)
+        except OSError:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            if not os.path.isdir(entry):
+                raise
+        logger.info(f"Cached {len(output_files)} file(s) under {key[:12]}")
+        self.prune()
+
+    def prune(self):
+        """
+        Remove the entries unused for more than max_age_days, then the least
+        recently used ones until the cache is no larger than max_size_gb.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry = os.path.join(self.cache_dir, name)
+            # skip the entries being stored
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+            try:
+                last_use = os.stat(entry).st_mtime
+                size = sum(os.stat(os.path.join(entry, f)).st_size for f in os.listdir(entry))
+            except FileNotFoundError:
+                # removed by a concurrent prune
+                continue
+            entries.append((last_use, size, entry))
+        entries.sort()
+
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for last_use, size, entry in entries:
+            expired = self.max_age is not None and now - last_use > self.max_age
+            oversized = self.max_bytes is not None and total > self.max_bytes
+            if not (expired or oversized):
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} cache entries, {total / 1.0e9:.1f} GB left in {self.cache_dir}")
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# (C) Copyright 2024 NOAA/NWS/NCEP/EMC
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+
+# Cost-aware scheduling of the bufr2ioda converters. Each job is costed from
+# the size of its input dump and from the runtimes of previous cycles, kept
+# in a small JSON history file. The most expensive jobs are started first,
+# and a job is only started when its estimated memory fits in the budget
+# left by the jobs already running.
+
+import json
+import os
+import queue
+import resource
+import time
+from datetime import datetime
+from pathlib import Path
+import yaml
+from concurrent.futures.process import BrokenProcessPool
+from wxflow import Logger
+
+logger = Logger('converter_scheduler.py', level='INFO', colored_log=True)
+
+# estimates used for converters without history
+DEFAULT_THROUGHPUT = 4.0e6  # input bytes converted per second
+MEMORY_PER_INPUT_BYTE = 20.0
+BASE_MEMORY = 300.0e6  # interpreter, pyiodaconv and pyioda
+MEMORY_BUDGET_FRACTION = 0.8
+
+
+class ConverterJob:
+    """
+    One converter run: the converter, its rendered config and the input
+    dump it reads, with the estimated and measured cost.
+    """
+
+    def __init__(self, obtype, exename, configfile):
+        self.obtype = obtype
+        self.exename = exename
+        self.configfile = configfile
+        self.input_files = find_input_files(configfile)
+        self.input_bytes = max((os.path.getsize(f) for f in self.input_files), default=0)
+        self.runtime_estimate = 0.0
+        self.memory_estimate = BASE_MEMORY
+        self.runtime = None
+        self.maxrss = None
+        self.error = None
+        self.cache_key = None
+        self.cached = False
+
+
+def find_input_files(configfile):
+    """
+    Paths of the BUFR dumps a converter may read, taken from its rendered
+    config. Empty if none can be found.
+    """
+    with open(configfile, 'r') as f:
+        if Path(configfile).suffix == '.json':
+            config = json.load(f)
+        else:
+            config = yaml.safe_load(f)
+
+    if Path(configfile).suffix != '.json':
+        obsdatain = _find_key(config, 'obsdatain')
+        return [obsdatain] if obsdatain and os.path.isfile(obsdatain) else []
+
+    # the python converters build their input path from the cycle; match
+    # the dump by its data type (bufr_d tanks) or its format (prepbufr,
+    # marine tanks) in the cycle directory
+    cycle_type = config['cycle_type']
+    yyyymmdd = config['cycle_datetime'][0:8]
+    hh = config['cycle_datetime'][8:10]
+    dump_dir = os.path.join(config['dump_directory'], f"{cycle_type}.{yyyymmdd}", hh, 'atmos')
+    if not os.path.isdir(dump_dir):
+        return []
+
+    token = config['data_type'] if config['data_format'] == 'bufr_d' else config['data_format']
+    prefix = f"{cycle_type}.t{hh}z."
+
+    return sorted(entry.path for entry in os.scandir(dump_dir)
+                  if entry.name.startswith(prefix) and token in entry.name[len(prefix):].split('.'))
+
+
+def _find_key(config, key):
+    if isinstance(config, dict):
+        if key in config:
+            return config[key]
+        config = list(config.values())
+    if isinstance(config, list):
+        for item in config:
+            value = _find_key(item, key)
+            if value is not None:
+                return value
+    return None
+
+
+def load_history(history_file):
+    if history_file is None or not os.path.isfile(history_file):
+        return {}
+    with open(history_file, 'r') as f:
+        return json.load(f)
+
+
+def save_history(history_file, history, jobs):
+    """
+    Record the runtime and peak memory of the successful jobs. A job whose
+    peak memory could not be measured keeps the one of its last record.
+    """
+    if history_file is None:
+        return
+    for job in jobs:
+        if job.error is None and job.runtime is not None:
+            maxrss = job.maxrss
+            if maxrss is None:
+                maxrss = history.get(job.obtype, {}).get('maxrss')
+            history[job.obtype] = {'runtime': job.runtime,
+                                   'input_bytes': job.input_bytes,
+                                   'maxrss': maxrss}
+    tmp_file = f"{history_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(history, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, history_file)
+
+
+def estimate_costs(jobs, history):
+    """
+    Estimate the runtime and memory of each job. Past measurements are
+    scaled by the ratio of the input sizes; converters never run before
+    are costed from their input size alone.
+    """
+    rates = sorted(entry['input_bytes'] / entry['runtime'] for entry in history.values()
+                   if entry.get('input_bytes') and entry.get('runtime'))
+    throughput = rates[len(rates) // 2] if rates else DEFAULT_THROUGHPUT
+
+    for job in jobs:
+        past = history.get(job.obtype)
+        if past and past.get('runtime'):
+            scale = job.input_bytes / past['input_bytes'] if job.input_bytes and past.get('input_bytes') else 1.0
+            job.runtime_estimate = past['runtime'] * scale
+            if past.get('maxrss'):
+                job.memory_estimate = max(past['maxrss'] * scale, BASE_MEMORY)
+        else:
+            job.runtime_estimate = job.input_bytes / throughput
+            job.memory_estimate = BASE_MEMORY + job.input_bytes * MEMORY_PER_INPUT_BYTE
+
+
+def default_memory_budget():
+    return MEMORY_BUDGET_FRACTION * os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+
+def _peak_rss():
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def timed_converter(runner, exename, configfile):
+    """
+    Run a converter in a worker and return its wall time and the peak
+    resident memory of the converter, or None if it cannot be told apart.
+
+    Workers are reused and ru_maxrss is a peak over the lifetime of the
+    worker (RUSAGE_SELF) or over all its past children (RUSAGE_CHILDREN).
+    A peak that rose during the job was reached by this job; otherwise the
+    job stayed below an earlier one and its own peak is unknown.
+    """
+    self_before, children_before = _peak_rss()
+    start = time.perf_counter()
+    runner(exename, configfile)
+    runtime = time.perf_counter() - start
+    self_after, children_after = _peak_rss()
+
+    peaks = [after for before, after in [(self_before, self_after), (children_before, children_after)]
+             if after > before]
+    maxrss = max(peaks) * 1024 if peaks else None
+
+    return runtime, maxrss
+
+
+def run_jobs(new_executor, runner, jobs, max_workers, memory_budget):
+    """
+    Run the jobs on a process pool made by new_executor(), longest first,
+    with at most max_workers jobs running and their estimated memory
+    within memory_budget. A job larger than the budget still runs, alone.
+
+    A worker that dies (segfault, OOM kill) breaks the pool and fails all
+    the jobs running on it. The pool is replaced and those jobs are rerun
+    one at a time: a job that breaks the pool while running alone is the
+    one that crashed, and fails.
+    """
+    pending = sorted(jobs, key=lambda job: job.runtime_estimate, reverse=True)
+    done = queue.Queue()
+    running = {}
+    suspects = set()
+    memory_in_use = 0.0
+    wall_start = time.perf_counter()
+    executor = new_executor()
+
+    try:
+        while pending or running:
+            for job in list(pending):
+                if len(running) >= max_workers:
+                    break
+                if running and (id(job) in suspects or any(id(other) in suspects for other in running.values())):
+                    break
+                if running and memory_in_use + job.memory_estimate > memory_budget:
+                    continue
+                pending.remove(job)
+                running[id(job)] = job
+                memory_in_use += job.memory_estimate
+                logger.info(f"Starting {job.obtype}: estimated {job.runtime_estimate:.1f} s, "
+                            f"{job.memory_estimate / 1.0e9:.2f} GB")
+                future = executor.submit(timed_converter, runner, job.exename, job.configfile)
+                future.add_done_callback(lambda future, job=job, executor=executor: done.put((job, executor, future)))
+
+            job, job_executor, future = done.get()
+            del running[id(job)]
+            memory_in_use -= job.memory_estimate
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                if job_executor is executor:
+                    logger.warning(f"A converter worker died, restarting the pool")
+                    executor.shutdown(wait=False)
+                    executor = new_executor()
+                if id(job) not in suspects:
+                    logger.warning(f"{job.obtype} was running when a worker died, rerunning it alone")
+                    suspects.add(id(job))
+                    pending.insert(0, job)
+                    continue
+            if error is None:
+                job.runtime, job.maxrss = future.result()
+                logger.info(f"Finished {job.obtype} in {job.runtime:.1f} s")
+            else:
+                job.error = error
+                logger.error(f"{job.obtype} failed: {error!r}")
+    finally:
+        executor.shutdown()
+
+    return time.perf_counter() - wall_start
+
+
+def write_timing_report(report_file, jobs, wall_time):
+    """Per-job estimated and measured cost, in the order the jobs were started."""
+    report = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'wall_time': wall_time,
+        'jobs': [{'obtype': job.obtype,
+                  'input_files': job.input_files,
+                  'input_bytes': job.input_bytes,
+                  'runtime_estimate': job.runtime_estimate,
+                  'memory_estimate': job.memory_estimate,
+                  'runtime': job.runtime,
+                  'maxrss': job.maxrss,
+                  'status': 'cached' if job.cached else 'failed' if job.error is not None else 'success'}
+                 for job in sorted(jobs, key=lambda job: job.runtime_estimate, reverse=True)],
+    }
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for job in report['jobs']:
+        runtime = f"{job['runtime']:.1f} s" if job['runtime'] is not None else 'n/a'
+        logger.info(f"{job['obtype']:<40} {job['input_bytes']:>14d} B  "
+                    f"estimated {job['runtime_estimate']:8.1f} s  measured {runtime:>10}  {job['status']}")
+    logger.info(f"Wall time of the converters: {wall_time:.1f} s, report written to {report_file}")
@@ -6,7 +6,9 @@
 import argparse
 import json
 import os
-from wxflow import Logger, parse_j2yaml, cast_strdict_as_dtypedict
+import jinja2
+import yaml
+from wxflow import Logger, Jinja, parse_j2yaml, cast_strdict_as_dtypedict
 from wxflow import add_to_datetime, to_timedelta
 
 # Initialize root logger
@@ -24,6 +26,32 @@ def gen_bufr_json(config, template, output):
     logger.info(f"Wrote to {output}")
 
 
+def gen_bufr_jsons(config, templates):
+    """
+    Render several (template, output) pairs with the same config. The Jinja
+    environment, with the wxflow filters, is set up once per template
+    directory instead of once per template.
+    Returns a dict of the outputs that could not be generated and why.
+    """
+    envs = {}
+    failed = {}
+    for template, output in templates:
+        template_dir, template_name = os.path.split(template)
+        try:
+            if template_dir not in envs:
+                loader = jinja2.FileSystemLoader(template_dir)
+                envs[template_dir] = Jinja(template, config).get_set_env(loader)
+            rendered = envs[template_dir].get_template(template_name).render(**config)
+            bufr_config = yaml.safe_load(rendered)
+            with open(output, "w") as outfile:
+                outfile.write(json.dumps(bufr_config, indent=4))
+        except Exception as e:
+            failed[output] = e
+            continue
+        logger.info(f"Wrote to {output}")
+    return failed
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-t', '--template', type=str, help='Input JSON template', required=True)
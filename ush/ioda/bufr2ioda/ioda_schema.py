@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# (C) Copyright 2024 NOAA/NWS/NCEP/EMC
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+
+# Data-driven writer of IODA variables. A schema (YAML) lists for each IODA
+# variable its source array, dtype, fill value and attributes; the writer
+# turns it into the create_var/write_attr/write_data calls the converters
+# used to spell out one variable at a time.
+
+import os
+import numpy as np
+import yaml
+
+# order in which the attributes are written, matching the converters
+SCHEMA_ATTRIBUTES = ['units', 'valid_range', 'long_name']
+
+
+def load_schema(schema_file):
+    """
+    Read the list of variables of an IODA schema. A relative path is taken
+    relative to this directory, where the schemas are kept.
+    """
+    if not os.path.isabs(schema_file):
+        schema_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), schema_file)
+
+    with open(schema_file, 'r') as f:
+        schema = yaml.safe_load(f)
+
+    return schema['variables']
+
+
+def write_schema_variables(obsspace, schema, data):
+    """
+    Create and write the variables of a schema in an IODA ObsSpace.
+
+    data maps the 'source' keys of the schema to the arrays to write.
+    All variables are created and their attributes written first, then the
+    data are written, so the file metadata is laid out in one pass.
+    """
+    variables = []
+    for entry in schema:
+        source = entry['source']
+        if source not in data:
+            if entry.get('optional', False):
+                continue
+            raise KeyError(f"No data provided for {entry['name']} (source '{source}')")
+
+        array = data[source]
+        dtype = np.dtype(entry['dtype']) if 'dtype' in entry else array.dtype
+        fillval = data[entry.get('fillval_source', source)].fill_value
+
+        var = obsspace.create_var(entry['name'], dtype=dtype, fillval=fillval)
+        for attr in SCHEMA_ATTRIBUTES:
+            if attr not in entry:
+                continue
+            value = entry[attr]
+            if attr == 'valid_range':
+                value = np.array(value, dtype=np.float32)
+            var.write_attr(attr, value)
+
+        variables.append((var, array))
+
+    for var, array in variables:
+        var.write_data(array)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# (C) Copyright 2024 NOAA/NWS/NCEP/EMC
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+
+# Vectorized derivations shared by the bufr2ioda converters. All kernels
+# accept the masked arrays returned by a ResultSet and operate on whole
+# arrays at once, without Python loops over the observations.
+
+import mmap
+import os
+import numpy as np
+import numpy.ma as ma
+
+
+def Compute_dateTime(cycleTimeSinceEpoch, dhr):
+    """
+    Observation time in seconds since epoch from the cycle time and the
+    offset dhr in hours. Missing offsets are masked in the output.
+    """
+    int64_fill_value = np.int64(0)
+
+    dateTime = (ma.filled(dhr, 0) * 3600).astype(np.int64) + cycleTimeSinceEpoch
+    dateTime[ma.getmaskarray(dhr)] = int64_fill_value
+
+    dateTime = ma.array(dateTime)
+    dateTime = ma.masked_values(dateTime, int64_fill_value)
+
+    return dateTime
+
+
+def Derive_stationIdentification(said, ptid, width=4):
+    """
+    Station identification built as the zero-padded satellite identifier
+    followed by the zero-padded transmitter identifier, e.g. '00440005'.
+    The id is masked where either input is missing.
+    """
+    said_str = np.char.zfill(ma.filled(said, 0).astype('str'), width)
+    ptid_str = np.char.zfill(ma.filled(ptid, 0).astype('str'), width)
+
+    stid = ma.array(np.char.add(said_str, ptid_str),
+                    mask=ma.getmaskarray(said) | ma.getmaskarray(ptid))
+    ma.set_fill_value(stid, "")
+
+    return stid
+
+
+def Compute_Grid_Location(degrees):
+    """
+    Convert grid locations from degrees to radians in place. Values
+    outside [-180, 360] and missing values are left untouched.
+    """
+    valid = ma.filled((degrees <= 360) & (degrees >= -180), False)
+    degrees[valid] = np.deg2rad(degrees[valid])
+    rad = degrees
+
+    return rad
+
+
+def Fill_missing(values, fallback):
+    """
+    Replace the missing entries of values by the matching entries of
+    fallback. String arrays are widened to fit the longest of both.
+    """
+    missing = ma.getmaskarray(values)
+
+    filled = ma.array(np.where(missing, ma.filled(fallback), ma.filled(values)),
+                      mask=missing & ma.getmaskarray(fallback))
+    ma.set_fill_value(filled, values.fill_value)
+
+    return filled
+
+
+def concatenate_chunks(chunks):
+    """
+    Concatenate, name by name, the dicts of arrays derived from successive
+    chunks of a BUFR file. Masked arrays keep the fill value of the first
+    chunk, plain arrays stay plain.
+    """
+    arrays = {}
+    for name, first in chunks[0].items():
+        if isinstance(first, ma.MaskedArray):
+            arrays[name] = ma.concatenate([chunk[name] for chunk in chunks])
+            ma.set_fill_value(arrays[name], first.fill_value)
+        else:
+            arrays[name] = np.concatenate([chunk[name] for chunk in chunks])
+
+    return arrays
+
+
+# data category of the messages holding the DX tables of a file
+BUFR_TABLES_CATEGORY = 11
+
+
+def count_data_messages(path):
+    """
+    Number of data messages in a BUFR file, read from section 0 (total
+    length, edition) and section 1 (data category) of each message. The
+    table messages are skipped, as they are by File.execute(next=...), so
+    that the chunks of a file can be counted without reading past its end.
+    """
+    if os.path.getsize(path) == 0:
+        return 0
+
+    count = 0
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        pos = m.find(b'BUFR')
+        while pos >= 0:
+            length = int.from_bytes(m[pos + 4:pos + 7], 'big')
+            edition = m[pos + 7]
+            # section 1 starts after the 8 octets of section 0, its data
+            # category is octet 11 in edition 4, octet 9 before
+            category_pos = pos + 8 + (10 if edition >= 4 else 8)
+            if category_pos < len(m) and m[category_pos] != BUFR_TABLES_CATEGORY:
+                count += 1
+            pos = m.find(b'BUFR', pos + max(length, 4))
+
+    return count
+
+
+def chunk_count(path, chunk_size):
+    """Number of chunks of chunk_size data messages that make up a BUFR file."""
+    return -(-count_data_messages(path) // chunk_size)
@@ -1,14 +1,15 @@
 import numpy as np
 from pyiodaconv import bufr
 from b2iconverter.ioda_variables import IODAVariables
+from b2iconverter.util import decimal_digit
 
 
 class ArgoIODAVariables(IODAVariables):
     def __init__(self):
         super().__init__()
 
-    def build_query(self):
-        q = super().build_query()
+    def build_query(self, q=None):
+        q = super().build_query(q)
         q.add('stationID', '*/WMOP')
         q.add('latitude', '*/CLATH')
         q.add('longitude', '*/CLONH')
@@ -22,12 +23,14 @@ class ArgoIODAVariables(IODAVariables):
         # convert depth in pressure units to meters (rho * g * h)
         self.metadata.depth = np.float32(self.metadata.depth.astype(float) * 0.0001)
 
-    def filter(self):
-        TS_mask = self.TemperatureFilter() & self.SalinityFilter()
+    def classify(self):
         # Separate ARGO profiles from subpfl tank
         # the index for ARGO floats where the second number of the stationID=9
-        id_mask = [True if str(x)[1] == '9' else False for x in self.metadata.stationID]
-        mask = TS_mask & id_mask
+        return decimal_digit(self.metadata.stationID, 1) == 9
+
+    def filter(self):
+        TS_mask = self.TemperatureFilter() & self.SalinityFilter()
+        mask = TS_mask & self.classify()
         self.metadata.filter(mask)
         self.temp = self.temp[mask]
         self.saln = self.saln[mask]
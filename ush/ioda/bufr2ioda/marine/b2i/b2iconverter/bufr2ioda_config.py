@@ -39,6 +39,8 @@ class Bufr2iodaConfig:
         self.dump_dir = config["dump_directory"]
         self.ioda_dir = config["ioda_directory"]
         self.ocean_basin = config["ocean_basin"]
+        # number of BUFR messages decoded at a time, 0 for the whole file
+        self.chunk_size = config.get("chunk_size", 0)
 
         self.yyyymmdd = self.cycle_datetime[0:8]
         self.hh = self.cycle_datetime[8:10]
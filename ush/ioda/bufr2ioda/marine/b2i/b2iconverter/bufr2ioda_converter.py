@@ -3,12 +3,18 @@ import numpy as np
 import numpy.ma as ma
 import os
 import time
+import multiprocessing as mp
 from datetime import datetime
 from pyiodaconv import bufr
 from collections import namedtuple
 from pyioda import ioda_obs_space as ioda_ospace
-from .util import parse_arguments, run_diff
+from .util import parse_arguments, run_diff, set_hashing, reference_hash_algorithm
 from .bufr2ioda_config import Bufr2iodaConfig
+from .ocean import OceanBasin
+# the chunk helpers are shared with the other bufr2ioda converters, in
+# ush/ioda/bufr2ioda
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+from kernels import chunk_count, concatenate_chunks
 import logging
 import tempfile
 
@@ -19,9 +25,10 @@ import tempfile
 # for testing purposes a temporary file is written by the logger
 # and it is compared to a reference file
 # the logger provides simple human readable numbers,
-# as well as cryptographic hashes generated from input
-# the hashes are deterministic, yet they are supposedly capable
-# of detecting an error with high probability
+# as well as hashes generated from the variables (their data, dtype,
+# shape and mask); the hashes are deterministic, yet they are supposedly
+# capable of detecting an error with high probability
+# hashes are only computed when a log file or a test reference is given
 
 class Bufr2ioda_Converter:
     def __init__(self, bufr2ioda_config, ioda_vars, logfile):
@@ -29,6 +36,8 @@ class Bufr2ioda_Converter:
         self.bufr2ioda_config = bufr2ioda_config
         self.ioda_vars = ioda_vars
         self.logfile = logfile
+        if logfile:
+            set_hashing('fast')
         self.setup_logging(bufr2ioda_config.script_name, self.logfile)
 
     def setup_logging(self, script_name, logfile):
@@ -37,12 +46,14 @@ class Bufr2ioda_Converter:
 
         formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-        console_handler = logging.StreamHandler()
-        # console_handler.setLevel(logging.INFO)
-        console_handler.setLevel(logging.DEBUG)
-        console_handler.setFormatter(formatter)
+        # in batch mode a worker may run the same script more than once
+        if not self.logger.handlers:
+            console_handler = logging.StreamHandler()
+            # console_handler.setLevel(logging.INFO)
+            console_handler.setLevel(logging.DEBUG)
+            console_handler.setFormatter(formatter)
 
-        self.logger.addHandler(console_handler)
+            self.logger.addHandler(console_handler)
 
         if (logfile):
             self.file_handler = logging.FileHandler(logfile)
@@ -53,19 +64,65 @@ class Bufr2ioda_Converter:
     def run(self):
         start_time = time.time()
 
-        self.logger.debug(f"build_query")
-        q = self.ioda_vars.build_query()
+        if self.bufr2ioda_config.chunk_size > 0:
+            self.decode_chunks(self.bufr2ioda_config.chunk_size)
+            self.write()
+        else:
+            r = self.execute_query()
+            self.convert(r)
+
+        end_time = time.time()
+        running_time = end_time - start_time
+        self.logger.debug(f"Total running time: {running_time} seconds")
+        return running_time
+
+    def execute_query(self, q=None):
+        if q is None:
+            self.logger.debug(f"build_query")
+            q = self.ioda_vars.build_query()
 
         bufrfile_path = self.bufr2ioda_config.bufr_filepath()
         self.logger.debug(f"ExecuteQuery: BUFR file = {bufrfile_path}")
         with bufr.File(bufrfile_path) as f:
             r = f.execute(q)
+        return r
+
+    # chunked mode: the file is decoded chunk_size messages at a time and
+    # each chunk is filtered before the next one is decoded, so that only
+    # the rows kept, not the whole tank, are held in memory
+    # decoding goes on until all the messages of the file are read, a chunk
+    # without any row (e.g. only other subsets) does not end it
+    def decode_chunks(self, chunk_size):
+        self.logger.debug(f"build_query")
+        q = self.ioda_vars.build_query()
+
+        bufrfile_path = self.bufr2ioda_config.bufr_filepath()
+        self.logger.debug(f"ExecuteQuery: BUFR file = {bufrfile_path}, {chunk_size} messages at a time")
+        chunks = []
+        with bufr.File(bufrfile_path) as f:
+            for _ in range(chunk_count(bufrfile_path, chunk_size)):
+                r = f.execute(q, next=chunk_size)
+                self.ioda_vars.set_from_query_result(r)
+                if len(self.ioda_vars.metadata.lat) == 0:
+                    continue
+                self.ioda_vars.filter()
+                chunks.append((location_fields(self.ioda_vars), location_fields(self.ioda_vars.metadata)))
+        self.logger.debug(f"ExecuteQuery: {len(chunks)} chunks")
 
+        if chunks:
+            for i, obj in enumerate([self.ioda_vars, self.ioda_vars.metadata]):
+                for name, array in concatenate_chunks([chunk[i] for chunk in chunks]).items():
+                    setattr(obj, name, array)
+
+    def convert(self, r):
         # process query results and set ioda variables
         self.ioda_vars.set_from_query_result(r)
 
         self.ioda_vars.filter()
 
+        self.write()
+
+    def write(self):
         # set seqNum, PreQC, ObsError, OceanBasin
         self.ioda_vars.additional_vars.construct()
 
@@ -92,10 +149,6 @@ class Bufr2ioda_Converter:
         if (self.logfile):
             self.logger.removeHandler(self.file_handler)
 
-        end_time = time.time()
-        running_time = end_time - start_time
-        self.logger.debug(f"Total running time: {running_time} seconds")
-
     def test(self, test_file):
         with tempfile.NamedTemporaryFile(delete=False, suffix='.log') as temp_log_file:
             temp_log_file_name = temp_log_file.name
@@ -108,6 +161,8 @@ class Bufr2ioda_Converter:
             self.logger.debug(f"TEST: running diff with reference file {test_file}")
             self.logger.addHandler(file_handler)
 
+            # references written before the fast digest hold sha256 hashes
+            set_hashing(reference_hash_algorithm(test_file))
             self.ioda_vars.log(self.logger)
 
             result = run_diff(temp_log_file_name, test_file, self.logger)
@@ -117,3 +172,129 @@ class Bufr2ioda_Converter:
                 self.logger.info(f"TEST passed: files are identical")
 
             return result
+
+
+def location_fields(obj):
+    return {name: getattr(obj, name) for name in obj.LOCATION_FIELDS}
+
+
+# multi-output mode: the rows of one tank shared by several platforms (e.g.
+# ARGO and gliders in subpfl, drifters and tropical moorings in dbuoy) are
+# decoded once and each output keeps its own rows with its filter()
+# the query executed is the union of the queries of all the outputs
+
+class QueryUnion:
+    """
+    Fields of the queries of several outputs, merged by name. An output may
+    ask for a field already added by another one, but not under another path.
+    """
+
+    def __init__(self):
+        self.paths = {}
+
+    def add(self, name, path):
+        if self.paths.setdefault(name, path) != path:
+            raise ValueError(f"field {name} queried as {self.paths[name]} and as {path} by the outputs of a shared tank")
+
+    def query_set(self):
+        q = bufr.QuerySet()
+        for name, path in self.paths.items():
+            q.add(name, path)
+        return q
+
+
+class SharedResultSet:
+    """
+    Query result shared by several outputs. Each field is extracted once,
+    and every output gets its own copy, so that in-place changes (such as
+    the conversion of temperatures to Celsius) do not leak between outputs.
+    """
+
+    def __init__(self, r):
+        self.r = r
+        self.fields = {}
+
+    def get(self, *args, **kwargs):
+        return self.extract('get', args, kwargs)
+
+    def get_datetime(self, *args, **kwargs):
+        return self.extract('get_datetime', args, kwargs)
+
+    def extract(self, method, args, kwargs):
+        key = (method, args, tuple(sorted(kwargs.items())))
+        if key not in self.fields:
+            self.fields[key] = getattr(self.r, method)(*args, **kwargs)
+        return self.fields[key].copy()
+
+
+class Bufr2ioda_MultiConverter:
+    def __init__(self, outputs, logfile):
+        self.converters = [Bufr2ioda_Converter(bufr2ioda_config, ioda_vars, logfile)
+                           for bufr2ioda_config, ioda_vars in outputs]
+        bufrfile_paths = {converter.bufr2ioda_config.bufr_filepath() for converter in self.converters}
+        if len(bufrfile_paths) != 1:
+            raise ValueError(f"multi-output conversion needs a single BUFR file, got {sorted(bufrfile_paths)}")
+        self.logger = self.converters[0].logger
+
+    def build_query(self):
+        fields = QueryUnion()
+        for converter in self.converters:
+            converter.ioda_vars.build_query(fields)
+        self.logger.debug(f"build_query: {len(fields.paths)} fields for {len(self.converters)} outputs")
+        return fields.query_set()
+
+    def run(self):
+        start_time = time.time()
+
+        r = SharedResultSet(self.converters[0].execute_query(self.build_query()))
+        for converter in self.converters:
+            converter.convert(r)
+
+        running_time = time.time() - start_time
+        self.logger.debug(f"Total running time of {len(self.converters)} outputs: {running_time} seconds")
+        return running_time
+
+
+# batch mode: several tanks converted by a pool of workers of one
+# interpreter, instead of one interpreter per tank
+# the ocean basin grids are read once, before the workers are forked, and
+# the workers share them and the modules imported by the parent
+# it is a standalone driver (bufr2ioda_insitu_batch.py): the ocean obs prep
+# task runs each converter in its own subprocess, with its own timeout and
+# return code in the conversion report, which a shared pool cannot give
+
+def _run_tank(bufr2ioda_config, ioda_vars, logfile):
+    # a failed tank must not stop the others, its traceback is logged and
+    # it is reported as failed by run_batch
+    try:
+        converter = Bufr2ioda_Converter(bufr2ioda_config, ioda_vars, logfile)
+        return converter.run()
+    except Exception:
+        logging.getLogger('b2iconverter.run_batch').exception(f"{bufr2ioda_config.script_name} failed")
+        return None
+
+
+def run_batch(tanks, num_workers=None, logfile=None):
+    """
+    Convert a list of (bufr2ioda_config, ioda_vars) pairs on num_workers
+    processes (one per cpu by default). Returns the running time in seconds
+    of each tank, None for the tanks that failed.
+    """
+    logger = logging.getLogger('b2iconverter.run_batch')
+    start_time = time.time()
+
+    for bufr2ioda_config, ioda_vars in tanks:
+        ocean = OceanBasin()
+        ocean.set_ocean_basin_nc_file(bufr2ioda_config.ocean_basin_nc_file_path())
+        ocean.read_nc_file()
+
+    with mp.Pool(num_workers) as pool:
+        running_times = pool.starmap(_run_tank, [(bufr2ioda_config, ioda_vars, logfile)
+                                                 for bufr2ioda_config, ioda_vars in tanks])
+
+    for (bufr2ioda_config, ioda_vars), running_time in zip(tanks, running_times):
+        status = f"{running_time:.2f} seconds" if running_time is not None else "failed"
+        logger.info(f"{bufr2ioda_config.ioda_filename()}: {status}")
+    logger.info(f"Total running time of the batch: {time.time() - start_time:.2f} seconds")
+
+    return running_times
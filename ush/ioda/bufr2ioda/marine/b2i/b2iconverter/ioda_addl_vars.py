@@ -26,8 +26,7 @@ class IODAAdditionalVariables:
         lat = self.ioda_vars.metadata.lat
         lon = self.ioda_vars.metadata.lon
         self.ocean.read_nc_file()
-        ob = self.ocean.get_station_basin(lat, lon)
-        self.OceanBasin = np.array(ob, dtype=np.int32)
+        self.OceanBasin = self.ocean.get_station_basin(lat, lon, self.PreQC.fill_value)
 
     def set_temperature_error(self, e):
         self.T_error = e
@@ -74,7 +73,7 @@ class IODAAdditionalVariables:
 
     def log_seq_num(self, logger):
         log_variable(logger, "seqNum", self.seqNum)
-        logger.debug(f"seqNum hash = {compute_hash(self.seqNum)}")
+        log_hash(logger, "seqNum", self.seqNum)
 
     def log_preqc(self, logger):
         log_variable(logger, "PreQC", self.PreQC)
@@ -87,7 +86,7 @@ class IODAAdditionalVariables:
 
     def log_ocean_basin(self, logger):
         log_variable(logger, "OceanBasin", self.OceanBasin)
-        logger.debug(f"OceanBasin hash = {compute_hash(self.OceanBasin)}")
+        log_hash(logger, "OceanBasin", self.OceanBasin)
 
 #########################################################################
 
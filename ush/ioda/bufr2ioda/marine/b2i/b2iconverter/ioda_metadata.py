@@ -1,9 +1,12 @@
 import numpy as np
 from .util import *
-import hashlib
 
 
 class IODAMetadata:
+    # arrays with one entry per location, filtered together and concatenated
+    # across the chunks of a chunked decoding
+    LOCATION_FIELDS = ('dateTime', 'rcptdateTime', 'lat', 'lon', 'stationID', 'depth')
+
     def __init__(self):
         pass
 
@@ -65,32 +68,25 @@ class IODAMetadata:
 
     def log_longitude(self, logger):
         log_variable(logger, "lon", self.lon)
-        logger.debug(f"lon hash = {compute_hash(self.lon)}")
+        log_hash(logger, "lon", self.lon)
 
     def log_latitude(self, logger):
         log_variable(logger, "lat", self.lat)
-        logger.debug(f"lat hash = {compute_hash(self.lat)}")
+        log_hash(logger, "lat", self.lat)
 
     def log_date_time(self, logger):
         log_variable(logger, "dateTime", self.dateTime)
-        logger.debug(f"dateTime hash = {compute_hash(self.dateTime)}")
+        log_hash(logger, "dateTime", self.dateTime)
 
     def log_rcpt_date_time(self, logger):
         log_variable(logger, "rcptdateTime", self.rcptdateTime)
-        logger.debug(f"rcptdateTime hash = {compute_hash(self.rcptdateTime)}")
+        log_hash(logger, "rcptdateTime", self.rcptdateTime)
 
     def log_station_id(self, logger):
         logger.debug(f"stationID: {len(self.stationID)}, {self.stationID.astype(str).dtype}")
-        if isinstance(self.stationID[0], str):
-            concatenated_string = ''.join(self.stationID)
-            # Compute the hash using SHA-256
-            hash_object = hashlib.sha256(concatenated_string.encode())
-            hash_hex = hash_object.hexdigest()
-            logger.debug(f"stationID hash = {hash_hex}")
-        # # elif isinstance(self.stationID[0], int32):
-        else:
-            logger.debug(f"stationID hash = {compute_hash(self.stationID)}")
+        # string station ids are hashed by compute_hash too
+        log_hash(logger, "stationID", self.stationID)
 
     def log_depth(self, logger):
         log_variable(logger, "depth", self.depth)
-        logger.debug(f"depth hash = {compute_hash(self.depth)}")
+        log_hash(logger, "depth", self.depth)
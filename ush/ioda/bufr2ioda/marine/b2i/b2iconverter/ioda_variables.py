@@ -7,6 +7,9 @@ from .ioda_addl_vars import IODAAdditionalVariables
 
 
 class IODAVariables:
+    # arrays with one entry per location, besides those of the metadata
+    LOCATION_FIELDS = ('temp', 'saln')
+
     def __init__(self):
         self.construct()
         # derived classes add their own additional_vars:
@@ -44,8 +47,11 @@ class IODAVariables:
         self.S_min = smin
         self.S_max = smax
 
-    def build_query(self):
-        q = bufr.QuerySet()
+    # the fields are added to q, a new query set by default, so that the
+    # queries of several outputs can be merged
+    def build_query(self, q=None):
+        if q is None:
+            q = bufr.QuerySet()
         q.add('year', '*/YEAR')
         q.add('month', '*/MNTH')
         q.add('day', '*/DAYS')
@@ -70,6 +76,11 @@ class IODAVariables:
     def SalinityFilter(self):
         return (self.saln >= self.S_min) & (self.saln <= self.S_max)
 
+    # rows of the decoded tank that belong to this platform, all of them
+    # by default; platforms sharing a tank override it
+    def classify(self):
+        return np.full(self.metadata.lat.shape, True)
+
     def filter(self):
         pass
 
@@ -121,8 +132,8 @@ class IODAVariables:
 
     def log_temperature(self, logger):
         log_variable(logger, "temp", self.temp)
-        logger.debug(f"temp hash = {compute_hash(self.temp)}")
+        log_hash(logger, "temp", self.temp)
 
     def log_salinity(self, logger):
         log_variable(logger, "saln", self.saln)
-        logger.debug(f"saln hash = {compute_hash(self.saln)}")
+        log_hash(logger, "saln", self.saln)
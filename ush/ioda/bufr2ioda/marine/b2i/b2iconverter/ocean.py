@@ -4,12 +4,7 @@ import os
 import sys
 import numpy as np
 import numpy.ma as ma
-import math
-import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
 import netCDF4 as nc
-import xarray as xr
 
 # OceanBasin class provides a facility to add an OceanBasin
 # metadata variable using lon and lat
@@ -19,9 +14,48 @@ import xarray as xr
 # in the implementation of the converter
 
 # the main method is get_station_basin which returns the ocean basin
-# for a list of station coordinates
-# there are methods for plotting and printing the ocean basin data
-# as well as printing and plotting station basin data
+# for arrays of station coordinates, looked up on the grid with numpy
+# there are methods for printing the ocean basin data and station basin
+# data; plot_basin and plot_stations are implemented in ocean_plot, which
+# alone imports matplotlib and cartopy, and only when a plot is made
+
+
+# the basin grid read from the nc file is cached next to it as .npy files,
+# which later runs memory-map instead of reading the nc file again; within
+# a process the grid is read only once per file
+_basin_grids = {}
+
+
+def _basin_cache_files(nc_file_path):
+    base, _ = os.path.splitext(nc_file_path)
+    return f"{base}.open_ocean.npy", f"{base}.latlon.npz"
+
+
+def _load_basin_cache(nc_file_path):
+    basin_file, latlon_file = _basin_cache_files(nc_file_path)
+    try:
+        nc_mtime = os.path.getmtime(nc_file_path)
+        if min(os.path.getmtime(basin_file), os.path.getmtime(latlon_file)) < nc_mtime:
+            return None
+        basin_array = np.load(basin_file, mmap_mode='r')
+        with np.load(latlon_file) as latlon:
+            return latlon['lat'], latlon['lon'], basin_array
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _save_basin_cache(nc_file_path, latitudes, longitudes, basin_array):
+    # the fix directory may be read-only, the cache is then simply not written
+    basin_file, latlon_file = _basin_cache_files(nc_file_path)
+    try:
+        tmp_basin_file = f"{basin_file}.{os.getpid()}.tmp.npy"
+        np.save(tmp_basin_file, basin_array)
+        tmp_latlon_file = f"{latlon_file}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_latlon_file, lat=latitudes, lon=longitudes)
+        os.replace(tmp_basin_file, basin_file)
+        os.replace(tmp_latlon_file, latlon_file)
+    except OSError:
+        pass
 
 
 class OceanBasin:
@@ -32,73 +66,73 @@ class OceanBasin:
         self.ocean_basin_nc_file_path = filename
 
     def read_nc_file(self):
+        nc_file_path = self.ocean_basin_nc_file_path
+        grid = _basin_grids.get(nc_file_path)
+        if grid is None:
+            grid = _load_basin_cache(nc_file_path)
+        if grid is None:
+            grid = self.read_basin_grid(nc_file_path)
+            _save_basin_cache(nc_file_path, *grid)
+        _basin_grids[nc_file_path] = grid
+        self.__latitudes, self.__longitudes, self.__basin_array = grid
+
+    def read_basin_grid(self, nc_file_path):
         try:
-            with nc.Dataset(self.ocean_basin_nc_file_path, 'r') as nc_file:
+            with nc.Dataset(nc_file_path, 'r') as nc_file:
                 variable_name = 'open_ocean'
-                if variable_name in nc_file.variables:
-                    lat_dim = nc_file.dimensions['lat'].size
-                    lon_dim = nc_file.dimensions['lon'].size
-                    self.__latitudes = nc_file.variables['lat'][:]
-                    self.__longitudes = nc_file.variables['lon'][:]
-
-                    variable = nc_file.variables[variable_name]
-                    # Read the variable data into a numpy array
-                    variable_data = variable[:]
-                    # Convert to 2D numpy array
-                    self.__basin_array = np.reshape(variable_data, (lat_dim, lon_dim))
+                lat_dim = nc_file.dimensions['lat'].size
+                lon_dim = nc_file.dimensions['lon'].size
+                latitudes = ma.filled(nc_file.variables['lat'][:])
+                longitudes = ma.filled(nc_file.variables['lon'][:])
+
+                variable = nc_file.variables[variable_name]
+                # Read the variable data into a 2D numpy array
+                basin_array = np.reshape(ma.filled(variable[:], 0), (lat_dim, lon_dim)).astype(np.int32)
         except FileNotFoundError:
-            print(f"The file {file_path} does not exist.")
+            print(f"The file {nc_file_path} does not exist.")
             sys.exit(1)
         except IOError as e:
             # Handle other I/O errors, such as permission errors
             print(f"An IOError occurred: {e}")
             sys.exit(1)
+        return latitudes, longitudes, basin_array
+
+    def get_basin_grid(self):
+        return self.__latitudes, self.__longitudes, self.__basin_array
 
     def print_basin(self):
+        n1, n2 = self.__basin_array.shape
         for i in range(n1):
             for j in range(n2):
                 print(i, j, self.__basin_array[i][j])
 
-    def plot_basin(self):
-        # Create a figure and axes with Cartopy projection
-        fig = plt.figure(figsize=(10, 6))
-        ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
-
-        # Plot the ocean basins using a colormap with 6 colors
-        # cmap = plt.cm.get_cmap('rainbow', 6)  # Choose a colormap with 6 colors
-        cmap = plt.get_cmap('viridis', 6)  # Create a colormap with 6 discrete colors
-        im = ax.pcolormesh(self.__longitudes, self.__latitudes, self.__basin_array, cmap='viridis', shading='auto', transform=ccrs.PlateCarree())
-
-        # Add colorbar
-        cbar = fig.colorbar(im, ax=ax, orientation='vertical', pad=0.05, ticks=np.arange(0, 6))
-        cbar.set_label('Ocean Basin', fontsize=12)
-        # Add title and gridlines
-        ax.set_title('Ocean Basin Map', fontsize=16)
-        ax.coastlines()
-        ax.gridlines(draw_labels=True)
-        # Show the plot
-        plt.show()
-        plt.savefig('ocean_basin.png', dpi=300)
+    def plot_basin(self, png_file='ocean_basin.png'):
+        from .ocean_plot import plot_basin
+        plot_basin(self, png_file)
 
     # input: 2 vectors of station coordinates
-    # output: a vector of station ocean basin values
-    def get_station_basin(self, lat, lon):
-        n = len(lon)
-        # print("number of stations = ", n)
-
+    # output: a vector of station ocean basin values, of the same length,
+    # masked (and set to fill_value) where a coordinate is missing
+    def get_station_basin(self, lat, lon, fill_value=999999):
         lat0 = self.__latitudes[0]
         dlat = self.__latitudes[1] - self.__latitudes[0]
         lon0 = self.__longitudes[0]
         dlon = self.__longitudes[1] - self.__longitudes[0]
+        n_lat, n_lon = self.__basin_array.shape
+
+        missing = ma.getmaskarray(lat) | ma.getmaskarray(lon)
+        lat_values = ma.filled(lat, lat0).astype(np.float64)
+        lon_values = ma.filled(lon, lon0).astype(np.float64)
+
+        # nearest grid point; the longitude wraps around the globe
+        i1 = np.clip(np.rint((lat_values - lat0) / dlat).astype(np.int64), 0, n_lat - 1)
+        n_wrap = int(round(360.0 / abs(dlon)))
+        i2 = np.rint((lon_values - lon0) / dlon).astype(np.int64) % n_wrap
+        i2 = np.minimum(i2, n_lon - 1)
 
-        # the data may be a masked array
-        ocean_basin = []
-        for i in range(n):
-            if not ma.is_masked(lat[i]):
-                i1 = round((lat[i] - lat0) / dlat)
-                i2 = round((lon[i] - lon0) / dlon)
-                ocean_basin.append(self.__basin_array[i1][i2])
-        return ocean_basin
+        ocean_basin = np.asarray(self.__basin_array[i1, i2], dtype=np.int32)
+        ocean_basin[missing] = fill_value
+        return ma.array(ocean_basin, mask=missing, fill_value=fill_value)
 
     def print_station_basin(self, lon, lat, file_path):
         ocean_basin = self.get_station_basin(lat, lon)
@@ -108,24 +142,5 @@ class OceanBasin:
                 file.write(f"{lat_val} {lon_val} {basin_val}\n")
 
     def plot_stations(self, lon, lat, png_file):
-        ocean_basin = self.get_station_basin(lon, lat)
-
-        # Initialize the plot
-        plt.figure(figsize=(12, 8))
-        # Create a Cartopy map with PlateCarree projection (latitude/longitude)
-        ax = plt.axes(projection=ccrs.PlateCarree())
-        # Add coastlines and borders
-        ax.coastlines()
-        ax.add_feature(cartopy.feature.BORDERS, linestyle=':', linewidth=0.5)
-
-        # Scatter plot with colored dots for each basin type
-        colors = ['blue', 'green', 'red', 'cyan', 'magenta', 'yellow']
-        for basin_type in range(6):
-            indices = np.where(ocean_basin == basin_type)[0]
-            ax.scatter(lon[indices], lat[indices], color=colors[basin_type], label=f'Basin {basin_type}', alpha=0.7)
-
-        # Add a legend
-        plt.legend(loc='lower left')
-        # Add title and show plot
-        plt.title('Ocean Basins Plot using Cartopy')
-        plt.savefig(png_file, dpi=300)
+        from .ocean_plot import plot_stations
+        plot_stations(self, lon, lat, png_file)
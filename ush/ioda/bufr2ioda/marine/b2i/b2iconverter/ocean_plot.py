@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+# plotting of the ocean basin data and of station basin data
+# matplotlib and cartopy are only needed to make plots, they are imported
+# when a plot is made so that the converters, which only look up basins,
+# do not pay for loading them
+
+
+def plot_basin(ocean, png_file='ocean_basin.png'):
+    import matplotlib.pyplot as plt
+    import cartopy.crs as ccrs
+
+    latitudes, longitudes, basin_array = ocean.get_basin_grid()
+
+    # Create a figure and axes with Cartopy projection
+    fig = plt.figure(figsize=(10, 6))
+    ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
+
+    # Plot the ocean basins
+    im = ax.pcolormesh(longitudes, latitudes, basin_array, cmap='viridis', shading='auto',
+                       transform=ccrs.PlateCarree())
+
+    # Add colorbar
+    cbar = fig.colorbar(im, ax=ax, orientation='vertical', pad=0.05, ticks=np.arange(0, 6))
+    cbar.set_label('Ocean Basin', fontsize=12)
+    # Add title and gridlines
+    ax.set_title('Ocean Basin Map', fontsize=16)
+    ax.coastlines()
+    ax.gridlines(draw_labels=True)
+    # Show the plot
+    plt.show()
+    plt.savefig(png_file, dpi=300)
+
+
+def plot_stations(ocean, lon, lat, png_file):
+    import matplotlib.pyplot as plt
+    import cartopy.crs as ccrs
+    import cartopy.feature as cfeature
+
+    ocean_basin = ocean.get_station_basin(lat, lon)
+
+    # Initialize the plot
+    plt.figure(figsize=(12, 8))
+    # Create a Cartopy map with PlateCarree projection (latitude/longitude)
+    ax = plt.axes(projection=ccrs.PlateCarree())
+    # Add coastlines and borders
+    ax.coastlines()
+    ax.add_feature(cfeature.BORDERS, linestyle=':', linewidth=0.5)
+
+    # Scatter plot with colored dots for each basin type
+    colors = ['blue', 'green', 'red', 'cyan', 'magenta', 'yellow']
+    for basin_type in range(6):
+        indices = np.where(ocean_basin == basin_type)[0]
+        ax.scatter(lon[indices], lat[indices], color=colors[basin_type], label=f'Basin {basin_type}', alpha=0.7)
+
+    # Add a legend
+    plt.legend(loc='lower left')
+    # Add title and show plot
+    plt.title('Ocean Basins Plot using Cartopy')
+    plt.savefig(png_file, dpi=300)
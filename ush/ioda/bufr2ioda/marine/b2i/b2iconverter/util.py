@@ -5,6 +5,7 @@ import subprocess
 import numpy as np
 import tempfile
 import hashlib
+import zlib
 
 
 def parse_arguments():
@@ -32,6 +33,20 @@ def parse_arguments():
     return script_name, config_file, log_file, test_file
 
 
+def decimal_digit(values, position):
+    """
+    Digit at position (0 for the most significant one) of the decimal
+    representation of integers, computed with integer arithmetic.
+    -1 where the number is missing, not positive or has too few digits.
+    """
+    v = np.ma.filled(values, -1).astype(np.int64)
+    powers = 10 ** np.arange(19, dtype=np.int64)
+    n_digits = np.searchsorted(powers, v, side='right')
+    valid = (v > 0) & (n_digits > position)
+    shift = np.where(valid, n_digits - 1 - position, 0)
+    return np.where(valid, (v // powers[shift]) % 10, -1)
+
+
 def log_variable(logger, v_name, v):
     logger.debug(f"{v_name}: {len(v)}, {v.dtype}    min, max = {v.min()}, {v.max()}")
 
@@ -64,22 +79,65 @@ def run_diff(file1, file2, logger):
 
 
 # use hash for testing;
-def compute_hash(sequence, algorithm='sha256'):
+# hashing is off unless enabled with set_hashing(), by the converter when a
+# log file or a test reference is given, so that operational runs do not
+# pay for it
+# 'fast' digests the raw buffer (no copy for contiguous arrays) with its
+# dtype, shape and mask, using crc32 and adler32 for 64 bits;
+# 'sha256' is the digest of the data bytes alone, as in the reference
+# files written before the fast digest
+HASH_ALGORITHMS = ('fast', 'sha256')
+_hash_algorithm = None
+
+
+def set_hashing(algorithm='fast'):
+    """Enable hashing of the logged variables with algorithm, None to disable it."""
+    global _hash_algorithm
+    if algorithm is not None and algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"Unknown hash algorithm {algorithm}, expected one of {HASH_ALGORITHMS}")
+    _hash_algorithm = algorithm
+
+
+def reference_hash_algorithm(test_file):
+    """Hash algorithm a test reference file was written with."""
+    with open(test_file, 'r') as f:
+        for line in f:
+            if ' hash = ' in line:
+                return 'sha256' if len(line.split(' hash = ')[1].strip()) == 64 else 'fast'
+    return 'fast'
+
+
+def compute_hash(sequence, algorithm='fast'):
     """
-    Compute a hash of the given sequence using the specified algorithm.
+    Compute a hash of the given array using the specified algorithm.
 
-    :param sequence: A sequence of numbers (e.g., list of integers).
-    :param algorithm: The hash algorithm to use (e.g., 'sha256').
+    :param sequence: A numpy array, possibly masked.
+    :param algorithm: The hash algorithm to use, 'fast' or 'sha256'.
     :return: The hexadecimal digest of the hash.
     """
-    # Convert the sequence to a byte string
-    sequence_bytes = bytes(sequence)
-    # Create a hash object
-    hash_obj = hashlib.new(algorithm)
-    # Update the hash object with the byte string
-    hash_obj.update(sequence_bytes)
-    # Return the hexadecimal digest of the hash
-    return hash_obj.hexdigest()
+    data = np.ascontiguousarray(np.ma.getdata(sequence))
+    if data.dtype.kind == 'O':
+        data = data.astype(str)
+
+    if algorithm == 'sha256':
+        if data.dtype.kind == 'U':
+            return hashlib.sha256(''.join(data).encode()).hexdigest()
+        return hashlib.sha256(data).hexdigest()
+
+    header = f"{data.dtype.str}{data.shape}".encode()
+    crc = zlib.crc32(data, zlib.crc32(header))
+    adler = zlib.adler32(data, zlib.adler32(header))
+    mask = np.ma.getmask(sequence)
+    if mask is not np.ma.nomask:
+        mask = np.ascontiguousarray(mask)
+        crc = zlib.crc32(mask, crc)
+        adler = zlib.adler32(mask, adler)
+    return f"{crc:08x}{adler:08x}"
+
+
+def log_hash(logger, v_name, v):
+    if _hash_algorithm is not None:
+        logger.debug(f"{v_name} hash = {compute_hash(v, _hash_algorithm)}")
 
 
 #####################################################################
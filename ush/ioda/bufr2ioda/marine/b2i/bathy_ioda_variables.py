@@ -5,12 +5,14 @@ from b2iconverter.ioda_addl_vars import IODAAdditionalVariables, compute_seq_num
 
 
 class BathyIODAVariables(IODAVariables):
+    LOCATION_FIELDS = ('temp',)
+
     def __init__(self):
         self.construct()
         self.additional_vars = BathyAdditionalVariables(self)
 
-    def build_query(self):
-        q = super().build_query()
+    def build_query(self, q=None):
+        q = super().build_query(q)
         q.add('stationID', '*/RPID')
         q.add('latitude', '*/CLAT')
         q.add('longitude', '*/CLON')
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import argparse
+import importlib
+import logging
+import os
+import sys
+from b2iconverter.bufr2ioda_converter import run_batch
+
+
+# converts several marine tanks in one interpreter
+# each tank is given by the converter script of this directory and its
+# configuration file, e.g.
+#   bufr2ioda_insitu_batch.py -t bufr2ioda_insitu_profile_argo.py argo.yaml \
+#                             -t bufr2ioda_insitu_profile_glider.py glider.yaml
+# the converters are set up by the configure() function of their script
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-t', '--tank',
+        nargs=2, action='append', metavar=('SCRIPT', 'CONFIG'), required=True,
+        help='converter script and its JSON or YAML configuration'
+    )
+    parser.add_argument(
+        '-n', '--num_workers',
+        type=int, default=None,
+        help='number of worker processes, one per cpu by default'
+    )
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    args = parse_arguments()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    tanks = []
+    for script, config_file in args.tank:
+        module = importlib.import_module(os.path.splitext(os.path.basename(script))[0])
+        tanks.append(module.configure(script, config_file))
+
+    running_times = run_batch(tanks, args.num_workers)
+
+    sys.exit(1 if None in running_times else 0)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+import argparse
+import importlib
+import os
+from b2iconverter.bufr2ioda_converter import Bufr2ioda_MultiConverter
+
+
+# converts a tank shared by several platforms into one IODA file per
+# platform, decoding the tank once, e.g.
+#   bufr2ioda_insitu_multi.py -o bufr2ioda_insitu_profile_argo.py argo.yaml \
+#                             -o bufr2ioda_insitu_profile_glider.py glider.yaml
+#   bufr2ioda_insitu_multi.py -o bufr2ioda_insitu_profile_tropical.py tropical.yaml \
+#                             -o bufr2ioda_insitu_surface_drifter.py drifter.yaml
+# the query executed is the union of the queries of all outputs, in any order
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-o', '--output',
+        nargs=2, action='append', metavar=('SCRIPT', 'CONFIG'), required=True,
+        help='converter script of an output and its JSON or YAML configuration'
+    )
+    parser.add_argument(
+        '-l', '--log_file',
+        type=str,
+        help='Output file for testing ioda variables'
+    )
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    args = parse_arguments()
+
+    outputs = []
+    for script, config_file in args.output:
+        module = importlib.import_module(os.path.splitext(os.path.basename(script))[0])
+        outputs.append(module.configure(script, config_file))
+
+    converter = Bufr2ioda_MultiConverter(outputs, args.log_file)
+    converter.run()
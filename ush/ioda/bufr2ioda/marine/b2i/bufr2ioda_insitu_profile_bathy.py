@@ -10,10 +10,7 @@ from bathy_ioda_variables import BathyIODAVariables
 platform_description = 'Profiles from BATHYthermal: temperature'
 
 
-if __name__ == '__main__':
-
-    script_name, config_file, log_file, test_file = parse_arguments()
-
+def configure(script_name, config_file):
     bufr2ioda_config = Bufr2iodaConfig(
         script_name,
         config_file,
@@ -23,6 +20,15 @@ if __name__ == '__main__':
     ioda_vars.set_temperature_error(0.24)
     ioda_vars.set_temperature_var_name("waterTemperature")
 
+    return bufr2ioda_config, ioda_vars
+
+
+if __name__ == '__main__':
+
+    script_name, config_file, log_file, test_file = parse_arguments()
+
+    bufr2ioda_config, ioda_vars = configure(script_name, config_file)
+
     bathy = Bufr2ioda_Converter(bufr2ioda_config, ioda_vars, log_file)
 
     bathy.run()
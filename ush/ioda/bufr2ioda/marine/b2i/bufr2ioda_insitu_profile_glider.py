@@ -10,10 +10,7 @@ from glider_ioda_variables import GliderIODAVariables
 platform_description = 'GLIDER profiles from subpfl: temperature and salinity'
 
 
-if __name__ == '__main__':
-
-    script_name, config_file, log_file, test_file = parse_arguments()
-
+def configure(script_name, config_file):
     bufr2ioda_config = Bufr2iodaConfig(
         script_name,
         config_file,
@@ -25,6 +22,15 @@ if __name__ == '__main__':
     ioda_vars.set_salinity_var_name("salinity")
     ioda_vars.set_salinity_error(0.01)
 
+    return bufr2ioda_config, ioda_vars
+
+
+if __name__ == '__main__':
+
+    script_name, config_file, log_file, test_file = parse_arguments()
+
+    bufr2ioda_config, ioda_vars = configure(script_name, config_file)
+
     glider = Bufr2ioda_Converter(bufr2ioda_config, ioda_vars, log_file)
     glider.run()
 
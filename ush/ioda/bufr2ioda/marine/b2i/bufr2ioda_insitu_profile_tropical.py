@@ -16,10 +16,7 @@ class TropicalConfig(Bufr2iodaConfig):
         return f"{self.cycle_type}.t{self.hh}z.insitu_profile_tropical.{self.cycle_datetime}.nc4"
 
 
-if __name__ == '__main__':
-
-    script_name, config_file, log_file, test_file = parse_arguments()
-
+def configure(script_name, config_file):
     bufr2ioda_config = TropicalConfig(
         script_name,
         config_file,
@@ -31,6 +28,15 @@ if __name__ == '__main__':
     ioda_vars.set_salinity_var_name("salinity")
     ioda_vars.set_salinity_error(0.01)
 
+    return bufr2ioda_config, ioda_vars
+
+
+if __name__ == '__main__':
+
+    script_name, config_file, log_file, test_file = parse_arguments()
+
+    bufr2ioda_config, ioda_vars = configure(script_name, config_file)
+
     tropical = Bufr2ioda_Converter(bufr2ioda_config, ioda_vars, log_file)
 
     tropical.run()
@@ -16,10 +16,7 @@ class DrifterConfig(Bufr2iodaConfig):
         return f"{self.cycle_type}.t{self.hh}z.insitu_surface_drifter.{self.cycle_datetime}.nc4"
 
 
-if __name__ == '__main__':
-
-    script_name, config_file, log_file, test_file = parse_arguments()
-
+def configure(script_name, config_file):
     bufr2ioda_config = DrifterConfig(
         script_name,
         config_file,
@@ -29,6 +26,15 @@ if __name__ == '__main__':
     ioda_vars.set_temperature_var_name("waterTemperature")
     ioda_vars.set_temperature_error(0.02)
 
+    return bufr2ioda_config, ioda_vars
+
+
+if __name__ == '__main__':
+
+    script_name, config_file, log_file, test_file = parse_arguments()
+
+    bufr2ioda_config, ioda_vars = configure(script_name, config_file)
+
     drifter = Bufr2ioda_Converter(bufr2ioda_config, ioda_vars, log_file)
 
     drifter.run()
@@ -15,10 +15,7 @@ class TrkobConfig(Bufr2iodaConfig):
         return f"{self.cycle_type}.t{self.hh}z.insitu_surface_{self.data_format}.{self.cycle_datetime}.nc4"
 
 
-if __name__ == '__main__':
-
-    script_name, config_file, log_file, test_file = parse_arguments()
-
+def configure(script_name, config_file):
     bufr2ioda_config = TrkobConfig(
         script_name,
         config_file,
@@ -30,6 +27,15 @@ if __name__ == '__main__':
     ioda_vars.set_salinity_var_name("seaSurfaceSalinity")
     ioda_vars.set_salinity_error(1.0)
 
+    return bufr2ioda_config, ioda_vars
+
+
+if __name__ == '__main__':
+
+    script_name, config_file, log_file, test_file = parse_arguments()
+
+    bufr2ioda_config, ioda_vars = configure(script_name, config_file)
+
     trkob = Bufr2ioda_Converter(bufr2ioda_config, ioda_vars, log_file)
     trkob.run()
 
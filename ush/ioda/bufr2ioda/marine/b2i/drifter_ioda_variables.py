@@ -7,14 +7,16 @@ from b2iconverter.util import *
 
 
 class DrifterIODAVariables(IODAVariables):
+    LOCATION_FIELDS = ('temp',)
 
     def __init__(self):
         self.construct()
         self.metadata = DrifterMetadata()
         self.additional_vars = DrifterAdditionalVariables(self)
 
-    def build_query(self):
-        q = bufr.QuerySet()
+    def build_query(self, q=None):
+        if q is None:
+            q = bufr.QuerySet()
         q.add('year', '*/YEAR')
         q.add('month', '*/MNTH')
         q.add('day', '*/DAYS')
@@ -37,18 +39,19 @@ class DrifterIODAVariables(IODAVariables):
         self.temp = r.get('temp', group_by='depth')
         self.temp -= 273.15
 
-    def filter(self):
-        T_mask = self.TemperatureFilter()
-
+    def classify(self):
         # Separate Drifter profiles from dbuoy tank
         # buoy_type:
         # 1 - Standard Lagrangian drifter (Global Drifter Programme)
         # 4 - Ice drifter
         # 5 - SVPG Standard Lagrangian drifter with GPS
         values_to_select = [1, 4, 5]
-        buoy_mask = np.isin(self.metadata.buoy_type, values_to_select)
+        return np.isin(self.metadata.buoy_type, values_to_select)
 
-        mask = T_mask & buoy_mask
+    def filter(self):
+        T_mask = self.TemperatureFilter()
+
+        mask = T_mask & self.classify()
 
         self.metadata.filter(mask)
         self.temp = self.temp[mask]
@@ -63,6 +66,8 @@ class DrifterIODAVariables(IODAVariables):
 
 
 class DrifterMetadata(IODAMetadata):
+    LOCATION_FIELDS = ('dateTime', 'rcptdateTime', 'lat', 'lon', 'stationID', 'buoy_type')
+
     def set_from_query_result(self, r):
         self.set_date_time_from_query_result(r)
         self.set_rcpt_date_time_from_query_result(r)
@@ -106,7 +111,7 @@ class DrifterMetadata(IODAMetadata):
         self.log_latitude(logger)
         self.log_station_id(logger)
         log_variable(logger, "buoy type", self.buoy_type)
-        logger.debug(f"buoy type hash = {compute_hash(self.buoy_type)}")
+        log_hash(logger, "buoy type", self.buoy_type)
 
 
 class DrifterAdditionalVariables(IODAAdditionalVariables):
@@ -7,8 +7,8 @@ class GliderIODAVariables(IODAVariables):
     def __init__(self):
         super().__init__()
 
-    def build_query(self):
-        q = super().build_query()
+    def build_query(self, q=None):
+        q = super().build_query(q)
         q.add('stationID', '*/WMOP')
         q.add('latitude', '*/CLATH')
         q.add('longitude', '*/CLONH')
@@ -22,10 +22,10 @@ class GliderIODAVariables(IODAVariables):
         # convert depth in pressure units to meters (rho * g * h)
         self.metadata.depth = np.float32(self.metadata.depth.astype(float) * 0.0001)
 
-    def filter(self):
+    def classify(self):
         # Separate GLIDER profiles from subpfl tank
         id = self.metadata.stationID
-        id_mask = (id >= 68900) & (id <= 68999) | \
+        return (id >= 68900) & (id <= 68999) | \
             (id >= 1800000) & (id <= 1809999) | \
             (id >= 2800000) & (id <= 2809999) | \
             (id >= 3800000) & (id <= 3809999) | \
@@ -33,9 +33,11 @@ class GliderIODAVariables(IODAVariables):
             (id >= 5800000) & (id <= 5809999) | \
             (id >= 6800000) & (id <= 6809999) | \
             (id >= 7800000) & (id <= 7809999)
+
+    def filter(self):
         mask = self.TemperatureFilter() \
             & self.SalinityFilter() \
-            & id_mask
+            & self.classify()
         self.metadata.filter(mask)
         self.temp = self.temp[mask]
         self.saln = self.saln[mask]
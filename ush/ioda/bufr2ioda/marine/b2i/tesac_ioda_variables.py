@@ -6,8 +6,8 @@ class TesacIODAVariables(IODAVariables):
     def __init__(self):
         super().__init__()
 
-    def build_query(self):
-        q = super().build_query()
+    def build_query(self, q=None):
+        q = super().build_query(q)
         q.add('stationID', '*/RPID')
         q.add('latitude', '*/CLAT')
         q.add('longitude', '*/CLON')
@@ -12,8 +12,8 @@ class TrkobIODAVariables(IODAVariables):
         self.metadata = TrkobMetadata()
         self.additional_vars = TrkobAdditionalVariables(self)
 
-    def build_query(self):
-        q = super().build_query()
+    def build_query(self, q=None):
+        q = super().build_query(q)
         q.add('stationID', '*/RPID')
         q.add('latitude', '*/CLAT')
         q.add('longitude', '*/CLON')
@@ -31,6 +31,7 @@ class TrkobIODAVariables(IODAVariables):
 
 
 class TrkobMetadata(IODAMetadata):
+    LOCATION_FIELDS = ('dateTime', 'rcptdateTime', 'lat', 'lon', 'stationID')
 
     def set_from_query_result(self, r):
         self.set_date_time_from_query_result(r)
@@ -3,7 +3,7 @@ from pyiodaconv import bufr
 from b2iconverter.ioda_variables import IODAVariables
 from b2iconverter.ioda_metadata import IODAMetadata
 from b2iconverter.ioda_addl_vars import IODAAdditionalVariables
-from b2iconverter.util import log_variable, compute_hash
+from b2iconverter.util import log_variable, log_hash
 
 
 class TropicalIODAVariables(IODAVariables):
@@ -13,8 +13,9 @@ class TropicalIODAVariables(IODAVariables):
         self.metadata = TropicalMetadata()
         self.additional_vars = IODAAdditionalVariables(self)
 
-    def build_query(self):
-        q = bufr.QuerySet()
+    def build_query(self, q=None):
+        if q is None:
+            q = bufr.QuerySet()
         q.add('year', '*/YEAR')
         q.add('month', '*/MNTH')
         q.add('day', '*/DAYS')
@@ -34,14 +35,15 @@ class TropicalIODAVariables(IODAVariables):
         q.add('buoy_type', '*/RPSEC4/BUYT')
         return q
 
-    def filter(self):
-        TS_mask = self.TemperatureFilter() & self.SalinityFilter()
-
+    def classify(self):
         # Separate tropical mooring profiles from dbuoy tank
         # buoy_type: ATLAS is 21, TRITON is 22
-        buoy_mask = [True if x == 21 or x == 22 else False for x in self.metadata.buoy_type]
+        return np.isin(self.metadata.buoy_type, [21, 22])
 
-        mask = TS_mask & buoy_mask
+    def filter(self):
+        TS_mask = self.TemperatureFilter() & self.SalinityFilter()
+
+        mask = TS_mask & self.classify()
 
         self.metadata.filter(mask)
         self.temp = self.temp[mask]
@@ -49,6 +51,8 @@ class TropicalIODAVariables(IODAVariables):
 
 
 class TropicalMetadata(IODAMetadata):
+    LOCATION_FIELDS = IODAMetadata.LOCATION_FIELDS + ('buoy_type',)
+
     def set_from_query_result(self, r):
         super().set_from_query_result(r)
         self.buoy_type = r.get('buoy_type', group_by='depth')
@@ -77,4 +81,4 @@ class TropicalMetadata(IODAMetadata):
     def log(self, logger):
         super().log(logger)
         log_variable(logger, "buoy type", self.buoy_type)
-        logger.debug(f"buoy type hash = {compute_hash(self.buoy_type)}")
+        log_hash(logger, "buoy type", self.buoy_type)
@@ -7,8 +7,8 @@ class XbtctdIODAVariables(IODAVariables):
     def __init__(self):
         super().__init__()
 
-    def build_query(self):
-        q = super().build_query()
+    def build_query(self, q=None):
+        q = super().build_query(q)
         q.add('stationID', '*/WMOP')
         q.add('latitude', '*/CLATH')
         q.add('longitude', '*/CLONH')
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# (C) Copyright 2024 NOAA/NWS/NCEP/EMC
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+
+# Vectorized helpers shared by the prepbufr converters to subset and mask
+# the arrays returned by a ResultSet.
+
+import numpy as np
+import numpy.ma as ma
+
+
+def subset_arrays(mask, *arrays):
+    """
+    Restrict every array to the rows where mask is True.
+
+    The mask is evaluated once and applied to all arrays with a single
+    boolean index each. Masked arrays keep their mask and fill value.
+    """
+    mask = np.asarray(ma.filled(mask, False), dtype=bool)
+    subsets = tuple(array[mask] for array in arrays)
+
+    return subsets if len(subsets) > 1 else subsets[0]
+
+
+def Mask_typ_for_var(typ, var):
+
+    typ_var = ma.array(typ, copy=True)
+    typ_var[ma.getmaskarray(var)] = typ.fill_value
+
+    return typ_var
+
+
+def Compute_ObsSubType(typ, t29):
+
+    obssubtype = np.zeros(typ.shape, dtype=np.int32)
+    is_180_280 = ((typ == 180) | (typ == 280)).filled(False)
+    in_range = ((t29 > 555) & (t29 < 565)).filled(False)
+    obssubtype[is_180_280 & ~in_range] = 1
+
+    obssubtype = ma.array(obssubtype)
+    obssubtype = ma.masked_values(obssubtype, typ.fill_value)
+
+    return obssubtype
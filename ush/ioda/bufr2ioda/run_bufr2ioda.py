@@ -1,11 +1,21 @@
 #!/usr/bin/env python3
 import argparse
 import glob
+import importlib
+import json
 import multiprocessing as mp
 import os
+import re
 import shutil
+import sys
+import yaml
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from itertools import repeat
 from pathlib import Path
+from conversion_cache import ConversionCache, link_or_copy, MAX_SIZE_GB, MAX_AGE_DAYS
+from converter_scheduler import (ConverterJob, load_history, save_history, estimate_costs,
+                                 default_memory_budget, run_jobs, write_timing_report)
 from gen_bufr2ioda_json import gen_bufr_json
 from gen_bufr2ioda_yaml import gen_bufr_yaml
 from wxflow import (Logger, Executable, cast_as_dtype, logit,
@@ -28,8 +38,71 @@ def mp_bufr_converter(exename, configfile):
     cmd()
 
 
+def init_converter_worker():
+    # pay the cost of the heavy imports once per worker, not once per obtype
+    importlib.import_module('numpy')
+    importlib.import_module('pyiodaconv.bufr')
+    importlib.import_module('pyioda.ioda_obs_space')
+
+
+def mp_bufr_converter_inprocess(exename, configfile):
+    # the python converters are run in the worker itself; bufr2ioda.x
+    # (YAML configs) still needs its own process
+    if Path(configfile).suffix != '.json':
+        return mp_bufr_converter(exename, configfile)
+
+    # a converter already run by this worker is reloaded, so that no module
+    # state is carried from one run to the next; its dependencies stay loaded
+    obtype = Path(exename).stem
+    logger.info(f"Executing {obtype}.bufr_to_ioda with {configfile}")
+    if obtype in sys.modules:
+        converter = importlib.reload(sys.modules[obtype])
+    else:
+        converter = importlib.import_module(obtype)
+    with open(configfile, "r") as json_file:
+        config = json.load(json_file)
+    converter.bufr_to_ioda(config, Logger(f"{obtype}.py", level='INFO', colored_log=True))
+
+
+def yaml_output_pattern(configfile):
+    # bufr2ioda.x writes the obsdataout of its config, one file per $(splitvar)
+    with open(configfile, "r") as yaml_file:
+        config = yaml.safe_load(yaml_file)
+    return [re.sub(r'\$\(\w+\)', '*', obs['obs space']['obsdataout']) for obs in config['observations']]
+
+
+def stage_converter_outputs(job, DATA):
+    # write the outputs of a cacheable job where they can be told apart from
+    # those of the other converters: the python converters get their own
+    # ioda_directory, the stale outputs of bufr2ioda.x are removed
+    if Path(job.configfile).suffix != '.json':
+        for pattern in yaml_output_pattern(job.configfile):
+            for output_file in glob.glob(pattern):
+                rm_p(output_file)
+        return
+
+    staging_dir = os.path.join(DATA, f"{job.obtype}_ioda")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    with open(job.configfile, "r") as json_file:
+        config = json.load(json_file)
+    config['ioda_directory'] = staging_dir
+    job.configfile = os.path.join(DATA, f"{Path(job.configfile).stem}_staged.json")
+    with open(job.configfile, "w") as json_file:
+        json.dump(config, json_file, indent=2)
+
+
+def converter_outputs(job, DATA):
+    if Path(job.configfile).suffix != '.json':
+        return sorted(f for pattern in yaml_output_pattern(job.configfile) for f in glob.glob(pattern))
+    staging_dir = os.path.join(DATA, f"{job.obtype}_ioda")
+    return sorted(os.path.join(staging_dir, f) for f in os.listdir(staging_dir))
+
+
 @logit(logger)
-def bufr2ioda(current_cycle, RUN, DMPDIR, config_template_dir, COM_OBS):
+def bufr2ioda(current_cycle, RUN, DMPDIR, config_template_dir, COM_OBS, in_process=False,
+              history_file=None, memory_budget=None, cache_dir=None, hash_inputs=False,
+              cache_max_size=MAX_SIZE_GB, cache_max_age=MAX_AGE_DAYS):
     logger.info(f"Process {current_cycle} {RUN} from {DMPDIR} to {COM_OBS} using {config_template_dir}")
 
     # Get gdasapp root directory
@@ -60,8 +133,7 @@ def bufr2ioda(current_cycle, RUN, DMPDIR, config_template_dir, COM_OBS):
     BUFR_py_files = [os.path.basename(f) for f in BUFR_py_files]
     BUFR_py = [f.replace('bufr2ioda_', '').replace('.py', '') for f in BUFR_py_files]
 
-    config_files = []
-    exename = []
+    jobs = []
     for obtype in BUFR_py:
         logger.info(f"Convert {obtype}...")
         json_output_file = os.path.join(DATA, f"{obtype}_{datetime_to_YMDH(current_cycle)}.json")
@@ -72,9 +144,7 @@ def bufr2ioda(current_cycle, RUN, DMPDIR, config_template_dir, COM_OBS):
         # Use the converter script for the ob type
         bufr2iodapy = USH_IODA + '/bufr2ioda_' + obtype + ".py"
 
-        # append the values to the lists
-        config_files.append(json_output_file)
-        exename.append(bufr2iodapy)
+        jobs.append(ConverterJob(f"bufr2ioda_{obtype}", bufr2iodapy, json_output_file))
 
         # Check if the converter was successful
         # if os.path.exists(json_output_file):
@@ -95,17 +165,63 @@ def bufr2ioda(current_cycle, RUN, DMPDIR, config_template_dir, COM_OBS):
         # use the bufr2ioda executable for the ob type
         bufr2iodaexe = BIN_GDAS + '/bufr2ioda.x'
 
-        # append the values to the lists
-        config_files.append(yaml_output_file)
-        exename.append(bufr2iodaexe)
+        jobs.append(ConverterJob(f"bufr2ioda_{obtype}", bufr2iodaexe, yaml_output_file))
 
         # Check if the converter was successful
         # if os.path.exists(yaml_output_file):
         #     rm_p(yaml_output_file)
 
-    # run everything in parallel
-    with mp.Pool(num_cores) as pool:
-        pool.starmap(mp_bufr_converter, zip(exename, config_files))
+    # reuse the outputs of conversions already done with the same inputs,
+    # config and converter
+    cache = None
+    if cache_dir:
+        cache = ConversionCache(cache_dir, hash_inputs=hash_inputs,
+                                max_size_gb=cache_max_size, max_age_days=cache_max_age)
+    all_jobs = jobs
+    if cache:
+        jobs = []
+        for job in all_jobs:
+            job.cache_key = cache.key(job.exename, job.configfile, job.input_files)
+            if cache.restore(job.cache_key, COM_OBS) is not None:
+                job.cached = True
+                continue
+            if job.cache_key is not None:
+                stage_converter_outputs(job, DATA)
+            jobs.append(job)
+
+    # cost the jobs from their input size and the runtimes of past cycles
+    history = load_history(history_file)
+    estimate_costs(jobs, history)
+    if memory_budget is None:
+        memory_budget = default_memory_budget()
+
+    # run everything in parallel, longest first, within the memory budget
+    if in_process:
+        # import the python converters into a pool of warm workers
+        runner = mp_bufr_converter_inprocess
+        new_executor = partial(ProcessPoolExecutor, num_cores, initializer=init_converter_worker)
+    else:
+        runner = mp_bufr_converter
+        new_executor = partial(ProcessPoolExecutor, num_cores)
+    wall_time = run_jobs(new_executor, runner, jobs, num_cores, memory_budget)
+
+    if cache:
+        for job in jobs:
+            if job.cache_key is None or job.error is not None:
+                continue
+            output_files = converter_outputs(job, DATA)
+            cache.store(job.cache_key, output_files)
+            if Path(job.configfile).suffix == '.json':
+                for output_file in output_files:
+                    link_or_copy(output_file, os.path.join(COM_OBS, os.path.basename(output_file)))
+
+    save_history(history_file, history, jobs)
+    write_timing_report(os.path.join(DATA, f"bufr2ioda_timing_{datetime_to_YMDH(current_cycle)}.json"),
+                        all_jobs, wall_time)
+
+    failed = [job for job in jobs if job.error is not None]
+    if failed:
+        raise failed[0].error
 
 
 if __name__ == "__main__":
@@ -115,5 +231,23 @@ if __name__ == "__main__":
     parser.add_argument('DMPDIR', type=Path, help='path to bufr dump files')
     parser.add_argument('config_template_dir', type=Path, help='path to templates')
     parser.add_argument('COM_OBS', type=Path, help='path to output ioda format dump files')
+    parser.add_argument('--in-process', action='store_true',
+                        help='run the python converters inside the worker pool instead of one interpreter each')
+    parser.add_argument('--history-file', type=Path, default=None,
+                        help='JSON file of past converter runtimes used to order the jobs, updated after the run')
+    parser.add_argument('--memory-budget', type=float, default=None,
+                        help='total memory (GB) of the converters running at once, default 80%% of the node')
+    parser.add_argument('--cache-dir', type=Path, default=None,
+                        help='directory of the conversion cache; reruns with unchanged inputs reuse its outputs')
+    parser.add_argument('--hash-inputs', action='store_true',
+                        help='key the cache on the content of the dumps instead of their size and mtime')
+    parser.add_argument('--cache-max-size', type=float, default=MAX_SIZE_GB,
+                        help='size (GB) the cache is pruned to, least recently used entries first')
+    parser.add_argument('--cache-max-age', type=float, default=MAX_AGE_DAYS,
+                        help='age (days) after which an unused cache entry is removed')
     args = parser.parse_args()
-    bufr2ioda(args.current_cycle, args.RUN, args.DMPDIR, args.config_template_dir, args.COM_OBS)
+    memory_budget = args.memory_budget * 1.0e9 if args.memory_budget is not None else None
+    bufr2ioda(args.current_cycle, args.RUN, args.DMPDIR, args.config_template_dir, args.COM_OBS,
+              in_process=args.in_process, history_file=args.history_file, memory_budget=memory_budget,
+              cache_dir=args.cache_dir, hash_inputs=args.hash_inputs,
+              cache_max_size=args.cache_max_size, cache_max_age=args.cache_max_age)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# (C) Copyright 2024 NOAA/NWS/NCEP/EMC
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+
+# One-pass split of observations by satellite identifier, shared by the
+# converters that write one IODA file per satellite.
+
+import numpy as np
+import numpy.ma as ma
+
+
+class SatelliteSplitter:
+    """
+    Group observations by satellite identifier with a single argsort.
+
+    sort() reorders the data arrays so that the observations of each
+    satellite are contiguous; indexing the sorted arrays with the slice
+    returned by splitter[sat] then yields views instead of the copies made
+    by a boolean mask 'satid == sat' per satellite and per variable.
+
+    Observations with a missing satellite identifier, or excluded by the
+    optional boolean 'where', are dropped by sort().
+    """
+
+    def __init__(self, satid, satellite_info_array, where=None):
+
+        keep = ~ma.getmaskarray(satid)
+        if where is not None:
+            keep &= ma.filled(where, False)
+        index = np.flatnonzero(keep)
+
+        ids = ma.getdata(satid)[index]
+        order = np.argsort(ids, kind='stable')
+        self.order = index[order]
+
+        satids, starts, counts = np.unique(ids[order], return_index=True, return_counts=True)
+        self.satids = satids
+        self.slices = {sat: slice(start, start + count)
+                       for sat, start, count in zip(satids.tolist(), starts.tolist(), counts.tolist())}
+
+        self.satellite_info = {satellite_info["satellite_id"]: satellite_info
+                               for satellite_info in satellite_info_array}
+
+    def sort(self, *arrays):
+        """Reorder the arrays (along the first axis) by satellite."""
+        sorted_arrays = tuple(array[self.order] for array in arrays)
+
+        return sorted_arrays if len(sorted_arrays) > 1 else sorted_arrays[0]
+
+    def info(self, sat):
+        """Configuration entry of satellite sat, or None if not configured."""
+        return self.satellite_info.get(sat)
+
+    def __getitem__(self, sat):
+        return self.slices[sat]
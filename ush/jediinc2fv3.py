@@ -20,22 +20,43 @@ vardict = {
 }
 
 
-def jedi_inc_to_fv3(FV3ges, FV3JEDIinc, FV3inc):
+# Set constants and compute derived constants
+grav = 9.80665
+airmw = 28.965
+h2omw = 18.015
+runiv = 8314.47
+rdry = runiv/airmw
+rvap = runiv/h2omw
+cpdry = 3.5*rdry
+fv = (rvap/rdry)-1
+rdog = rdry/grav
+kappa = rdry/cpdry
+kap1 = kappa+1.0
+kapr = 1.0/kappa
+
+
+def jedi_inc_to_fv3(FV3ges, FV3JEDIinc, FV3inc, dtype=np.float64, level_chunk=None):
     logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s', level=logging.INFO, datefmt='%Y-%m-%d %H:%M:%S')
     # Check if required input netcdf files exist.  If not present, exit with error message.
     try:
-        with nc.Dataset(FV3ges, 'r'), nc.Dataset(FV3JEDIinc, 'r'):
-            ncges = nc.Dataset(FV3ges, 'r')
-            ncin = nc.Dataset(FV3JEDIinc, 'r')
-            ncout = nc.Dataset(FV3inc, 'w', format='NETCDF4')
-            create_fv3inc(ncges, ncin, ncout)
+        with nc.Dataset(FV3ges, 'r') as ncges, nc.Dataset(FV3JEDIinc, 'r') as ncin, \
+             nc.Dataset(FV3inc, 'w', format='NETCDF4') as ncout:
+            create_fv3inc(ncges, ncin, ncout, dtype=dtype, level_chunk=level_chunk)
 
     except FileNotFoundError as e:
         logging.error(f"Error occurred with message {e}")
         raise
 
 
-def create_fv3inc(ncges, ncin, ncout):
+def create_fv3inc(ncges, ncin, ncout, dtype=np.float64, level_chunk=None):
+    """
+    Write the FV3 increment: the fields of the FV3-JEDI increment, renamed,
+    and the delp and hydrostatic delz increments.
+
+    The computations are done in dtype (float64 by default, float32 halves
+    the memory). With level_chunk, the 3D fields are read, computed and
+    written level_chunk levels at a time instead of all at once.
+    """
 
     # Copy over dimensions
     for name, dimension in ncin.dimensions.items():
@@ -53,8 +74,6 @@ def create_fv3inc(ncges, ncin, ncout):
 
     # Create all the dummy vertical coordinate variables
     nlevs = len(ncin.dimensions['lev'])
-    nlats = len(ncin.dimensions['lat'])
-    nlons = len(ncin.dimensions['lon'])
     pfull = range(1, nlevs+1)
     phalf = range(1, nlevs+2)
     levvar = ncout.createVariable('lev', 'f4', ('lev'))
@@ -68,6 +87,9 @@ def create_fv3inc(ncges, ncin, ncout):
     hybivar = ncout.createVariable('hybi', 'f4', ('ilev'))
     hybivar[:] = phalf
 
+    level_chunk = level_chunk or nlevs
+    chunks = [(k, min(k + level_chunk, nlevs)) for k in range(0, nlevs, level_chunk)]
+
     # Rename and change dimensionality of fields
     for name, variable in ncin.variables.items():
         if len(variable.dimensions) in [4]:
@@ -85,97 +107,55 @@ def create_fv3inc(ncges, ncin, ncout):
 
             x = ncout.createVariable(vardict[name], 'f4', dimsout)
             if len(variable.dimensions) in [4]:
-                ncout[vardict[name]][:] = ncin[name][0, ...]
+                for k0, k1 in chunks:
+                    x[k0:k1, ...] = variable[0, k0:k1, ...]
             else:
-                ncout[vardict[name]][:] = ncin[name][:]
+                x[:] = variable[:]
 
     # Populate increment and guess fields
     #   Note:  increment and guess fields have same shape
     #     ps_inc is (time, lat, lon), ps_ges is {time, grid_yt, grid_xt)
     #     t_inc is (time, lev, lat, lon), t_ges is (time, pfull, grid_yt, grid_xt)
 
-    ps_ges = ncges.variables['pressfc'][:]
-    t_ges = ncges.variables['tmp'][:]
-    q_ges = ncges.variables['spfh'][:]
+    ps_ges = ncges.variables['pressfc'][0, ...].astype(dtype)
+    ps_inc = ncin.variables['ps'][0, ...].astype(dtype)
+    ps_anl = ps_ges + ps_inc
 
-    ps_inc = ncin.variables['ps'][:]
-    t_inc = ncin.variables[tinc][:]
-    q_inc = ncin.variables['sphum'][:]
+    # Get ak,bk from guess file
+    ak = np.asarray(ncges.getncattr('ak'), dtype=dtype)[:, np.newaxis, np.newaxis]
+    bk = np.asarray(ncges.getncattr('bk'), dtype=dtype)[:, np.newaxis, np.newaxis]
 
-    # Compute analysis ps
-    ps_anl = np.zeros((nlats, nlons), float)
-    ps_anl = ps_ges + ps_inc
+    # Compute pressure increment (delp_inc)
+    delp_inc_var = ncout.createVariable('delp_inc', 'f4', dimsout_inc)
+    delz_inc_var = ncout.createVariable('delz_inc', 'f4', dimsout_inc)
 
-    # Set constants and compute derived constants
-    grav = 9.80665
-    airmw = 28.965
-    h2omw = 18.015
-    runiv = 8314.47
-    rdry = runiv/airmw
-    rvap = runiv/h2omw
-    cpdry = 3.5*rdry
-    fv = (rvap/rdry)-1
-    rdog = rdry/grav
-    kappa = rdry/cpdry
-    kap1 = kappa+1.0
-    kapr = 1.0/kappa
+    for k0, k1 in chunks:
+        delp_inc_var[k0:k1, ...] = ps_inc * (bk[k0+1:k1+1] - bk[k0:k1])
 
-    # Get ak,bk from guess file
-    nc_attrs = ncges.ncattrs()
-    ak = ncges.getncattr('ak')
-    bk = ncges.getncattr('bk')
-
-    # Compute guess and analysis interface pressures
-    prsi_ges = np.zeros((nlevs+1, nlats, nlons), float)
-    prsi_anl = np.zeros((nlevs+1, nlats, nlons), float)
-    for k in range(0, nlevs+1):
-        prsi_ges[k, :, :] = ak[k]+bk[k]*ps_ges[:, :]
-        prsi_anl[k, :, :] = ak[k]+bk[k]*ps_anl[:, :]
-
-    # Compute pressure increment (delp_inc).  Compute
-    # guess and analysis layer pressures using Philips method
-    delp_inc = np.zeros((nlevs, nlats, nlons), float)
-    prsl_ges = np.zeros((nlevs, nlats, nlons), float)
-    prsl_anl = np.zeros((nlevs, nlats, nlons), float)
-    for k in range(0, nlevs):
-        dbk = bk[k+1] - bk[k]
-        delp_inc[k, :, :] = ps_inc[:, :] * dbk
-        prsl_ges[k, :, :] = ((prsi_ges[k+1, :, :]**kap1 - prsi_ges[k, :, :]**kap1) / (kap1*(prsi_ges[k+1, :, :] - prsi_ges[k, :, :])))**kapr
-        prsl_anl[k, :, :] = ((prsi_anl[k+1, :, :]**kap1 - prsi_anl[k, :, :]**kap1) / (kap1*(prsi_anl[k+1, :, :] - prsi_anl[k, :, :])))**kapr
-
-    # Write delp increment to output file
-    x = ncout.createVariable('delp_inc', 'f4', dimsout_inc)
-    ncout['delp_inc'][:] = delp_inc[:]
-
-    # Compute analysis temperature andl specific humidity
-    t_anl = np.zeros((nlevs, nlats, nlons), float)
-    q_anl = np.zeros((nlevs, nlats, nlons), float)
-    t_anl = t_ges + t_inc
-    q_anl = q_ges + q_inc
-
-    # Compute guess and analysis virtual temperature
-    tv_ges = np.zeros((nlevs, nlats, nlons), float)
-    tv_anl = np.zeros((nlevs, nlats, nlons), float)
-    tv_ges = t_ges * (1.0 + fv*q_ges)
-    tv_anl = t_anl * (1.0 + fv*q_anl)
-
-    # Compute guess and analysis delz and delz increment
-    delz_ges = np.zeros((nlevs, nlats, nlons), float)
-    delz_anl = np.zeros((nlevs, nlats, nlons), float)
-    delz_inc = np.zeros((nlevs, nlats, nlons), float)
-    for k in range(0, nlevs):
-        if k == 0:
-            delz_ges[k, :, :] = rdog * tv_ges[:, k, :, :] * np.log(prsl_ges[k, :, :]/prsi_ges[k+1, :, :])
-            delz_anl[k, :, :] = rdog * tv_anl[:, k, :, :] * np.log(prsl_anl[k, :, :]/prsi_anl[k+1, :, :])
-        else:
-            delz_ges[k, :, :] = rdog * tv_ges[:, k, :, :] * np.log(prsi_ges[k, :, :]/prsi_ges[k+1, :, :])
-            delz_anl[k, :, :] = rdog * tv_anl[:, k, :, :] * np.log(prsi_anl[k, :, :]/prsi_anl[k+1, :, :])
+        # guess and analysis interface pressures of the levels k0 to k1
+        prsi_ges = ak[k0:k1+1] + bk[k0:k1+1] * ps_ges
+        prsi_anl = ak[k0:k1+1] + bk[k0:k1+1] * ps_anl
+
+        # guess and analysis virtual temperature
+        t_ges = ncges.variables['tmp'][0, k0:k1, ...].astype(dtype)
+        q_ges = ncges.variables['spfh'][0, k0:k1, ...].astype(dtype)
+        tv_ges = t_ges * (1.0 + fv*q_ges)
+        tv_anl = (t_ges + ncin.variables[tinc][0, k0:k1, ...]) * (1.0 + fv*(q_ges + ncin.variables['sphum'][0, k0:k1, ...]))
+        del t_ges, q_ges
+
+        # hydrostatic delz; at the top level the layer pressure from the
+        # Philips method replaces the top interface pressure
+        log_ratio_ges = np.log(prsi_ges[:-1] / prsi_ges[1:])
+        log_ratio_anl = np.log(prsi_anl[:-1] / prsi_anl[1:])
+        if k0 == 0:
+            log_ratio_ges[0] = np.log(philips_layer_pressure(prsi_ges[0], prsi_ges[1]) / prsi_ges[1])
+            log_ratio_anl[0] = np.log(philips_layer_pressure(prsi_anl[0], prsi_anl[1]) / prsi_anl[1])
+
+        delz_inc_var[k0:k1, ...] = rdog * (tv_anl * log_ratio_anl - tv_ges * log_ratio_ges)
 
-        delz_inc[k, :, :] = delz_anl[k, :, :] - delz_ges[k, :, :]
 
-    # Write delz increment to output file
-    x = ncout.createVariable('delz_inc', 'f4', dimsout_inc)
-    ncout['delz_inc'][:] = delz_inc[:]
+def philips_layer_pressure(prsi_top, prsi_bottom):
+    return ((prsi_bottom**kap1 - prsi_top**kap1) / (kap1*(prsi_bottom - prsi_top)))**kapr
 
 
 if __name__ == "__main__":
@@ -183,5 +163,9 @@ if __name__ == "__main__":
     parser.add_argument('FV3background', type=str, help='Input FV3 background file')
     parser.add_argument('FV3JEDIincrement', type=str, help='Input FV3-JEDI LatLon Increment File')
     parser.add_argument('FV3increment', type=str, help='Output FV3 Increment File')
+    parser.add_argument('--float32', action='store_true', help='Compute the increments in single precision')
+    parser.add_argument('--level-chunk', type=int, default=None,
+                        help='Number of levels read, computed and written at a time (default: all)')
     args = parser.parse_args()
-    jedi_inc_to_fv3(args.FV3background, args.FV3JEDIincrement, args.FV3increment)
+    jedi_inc_to_fv3(args.FV3background, args.FV3JEDIincrement, args.FV3increment,
+                    dtype=np.float32 if args.float32 else np.float64, level_chunk=args.level_chunk)
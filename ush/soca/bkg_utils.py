@@ -3,17 +3,23 @@
 # Script description:  Utilities for staging SOCA background
 
 import dateutil.parser as dparser
+import multiprocessing as mp
 from datetime import datetime, timedelta
 from netCDF4 import Dataset
 import numpy as np
 import os
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from wxflow import (Logger, FileHandler)
 import xarray as xr
 import yaml
 
 logger = Logger()
 
+# number of backgrounds staged concurrently
+STAGING_WORKERS = 6
+
 # get absolute path of ush/ directory either from env or relative to this file
 my_dir = os.path.dirname(__file__)
 my_home = os.path.dirname(os.path.dirname(my_dir))
@@ -23,34 +29,49 @@ gdas_home = os.path.join(os.getenv('HOMEgfs'), 'sorc', 'gdas.cd')
 def agg_seaice(fname_in, fname_out):
     """
     Aggregates seaice variables from a CICE restart fname_in and save in fname_out.
+    The categories are summed one at a time, so only 2-D slabs are held in
+    memory, and the output, time variable included, is written in one pass.
     """
 
     soca2cice_vars = {'aicen': 'aicen',
                       'hicen': 'vicen',
                       'hsnon': 'vsnon'}
 
-    # read CICE restart
-    ds = xr.open_dataset(fname_in)
-    nj = np.shape(ds['aicen'])[1]
-    ni = np.shape(ds['aicen'])[2]
+    with Dataset(fname_in, 'r') as src, Dataset(fname_out, 'w', format='NETCDF4') as dst:
+        ncat, nj, ni = src.variables['aicen'].shape
+
+        dst.createDimension('time', None)
+        dst.createDimension('yaxis_1', nj)
+        dst.createDimension('xaxis_1', ni)
+
+        for varname, cice_varname in soca2cice_vars.items():
+            cice_var = src.variables[cice_varname]
+            # missing values are NaN, as when reading with xarray
+            agg = np.zeros((nj, ni), dtype=np.result_type(cice_var.dtype, np.float32))
+            for n in range(ncat):
+                agg += np.ma.filled(cice_var[n, ...].astype(agg.dtype), np.nan)
+            # no fill value
+            var = dst.createVariable(varname, agg.dtype, ('time', 'yaxis_1', 'xaxis_1'), fill_value=False)
+            var[0, ...] = agg
+
+        t = dst.createVariable('time', 'f8', ('time'))
+        t[:] = 1.0
 
-    # populate xarray with aggregated quantities
-    aggds = xr.merge([xr.DataArray(
-                      name=varname,
-                      data=np.reshape(np.sum(ds[soca2cice_vars[varname]].values, axis=0), (1, nj, ni)),
-                      dims=['time', 'yaxis_1', 'xaxis_1']) for varname in soca2cice_vars.keys()])
 
-    # remove fill value
-    encoding = {varname: {'_FillValue': False} for varname in soca2cice_vars.keys()}
+def _agg_seaice(fnames):
+    agg_seaice(*fnames)
+    return fnames[1]
 
-    # save datasets
-    aggds.to_netcdf(fname_out, format='NETCDF4', unlimited_dims='time', encoding=encoding)
 
-    # xarray doesn't allow variables and dim that have the same name, switch to netCDF4
-    ncf = Dataset(fname_out, 'a')
-    t = ncf.createVariable('time', 'f8', ('time'))
-    t[:] = 1.0
-    ncf.close()
+def agg_seaice_members(fnames, nproc=None):
+    """
+    Aggregate the CICE restarts of several members, given as a list of
+    (fname_in, fname_out), on nproc processes (one per member by default).
+    """
+    nproc = nproc or len(fnames)
+    with mp.Pool(min(nproc, len(fnames))) as pool:
+        for fname_out in pool.imap_unordered(_agg_seaice, fnames):
+            logger.info(f"*** aggregated seaice background {fname_out}")
 
 
 def cice_hist2fms(input_filename, output_filename):
@@ -77,22 +98,60 @@ def cice_hist2fms(input_filename, output_filename):
     ds.to_netcdf(output_filename_real, mode='w')
 
 
+def hist_date(ncf):
+    """
+    Date of an open MOM6 history file, read from the units and the first
+    value of its time variable only.
+    """
+    time_var = ncf.variables['time']
+    return dparser.parse(time_var.units, fuzzy=True) + timedelta(hours=int(time_var[0]))
+
+
 def test_hist_date(histfile, ref_date):
     """
     Check that the date in the MOM6 history file is the expected one for the cycle.
     TODO: Implement the same for seaice
     """
 
-    ncf = Dataset(histfile, 'r')
-    hist_date = dparser.parse(ncf.variables['time'].units, fuzzy=True) + timedelta(hours=int(ncf.variables['time'][0]))
-    ncf.close()
-    logger.info(f"*** history file date: {hist_date} expected date: {ref_date}")
-    assert hist_date == ref_date, 'Inconsistent bkg date'
+    with Dataset(histfile, 'r') as ncf:
+        date = hist_date(ncf)
+    logger.info(f"*** history file date: {date} expected date: {ref_date}")
+    assert date == ref_date, 'Inconsistent bkg date'
+
+
+def _stage_file(src, dst, link):
+    start = time.perf_counter()
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if link:
+        os.symlink(os.path.realpath(src), dst)
+    else:
+        shutil.copyfile(src, dst)
+    return os.path.getsize(src), time.perf_counter() - start
 
 
-def gen_bkg_list(bkg_path, out_path, window_begin=' ', yaml_name='bkg.yaml', ice_rst=False):
+def stage_bkg_files(src_dst, link=False, max_workers=STAGING_WORKERS):
+    """
+    Copy (or symlink, with link) the [src, dst] pairs concurrently, each
+    file once, and log the throughput of each copy.
+    """
+    src_dst = list({dst: [src, dst] for src, dst in src_dst}.values())
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(src, executor.submit(_stage_file, src, dst, link)) for src, dst in src_dst]
+        for src, future in futures:
+            size, seconds = future.result()
+            if link:
+                logger.info(f"*** linked {src}")
+            else:
+                throughput = size / seconds / 1.0e6 if seconds > 0 else float('inf')
+                logger.info(f"*** copied {src}: {size} bytes in {seconds:.2f} s ({throughput:.1f} MB/s)")
+
+
+def gen_bkg_list(bkg_path, out_path, window_begin=' ', yaml_name='bkg.yaml', ice_rst=False, link=False):
     """
     Generate a YAML of the list of backgrounds for the pseudo model
+    The backgrounds are read from file by the pseudo model, with link they are
+    symlinked to out_path instead of copied
     """
 
     # Pseudo model parameters (time step, start date)
@@ -108,11 +167,9 @@ def gen_bkg_list(bkg_path, out_path, window_begin=' ', yaml_name='bkg.yaml', ice
     for fcst_hr in fcst_hrs:
         files.append(os.path.join(bkg_path, f'gdas.ocean.t'+gcyc+'z.inst.f'+str(fcst_hr).zfill(3)+'.nc'))
 
-    # Identify the ocean background that will be used for the  vertical coordinate remapping
-    ocn_filename_ic = os.path.splitext(os.path.basename(files[0]))[0]+'.nc'
-    test_hist_date(os.path.join(bkg_path, ocn_filename_ic), bkg_date)  # assert date of the history file is correct
-
     # Copy/process backgrounds and generate background yaml list
+    # the first ocean background, also used for the vertical coordinate
+    # remapping, is checked with the others
     bkg_list_src_dst = []
     bkg_list = []
     for bkg in files:
@@ -140,11 +197,11 @@ def gen_bkg_list(bkg_path, out_path, window_begin=' ', yaml_name='bkg.yaml', ice
         bkg_list.append(bkg_dict)
 
     # save pseudo model yaml configuration
-    f = open(yaml_name, 'w')
-    yaml.dump(bkg_list[1:], f, sort_keys=False, default_flow_style=False)
+    with open(yaml_name, 'w') as f:
+        yaml.dump(bkg_list[1:], f, sort_keys=False, default_flow_style=False)
 
     # copy ocean backgrounds to RUNDIR
-    FileHandler({'copy': bkg_list_src_dst}).sync()
+    stage_bkg_files(bkg_list_src_dst, link=link)
 
 
 def stage_ic(bkg_dir, anl_dir, gcyc):
@@ -4,10 +4,14 @@
 import netCDF4 as nc
 import numpy as np
 import warnings
-from scipy.ndimage import gaussian_filter, distance_transform_edt
+from scipy.ndimage import gaussian_filter, gaussian_filter1d, distance_transform_edt
 import yaml
 import argparse
 
+# gaussian kernels are truncated at GAUSSIAN_TRUNCATE standard deviations, as
+# in scipy.ndimage
+GAUSSIAN_TRUNCATE = 4.0
+
 
 def load_config(config_file):
     with open(config_file, 'r') as stream:
@@ -15,6 +19,79 @@ def load_config(config_file):
     return config
 
 
+def gaussian_kernel(sigma):
+    radius = int(GAUSSIAN_TRUNCATE * sigma + 0.5)
+    x = np.arange(-radius, radius + 1)
+    phi = np.exp(-0.5 / (sigma * sigma) * x ** 2)
+    return phi / phi.sum()
+
+
+def smooth_rows_exact(field, sigma):
+    """
+    Row j of gaussian_filter(field, sigma[j], mode='nearest'), for every row,
+    with two 1-D convolutions per row: a weighted sum of the neighbouring
+    rows, then a convolution along the row.
+    """
+    nj = field.shape[0]
+    smoothed = np.empty_like(field)
+    for j in range(nj):
+        if sigma[j] <= 1.0e-15:
+            smoothed[j, :] = field[j, :]
+            continue
+        kernel = gaussian_kernel(sigma[j])
+        radius = len(kernel) // 2
+        rows = np.clip(np.arange(j - radius, j + radius + 1), 0, nj - 1)
+        smoothed[j, :] = gaussian_filter1d(kernel @ field[rows, :], sigma[j], mode='nearest',
+                                           truncate=GAUSSIAN_TRUNCATE)
+    return smoothed
+
+
+def smooth_rows_banded(field, sigma, bin_ratio=1.05):
+    """
+    Approximation of smooth_rows_exact: the field is smoothed once for each
+    of a geometric series of sigmas (ratio bin_ratio) and every row is
+    interpolated, in log(sigma), between the two smoothed fields bracketing
+    its sigma. Each smoothing is restricted to the band of rows that use it.
+    """
+    nj = field.shape[0]
+    sigma_min = max(np.min(sigma), 1.0e-15)
+    sigma_max = max(np.max(sigma), sigma_min)
+    nbins = int(np.ceil(np.log(sigma_max / sigma_min) / np.log(bin_ratio))) + 1
+    levels = np.geomspace(sigma_min, sigma_max, nbins) if nbins > 1 else np.array([sigma_min])
+
+    position = np.zeros(nj)
+    if nbins > 1:
+        position = np.log(np.clip(sigma, sigma_min, sigma_max) / sigma_min) / np.log(levels[1] / levels[0])
+    lower = np.clip(np.floor(position).astype(int), 0, nbins - 1)
+    weight = position - lower
+
+    smoothed = np.zeros(field.shape)
+    for level in np.unique(np.concatenate([lower, np.clip(lower + 1, 0, nbins - 1)[weight > 0]])):
+        rows = np.flatnonzero((lower == level) | ((lower + 1 == level) & (weight > 0)))
+        row_weight = np.where(lower[rows] == level, 1.0 - weight[rows], weight[rows])
+        # rows further than the kernel radius do not contribute
+        radius = int(GAUSSIAN_TRUNCATE * levels[level] + 0.5)
+        j0, j1 = max(rows.min() - radius, 0), min(rows.max() + radius + 1, nj)
+        band = gaussian_filter(field[j0:j1, :], sigma=levels[level], mode='nearest')
+        smoothed[rows, :] += row_weight[:, np.newaxis] * band[rows - j0, :]
+    return smoothed.astype(field.dtype)
+
+
+def smooth_rows(field, sigma, method='exact', bin_ratio=1.05):
+    """
+    Smooth each row j of field with a 2-D gaussian of standard deviation
+    sigma[j] (in grid cells), 'exact'ly or with the 'banded' approximation.
+    """
+    field = np.asarray(field)
+    if not np.all(np.isfinite(sigma)):
+        raise ValueError("The smoothing scales must be finite")
+    if method == 'exact':
+        return smooth_rows_exact(field, sigma)
+    elif method == 'banded':
+        return smooth_rows_banded(field, sigma, bin_ratio)
+    raise ValueError(f"Unknown smoothing method {method}, expected 'exact' or 'banded'")
+
+
 def run(yaml_file):
     config = load_config(yaml_file)
     gridspec_filename = config.get('gridspec_filename', "./soca_gridspec.nc")
@@ -31,6 +108,10 @@ def run(yaml_file):
     HZ_MAX = float(config.get('HZ_MAX', 200e3))
     HZ_MIN_GRID_MULT = float(config.get('HZ_MIN_GRID_MULT', 1.0))
 
+    SMOOTHING_METHOD = config.get('smoothing_method', 'exact')
+    SMOOTHING_BIN_RATIO = float(config.get('smoothing_bin_ratio', 1.05))
+    LEVEL_CHUNK = int(config.get('level_chunk', 1))
+
     # read input
     with nc.Dataset(gridspec_filename, 'r') as src:
         rossbyRadius = src.variables['rossby_radius'][0]
@@ -55,73 +136,97 @@ def run(yaml_file):
     # do not vary as much with longitude as they do with latitude
     with warnings.catch_warnings():
         warnings.simplefilter("ignore", category=RuntimeWarning)
-        smoothingScale = np.nanmean(np.where(mask, hz_scales/np.sqrt(area), np.NaN), axis=1)
+        smoothingScale = np.nanmean(np.where(mask, hz_scales/np.sqrt(area), np.nan), axis=1)
     smoothingScale[0] = smoothingScale[1]
     smoothingScale[-1] = smoothingScale[-2]
 
     # smooth the horizontal scales WITH the horizontal scales.
-    hz_scales_orig = hz_scales.copy()
-    for j in range(hz_scales.shape[0]):  # zonally for efficiency (otherwise it would be am i/j set of for loops)
-        hz_scales[j, :] = gaussian_filter(hz_scales_orig, sigma=smoothingScale[j], mode='nearest')[j, :]
+    hz_scales = smooth_rows(hz_scales, smoothingScale, SMOOTHING_METHOD, SMOOTHING_BIN_RATIO)
     hz_scales = np.where(mask, hz_scales, 0)
-    del hz_scales_orig
 
     # calculate vertical scales.
     # ---------------------------------------------------------
 
-    # initialize with zeros
-    vtScales = np.zeros_like(h)
-
     # smooth the MLD with the horizontal scales.
-    mld_orig = mld.copy()
     # fill missing
     mld_orig = mld[tuple(distance_transform_edt(mask == 0, return_distances=False, return_indices=True))]
-    for j in range(mld.shape[0]):  # zonally for efficiency (otherwise it would be am i/j set of for loops)
-        mld[j, :] = gaussian_filter(mld_orig, sigma=smoothingScale[j], mode='nearest')[j, :]
+    mld = smooth_rows(mld_orig, smoothingScale, SMOOTHING_METHOD, SMOOTHING_BIN_RATIO)
     mld = np.where(mask, mld, 0)
     del mld_orig
 
-    # calculate layer depths for use later
-    layerDepth = np.cumsum(h, axis=0) - h/2.0
-    maxLevels = np.sum(np.where(h > 0.01, 1, 0), axis=0)  # number of lvls before we hit bottom
+    mlLayers = mixed_layer_levels(h, mld)
+
+    # write output file, the vertical scales are computed and written
+    # LEVEL_CHUNK levels at a time
+    with nc.Dataset(output_filename, 'w') as dst:
+        dst.createDimension('Time', None)
+        dst.createDimension('z', h.shape[0])
+        dst.createDimension('y', h.shape[1])
+        dst.createDimension('x', h.shape[2])
+
+        time = dst.createVariable('Time', varType, ('Time',))
+        var_vt = dst.createVariable(output_variable_vt, varType, ('z', 'y', 'x'))
+        var_hz = dst.createVariable(output_variable_hz, varType, ('y', 'x'))
+
+        var_hz[:] = hz_scales
+        for k0 in range(0, nz, LEVEL_CHUNK):
+            k1 = min(k0 + LEVEL_CHUNK, nz)
+            var_vt[k0:k1, ...] = vertical_scales(h[k0:k1], mlLayers, k0, VT_MIN, VT_MAX)
+
+
+def mixed_layer_levels(h, mld):
+    """
+    Fractional number of levels in the mixed layer of depth mld, for layer
+    thicknesses h (z, y, x). The layer depths are accumulated level by
+    level, so only 2-D arrays are allocated.
+    """
+    nz = h.shape[0]
+
+    # count the levels before we hit bottom, and the levels whose middle is
+    # in the mixed layer, not counting small bottom layers
+    maxLevels = np.zeros(h.shape[1:], dtype=int)
+    mlLastLevel = np.zeros(h.shape[1:], dtype=int)
+    for k, layerDepth in enumerate(layer_depths(h)):
+        thick = h[k] > 0.01
+        maxLevels += thick
+        mlLastLevel += (layerDepth < mld) & thick
 
-    # find index of last level in the mixed layer
-    mlLastLevel = np.where(layerDepth < np.stack([mld]*nz, axis=0), 1, 0)
-    mlLastLevel[h <= 0.01] = 0  # don't count small bottom layers
-    mlLastLevel = np.clip(np.sum(mlLastLevel, axis=0)-1, a_min=0, a_max=nz-2)
+    # index of last level in the mixed layer
+    mlLastLevel = np.clip(mlLastLevel-1, a_min=0, a_max=nz-2)
 
     # add to that a fraction of layer at the bottom of the mixed layer
     # for a total fractional number of levels in the ML
-    y_idx, x_idx = np.indices(mlLastLevel.shape)
-    depth1 = layerDepth[mlLastLevel, y_idx, x_idx]
-    depth2 = layerDepth[mlLastLevel+1, y_idx, x_idx]
+    depth1 = np.zeros(h.shape[1:], dtype=h.dtype)
+    depth2 = np.zeros(h.shape[1:], dtype=h.dtype)
+    for k, layerDepth in enumerate(layer_depths(h)):
+        np.copyto(depth1, layerDepth, where=(mlLastLevel == k))
+        np.copyto(depth2, layerDepth, where=(mlLastLevel+1 == k))
     mlLayers = mlLastLevel + (mld - depth1) / (depth2-depth1)
-    mlLayers = np.clip(mlLayers, a_min=1, a_max=maxLevels)
+    return np.clip(mlLayers, a_min=1, a_max=maxLevels)
 
-    # set the top to the number of levels in the ML, interpolate down to bottom of ML
-    # AND enforce a min/max value. The max value is important in order
-    # to keep the number of diffusion iterations in check. The resulting diracs
-    # are not quite the same... but close enough.
-    layer, _, _ = np.indices(h.shape)
-    mlLayers3D = np.stack([mlLayers]*nz, axis=0)
-    vtScales[:] = np.clip(mlLayers3D - layer, a_min=VT_MIN, a_max=VT_MAX)
 
-    # ignore thin layers at the bottom
-    vtScales[h <= 0.01] = 0
+def layer_depths(h):
+    """Depth of the middle of each layer, yielded level by level."""
+    depth = np.zeros(h.shape[1:], dtype=h.dtype)
+    for k in range(h.shape[0]):
+        depth = depth + h[k]
+        yield depth - h[k]/2.0
 
-    # write output file
-    with nc.Dataset(output_filename, 'w') as dst:
-        dst.createDimension('Time', None)
-        dst.createDimension('z', vtScales.shape[0])
-        dst.createDimension('y', vtScales.shape[1])
-        dst.createDimension('x', vtScales.shape[2])
 
-        time = dst.createVariable('Time', varType, ('Time',))
-        var_vt = dst.createVariable(output_variable_vt, varType, ('z', 'y', 'x'))
-        var_hz = dst.createVariable(output_variable_hz, varType, ('y', 'x'))
+def vertical_scales(h, mlLayers, k0, vt_min, vt_max):
+    """
+    Vertical scales of the levels k0 to k0 + len(h): the number of levels in
+    the ML at the top, interpolated down to the bottom of the ML, with a
+    min/max value. The max value is important in order to keep the number
+    of diffusion iterations in check. The resulting diracs are not quite
+    the same... but close enough.
+    """
+    layer = np.arange(k0, k0 + h.shape[0])[:, np.newaxis, np.newaxis]
+    vtScales = np.clip(mlLayers - layer, a_min=vt_min, a_max=vt_max).astype(h.dtype)
 
-        var_vt[:] = vtScales
-        var_hz[:] = hz_scales
+    # ignore thin layers at the bottom
+    vtScales[h <= 0.01] = 0
+    return vtScales
 
 
 def main():
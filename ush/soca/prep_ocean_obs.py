@@ -1,15 +1,18 @@
 #!/usr/bin/env python3
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from conversion_cache import ConversionCache, MAX_SIZE_GB, MAX_AGE_DAYS
 from datetime import datetime, timedelta
-from gen_bufr2ioda_json import gen_bufr_json
+from gen_bufr2ioda_json import gen_bufr_jsons
 from logging import getLogger
-from multiprocessing import Process
 import os
+import time
 from soca import prep_ocean_obs_utils
 from typing import Dict
 from wxflow import (chdir,
                     FileHandler,
                     logit,
+                    rm_p,
                     save_as_yaml,
                     Task,
                     YAMLFile)
@@ -51,6 +54,8 @@ class PrepOceanObs(Task):
 
         self.task_config.conversion_list_file = 'conversion_list.yaml'
         self.task_config.save_list_file = 'save_list.yaml'
+        self.task_config.conversion_report_file = 'conversion_report.yaml'
+        self.task_config.transfer_manifest_file = 'transfer_manifest.yaml'
 
     @logit(logger)
     def initialize(self):
@@ -99,8 +104,23 @@ class PrepOceanObs(Task):
             os.makedirs(COMOUT_OBS)
 
         obsspaces_to_convert = []
+        # bufr configs, rendered in one batch after the loop
+        bufr_configs = []
+        timings = {}
+
+        # the DMPDIR directories are listed once for all the obs spaces
+        dump_index = prep_ocean_obs_utils.DumpIndex(self.task_config.get('DMPDIR_INDEX_FILE'))
 
         try:
+            # index the obs spaces of OBSPREP_YAML by name
+            obsprep_spaces = {}
+            for obsprep_entry in obsprep_config['observations']:
+                obsprep_space = obsprep_entry['obs space']
+                if obsprep_space['name'] in obsprep_spaces:
+                    logger.warning(f"obs space {obsprep_space['name']} repeated in OBSPREP_YAML, using the first")
+                    continue
+                obsprep_spaces[obsprep_space['name']] = obsprep_space
+
             # go through the sources in OBS_YAML
             for observer in observer_config['observers']:
                 try:
@@ -110,80 +130,94 @@ class PrepOceanObs(Task):
                     logger.warning("Ill-formed observer yaml file, skipping")
                     continue
 
-                # find match to the obs space from OBS_YAML in OBSPREP_YAML
-                # this is awkward and unpythonic, so feel free to improve
-                for obsprep_entry in obsprep_config['observations']:
-                    obsprep_space = obsprep_entry['obs space']
-                    obsprep_space_name = obsprep_space['name']
-
-                    if obsprep_space_name == obs_space_name:
-                        obtype = obsprep_space_name  # for brevity
-                        logger.info(f"Observer {obtype} found in OBSPREP_YAML")
-
-                        try:
-                            obs_window_back = obsprep_space['window']['back']
-                            obs_window_forward = obsprep_space['window']['forward']
-                        except KeyError:
-                            obs_window_back = 0
-                            obs_window_forward = 0
-
-                        window_cdates = []
-                        for i in range(-obs_window_back, obs_window_forward + 1):
-                            interval = timedelta(hours=assim_freq * i)
-                            window_cdates.append(cdate + interval)
-
-                        input_files = prep_ocean_obs_utils.obs_fetch(self.task_config,
-                                                                     self.task_config,
-                                                                     obsprep_space,
-                                                                     window_cdates)
-
-                        if not input_files:
-                            logger.warning(f"No files found for obs source {obtype}, skipping")
-                            break  # go to next observer in OBS_YAML
-
-                        obsprep_space['input files'] = input_files
-                        obsprep_space['window begin'] = self.window_begin
-                        obsprep_space['window end'] = self.window_end
-                        ioda_filename = f"{RUN}.t{cyc:02d}z.{obs_space_name}.{cdatestr}.nc4"
-                        obsprep_space['output file'] = ioda_filename
-
-                        # set up the config file for conversion to IODA for bufr and
-                        # netcdf files respectively
-                        if obsprep_space['type'] == 'bufr':
-                            gen_bufr_json_config = {'RUN': RUN,
-                                                    'current_cycle': cdate,
-                                                    'DMPDIR': COMIN_OBS,
-                                                    'COM_OBS': COMIN_OBS}
-                            json_config_file = os.path.join(COMIN_OBS,
-                                                            f"{obtype}_{cdatestr}.json")
-                            obsprep_space['conversion config file'] = json_config_file
-                            bufr2iodapy = BUFR2IODA_PY_DIR + '/bufr2ioda_' + obtype + '.py'
-                            obsprep_space['bufr2ioda converter'] = bufr2iodapy
-                            tmpl_filename = 'bufr2ioda_' + obtype + '.json'
-                            template = os.path.join(JSON_TMPL_DIR, tmpl_filename)
-                            try:
-                                gen_bufr_json(gen_bufr_json_config, template, json_config_file)
-                            except Exception as e:
-                                logger.warning(f"An exeception {e} occured while trying to run gen_bufr_json")
-                                logger.warning(f"obtype {obtype} will be skipped")
-                                break  # go to next observer in OBS_YAML
-
-                            obsspaces_to_convert.append({"obs space": obsprep_space})
-
-                        elif obsprep_space['type'] == 'nc':
-                            ioda_config_file = obtype + '2ioda.yaml'
-                            obsprep_space['conversion config file'] = ioda_config_file
-                            save_as_yaml(obsprep_space, ioda_config_file)
-
-                            obsspaces_to_convert.append({"obs space": obsprep_space})
-
-                        else:
-                            logger.warning(f"obs space {obtype} has bad type {obsprep_space['type']}, skipping")
+                obsprep_space = obsprep_spaces.get(obs_space_name)
+                if obsprep_space is None:
+                    continue
+
+                start = time.perf_counter()
+                obtype = obs_space_name  # for brevity
+                logger.info(f"Observer {obtype} found in OBSPREP_YAML")
+
+                try:
+                    obs_window_back = obsprep_space['window']['back']
+                    obs_window_forward = obsprep_space['window']['forward']
+                except KeyError:
+                    obs_window_back = 0
+                    obs_window_forward = 0
+
+                window_cdates = []
+                for i in range(-obs_window_back, obs_window_forward + 1):
+                    interval = timedelta(hours=assim_freq * i)
+                    window_cdates.append(cdate + interval)
+
+                input_files = prep_ocean_obs_utils.obs_fetch(self.task_config,
+                                                             self.task_config,
+                                                             obsprep_space,
+                                                             window_cdates,
+                                                             dump_index)
+                timings[obtype] = time.perf_counter() - start
+
+                if not input_files:
+                    logger.warning(f"No files found for obs source {obtype}, skipping")
+                    continue  # go to next observer in OBS_YAML
+
+                obsprep_space['input files'] = input_files
+                obsprep_space['window begin'] = self.window_begin
+                obsprep_space['window end'] = self.window_end
+                ioda_filename = f"{RUN}.t{cyc:02d}z.{obs_space_name}.{cdatestr}.nc4"
+                obsprep_space['output file'] = ioda_filename
+
+                # set up the config file for conversion to IODA for bufr and
+                # netcdf files respectively
+                if obsprep_space['type'] == 'bufr':
+                    json_config_file = os.path.join(COMIN_OBS,
+                                                    f"{obtype}_{cdatestr}.json")
+                    obsprep_space['conversion config file'] = json_config_file
+                    bufr2iodapy = BUFR2IODA_PY_DIR + '/bufr2ioda_' + obtype + '.py'
+                    obsprep_space['bufr2ioda converter'] = bufr2iodapy
+                    tmpl_filename = 'bufr2ioda_' + obtype + '.json'
+                    template = os.path.join(JSON_TMPL_DIR, tmpl_filename)
+                    bufr_configs.append((template, json_config_file))
+
+                    obsspaces_to_convert.append({"obs space": obsprep_space})
+
+                elif obsprep_space['type'] == 'nc':
+                    ioda_config_file = obtype + '2ioda.yaml'
+                    obsprep_space['conversion config file'] = ioda_config_file
+                    save_as_yaml(obsprep_space, ioda_config_file)
+
+                    obsspaces_to_convert.append({"obs space": obsprep_space})
+
+                else:
+                    logger.warning(f"obs space {obtype} has bad type {obsprep_space['type']}, skipping")
 
         except TypeError:
             logger.critical("Ill-formed OBS_YAML or OBSPREP_YAML file, exiting")
             raise
 
+        # the bufr configs all use the same substitutions
+        if bufr_configs:
+            gen_bufr_json_config = {'RUN': RUN,
+                                    'current_cycle': cdate,
+                                    'DMPDIR': COMIN_OBS,
+                                    'COM_OBS': COMIN_OBS}
+            start = time.perf_counter()
+            failed = gen_bufr_jsons(gen_bufr_json_config, bufr_configs)
+            logger.info(f"Generated {len(bufr_configs)} bufr2ioda configs in {time.perf_counter() - start:.2f} s")
+            for json_config_file, e in failed.items():
+                logger.warning(f"An exeception {e} occured while trying to generate {json_config_file}")
+            if failed:
+                skipped = [observation['obs space']['name'] for observation in obsspaces_to_convert
+                           if observation['obs space'].get('conversion config file') in failed]
+                logger.warning(f"obtypes {skipped} will be skipped")
+                obsspaces_to_convert = [observation for observation in obsspaces_to_convert
+                                        if observation['obs space']['name'] not in skipped]
+
+        for obtype, timing in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+            logger.info(f"{obtype:<30} files found and staged in {timing:.2f} s")
+
+        dump_index.save()
+
         # yes, there is redundancy between the yamls fed to the ioda converter and here,
         # this seems safer and easier than being selective about the fields
         save_as_yaml({"observations": obsspaces_to_convert}, self.task_config.conversion_list_file)
@@ -205,30 +239,83 @@ class PrepOceanObs(Task):
 
         obsspaces_to_convert = YAMLFile(self.task_config.conversion_list_file)
 
-        processes = []
+        # conversions rerun with unchanged inputs, config and converter are
+        # restored from the cache instead
+        cache = None
+        if self.task_config.get('CONVERSION_CACHE_DIR'):
+            cache = ConversionCache(self.task_config.CONVERSION_CACHE_DIR,
+                                    max_size_gb=float(self.task_config.get('CONVERSION_CACHE_MAX_GB', MAX_SIZE_GB)),
+                                    max_age_days=float(self.task_config.get('CONVERSION_CACHE_MAX_AGE_DAYS', MAX_AGE_DAYS)))
+
+        # conversions to run, as (obs space, converter arguments, cache key)
+        conversions = []
+        records = []
         for observation in obsspaces_to_convert['observations']:
 
             obs_space = observation['obs space']
             obtype = obs_space['name']
-            logger.info(f"Trying to convert {obtype} to IODA")
+            input_files = [os.path.join(self.task_config.COMIN_OBS, input_file)
+                           for input_file in obs_space['input files']]
+            cache_key = None
+            if cache and obs_space["type"] in ("nc", "bufr"):
+                if obs_space["type"] == "nc":
+                    converter = self.task_config.OCNOBS2IODAEXEC
+                else:
+                    converter = obs_space['bufr2ioda converter']
+                cache_key = cache.key(converter, obs_space['conversion config file'], input_files)
+                if cache.restore(cache_key, self.task_config.DATA) is not None:
+                    logger.info(f"{obtype} unchanged since last conversion, reusing cached IODA file")
+                    records.append((obs_space, conversion_record(obs_space, input_files, 0, 0.0, 'cached')))
+                    continue
+                # never write a new output through a link into the cache
+                rm_p(obs_space['output file'])
+
             if obs_space["type"] == "nc":
-                process = Process(target=prep_ocean_obs_utils.run_netcdf_to_ioda, args=(obs_space,
-                                                                                        self.task_config.OCNOBS2IODAEXEC))
+                target = prep_ocean_obs_utils.run_netcdf_to_ioda
+                args = (obs_space, self.task_config.OCNOBS2IODAEXEC)
             elif obs_space["type"] == "bufr":
-                process = Process(target=prep_ocean_obs_utils.run_bufr_to_ioda, args=(obs_space,))
+                target = prep_ocean_obs_utils.run_bufr_to_ioda
+                args = (obs_space,)
             else:
                 logger.warning(f"Invalid observation format {obs_space['type']}, skipping obtype {obtype}")
                 continue
-            process.start()
-            processes.append((process, obs_space))
-
-        completed = []
-        # Wait for all processes to finish
-        # TODO(AFE): add return value checking
-        for process, obs_space in processes:
-            process.join()
-            completed.append(obs_space)
-
+            conversions.append((obs_space, input_files, target, args, cache_key))
+
+        # every converter runs in its own subprocess, threads are enough to
+        # drive them; the largest inputs are started first so that they do
+        # not end up alone at the tail of the run
+        conversions.sort(key=lambda conversion: input_bytes(conversion[1]), reverse=True)
+        max_workers = int(self.task_config.get('PREP_OCEAN_OBS_NPROC', os.cpu_count()))
+        timeout = self.task_config.get('PREP_OCEAN_OBS_TIMEOUT', None)
+        timeout = float(timeout) if timeout else None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for obs_space, input_files, target, args, cache_key in conversions:
+                logger.info(f"Trying to convert {obs_space['name']} to IODA")
+                futures[executor.submit(timed_conversion, target, args, timeout)] = (obs_space, input_files, cache_key)
+
+            for future in as_completed(futures):
+                obs_space, input_files, cache_key = futures[future]
+                try:
+                    returncode, runtime = future.result()
+                except Exception as e:
+                    logger.warning(f"Conversion of {obs_space['name']} raised {e}")
+                    returncode, runtime = None, None
+                succeeded = returncode == 0 and os.path.exists(obs_space['output file'])
+                status = 'success' if succeeded else 'failed'
+                records.append((obs_space, conversion_record(obs_space, input_files, returncode, runtime, status)))
+                if succeeded and cache_key is not None:
+                    cache.store(cache_key, [obs_space['output file']])
+
+        for _, record in records:
+            logger.info(f"{record['name']:<30} {record['status']:<8} rc {str(record['return code']):>4}  "
+                        f"{record['input bytes']:>12d} B  {record['locations']} locations  "
+                        f"{record['runtime']} s")
+        save_as_yaml({"conversions": [record for _, record in records]}, self.task_config.conversion_report_file)
+
+        # only the successful conversions are saved by finalize
+        completed = [obs_space for obs_space, record in records if record['status'] != 'failed']
         save_as_yaml({"observations": completed}, self.task_config.save_list_file)
 
     @logit(logger)
@@ -250,16 +337,59 @@ class PrepOceanObs(Task):
 
         obsspaces_to_save = YAMLFile(self.task_config.save_list_file)
 
+        file_copy = []
         for obsspace_to_save in obsspaces_to_save['observations']:
 
             output_file = obsspace_to_save['output file']
             conv_config_file = obsspace_to_save['conversion config file']
-            output_file_dest = os.path.join(COMOUT_OBS, output_file)
-            conv_config_file_dest = os.path.join(COMOUT_OBS, conv_config_file)
-
-            try:
-                FileHandler({'copy': [[output_file, output_file_dest]]}).sync()
-                FileHandler({'copy': [[conv_config_file, conv_config_file_dest]]}).sync()
-            except OSError:
-                logger.warning(f"Obs file not found, possible IODA converter failure)")
+            if not os.path.exists(output_file):
+                logger.warning(f"Obs file {output_file} not found, possible IODA converter failure")
                 continue
+            output_file_dest = os.path.join(COMOUT_OBS, os.path.basename(output_file))
+            conv_config_file_dest = os.path.join(COMOUT_OBS, os.path.basename(conv_config_file))
+            file_copy.extend([[output_file, output_file_dest], [conv_config_file, conv_config_file_dest]])
+
+        # the copies to COM are written through temporary files, checked and
+        # renamed, so downstream jobs never see a partial file
+        start = time.perf_counter()
+        manifest = prep_ocean_obs_utils.transfer_files(file_copy,
+                                                       checksum=self.task_config.get('VERIFY_OBS_CHECKSUM', False))
+        wall_time = time.perf_counter() - start
+
+        for entry in manifest:
+            if entry['status'] == 'failed':
+                logger.warning(f"Could not save {entry['source']}: {entry['error']}")
+        total_bytes = sum(entry['bytes'] for entry in manifest if entry['status'] == 'copied')
+        throughput = total_bytes / wall_time / 1.0e6 if wall_time > 0 else 0.0
+        logger.info(f"Saved {total_bytes} bytes to {COMOUT_OBS} in {wall_time:.2f} s ({throughput:.1f} MB/s)")
+        save_as_yaml({'wall time': round(wall_time, 3),
+                      'bytes': total_bytes,
+                      'throughput MB/s': round(throughput, 1),
+                      'files': manifest},
+                     self.task_config.transfer_manifest_file)
+
+
+def input_bytes(input_files):
+    return sum(os.path.getsize(f) for f in input_files if os.path.isfile(f))
+
+
+def timed_conversion(target, args, timeout):
+    """Run a converter, return its return code and wall time."""
+    start = time.perf_counter()
+    returncode = target(*args, timeout=timeout)
+    return returncode, time.perf_counter() - start
+
+
+def conversion_record(obs_space, input_files, returncode, runtime, status):
+    """Outcome of the conversion of an obs space, as written to the conversion report."""
+    output_file = obs_space['output file']
+    locations = None
+    if status != 'failed':
+        locations = prep_ocean_obs_utils.count_locations(output_file)
+    return {'name': obs_space['name'],
+            'status': status,
+            'return code': returncode,
+            'runtime': round(runtime, 2) if runtime is not None else None,
+            'input bytes': input_bytes(input_files),
+            'output file': output_file,
+            'locations': locations}
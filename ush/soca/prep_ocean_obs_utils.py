@@ -1,16 +1,190 @@
 #!/usr/bin/env python3
 import os
 import fnmatch
+import hashlib
+import json
+import shutil
 import subprocess
-from wxflow import FileHandler, Logger
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from netCDF4 import Dataset
+from wxflow import Logger, rm_p
 
 logger = Logger()
 
+# number of files staged concurrently when they cannot be hard-linked
+COPY_WORKERS = 8
+CHUNK_SIZE = 1 << 20
+
+
+class DumpIndex:
+    """
+    Index of the files under the DMPDIR directories, scanned once with
+    os.scandir and shared by all the obs spaces of a task, which often read
+    the same directories.
+
+    With index_file, the listing is persisted as JSON and a directory is
+    only scanned again when its modification time has changed.
+    """
+
+    def __init__(self, index_file=None):
+        self.index_file = index_file
+        self.dirs = {}
+        if index_file and os.path.isfile(index_file):
+            with open(index_file, 'r') as f:
+                self.dirs = json.load(f)
+        self.modified = False
+
+    def _listing(self, path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        entry = self.dirs.get(path)
+        if entry is None or entry['mtime'] != mtime:
+            files, subdirs = [], []
+            with os.scandir(path) as it:
+                for dir_entry in it:
+                    if dir_entry.is_dir():
+                        subdirs.append(dir_entry.name)
+                    else:
+                        files.append(dir_entry.name)
+            entry = {'mtime': mtime, 'files': sorted(files), 'dirs': sorted(subdirs)}
+            self.dirs[path] = entry
+            self.modified = True
+        return entry
+
+    def glob(self, top, pattern):
+        """Paths of the files under top (recursively) whose name matches pattern."""
+        matches = []
+        pending = [top]
+        while pending:
+            path = pending.pop()
+            entry = self._listing(path)
+            if entry is None:
+                continue
+            matches.extend(os.path.join(path, filename)
+                           for filename in fnmatch.filter(entry['files'], pattern))
+            pending.extend(os.path.join(path, subdir) for subdir in reversed(entry['dirs']))
+        return matches
+
+    def save(self):
+        if self.index_file and self.modified:
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(self.dirs, f)
+            os.replace(tmp_file, self.index_file)
+            self.modified = False
+
+
+def _up_to_date(src, dst):
+    if not os.path.exists(dst):
+        return False
+    src_stat, dst_stat = os.stat(src), os.stat(dst)
+    # copies keep the modification time of their source (copy2)
+    return os.path.samestat(src_stat, dst_stat) or \
+        (src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns == dst_stat.st_mtime_ns)
+
+
+def stage_files(file_copy, max_workers=COPY_WORKERS):
+    """
+    Stage the [src, dst] pairs: hard-link them when both sides are on the
+    same file system, copy the others concurrently. Files already staged
+    are left in place.
+    """
+    to_copy = []
+    for src, dst in file_copy:
+        if _up_to_date(src, dst):
+            continue
+        if os.path.lexists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            to_copy.append((src, dst))
+
+    if to_copy:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in [executor.submit(shutil.copy2, src, dst) for src, dst in to_copy]:
+                future.result()
+    logger.info(f"staged {len(file_copy)} files, {len(to_copy)} copied")
+
+
+def _copy_with_digest(src, dst):
+    digest = hashlib.sha256()
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        for chunk in iter(lambda: fsrc.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            fdst.write(chunk)
+    return digest.hexdigest()
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def transfer_file(src, dst, checksum=False):
+    """
+    Copy src to dst through a temporary file in the destination directory,
+    renamed once its size (and with checksum its sha256) has been checked,
+    so that dst is never seen partially written. Returns the manifest entry
+    of the transfer.
+    """
+    start = time.perf_counter()
+    entry = {'source': src, 'destination': dst, 'bytes': os.path.getsize(src)}
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        entry.update({'seconds': 0.0, 'status': 'in place'})
+        return entry
+
+    fd, tmp_file = tempfile.mkstemp(prefix=f".{os.path.basename(dst)}.", dir=os.path.dirname(dst))
+    os.close(fd)
+    try:
+        if checksum:
+            entry['sha256'] = _copy_with_digest(src, tmp_file)
+        else:
+            shutil.copyfile(src, tmp_file)
+        shutil.copymode(src, tmp_file)
+        size = os.path.getsize(tmp_file)
+        if size != entry['bytes']:
+            raise OSError(f"size of the copy of {src} is {size}, expected {entry['bytes']}")
+        if checksum and _file_digest(tmp_file) != entry['sha256']:
+            raise OSError(f"checksum of the copy of {src} does not match")
+        os.replace(tmp_file, dst)
+    except BaseException:
+        rm_p(tmp_file)
+        raise
+
+    entry['seconds'] = round(time.perf_counter() - start, 3)
+    entry['status'] = 'copied'
+    return entry
+
+
+def transfer_files(file_copy, max_workers=COPY_WORKERS, checksum=False):
+    """
+    Transfer the [src, dst] pairs concurrently with transfer_file. Returns
+    the manifest entries, with an 'error' for the failed transfers.
+    """
+    manifest = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(src, dst, executor.submit(transfer_file, src, dst, checksum)) for src, dst in file_copy]
+        for src, dst, future in futures:
+            try:
+                manifest.append(future.result())
+            except OSError as e:
+                manifest.append({'source': src, 'destination': dst, 'status': 'failed', 'error': str(e)})
+    return manifest
+
+
 # finds files in DMPDIR matching the regex in an obtype's preobs config,
 # copies them to DATA, and returns a list of the files so handled
 
 
-def obs_fetch(config, task_config, obsprep_space, cycles):
+def obs_fetch(config, task_config, obsprep_space, cycles, index=None):
 
     DMPDIR = config.DMPDIR
     COMIN_OBS = config.COMIN_OBS
@@ -19,6 +193,9 @@ def obs_fetch(config, task_config, obsprep_space, cycles):
     PDY = task_config.PDY
     cyc = task_config.cyc
 
+    if index is None:
+        index = DumpIndex()
+
     subdir = obsprep_space['dmpdir subdir']
     dumpdir_regex = obsprep_space['dmpdir regex']
     matching_files = []
@@ -34,47 +211,59 @@ def obs_fetch(config, task_config, obsprep_space, cycles):
         # TODO: check the existence of this
         logger.info(f"full_input_dir: {full_input_dir}")
 
-        for root, _, files in os.walk(full_input_dir):
-            for filename in fnmatch.filter(files, dumpdir_regex):
-                target_file = PDY + cyc + '-' + filename
-                matching_files.append((full_input_dir, filename, target_file))
+        for file_path in index.glob(full_input_dir, dumpdir_regex):
+            filename = os.path.basename(file_path)
+            target_file = PDY + cyc + '-' + filename
+            matching_files.append((file_path, filename, target_file))
 
-    for full_input_dir, filename, target_file in matching_files:
-        file_path = os.path.join(full_input_dir, filename)
+    for file_path, filename, target_file in matching_files:
         file_destination = os.path.join(COMIN_OBS, target_file)
         file_copy.append([file_path, file_destination])
 
     logger.info(f"file_copy: {file_copy}")
     logger.info(f"matching_files: {matching_files}")
 
-    FileHandler({'copy': file_copy}).sync()
+    stage_files(file_copy)
 
     # return the modified file names for the IODA converters
     return [f[2] for f in matching_files]
 
 
-def run_netcdf_to_ioda(obsspace_to_convert, OCNOBS2IODAEXEC):
-    logger.info(f"running run_netcdf_to_ioda on {obsspace_to_convert['name']}")
-    iodaYamlFilename = obsspace_to_convert['conversion config file']
+# return code of a converter killed after its timeout, as for timeout(1)
+TIMEOUT_RETURN_CODE = 124
+
+
+def run_converter(obsspace_to_convert, command, timeout=None):
     try:
-        subprocess.run([OCNOBS2IODAEXEC, iodaYamlFilename], check=True)
+        subprocess.run(command, check=True, timeout=timeout)
         logger.info(f"ran ioda converter on obs space {obsspace_to_convert['name']} successfully")
         return 0
     except subprocess.CalledProcessError as e:
         logger.warning(f"ioda converter failed with error {e}, \
             return code {e.returncode}")
         return e.returncode
+    except subprocess.TimeoutExpired:
+        logger.warning(f"ioda converter on obs space {obsspace_to_convert['name']} timed out after {timeout} s")
+        return TIMEOUT_RETURN_CODE
+
+
+def run_netcdf_to_ioda(obsspace_to_convert, OCNOBS2IODAEXEC, timeout=None):
+    logger.info(f"running run_netcdf_to_ioda on {obsspace_to_convert['name']}")
+    iodaYamlFilename = obsspace_to_convert['conversion config file']
+    return run_converter(obsspace_to_convert, [OCNOBS2IODAEXEC, iodaYamlFilename], timeout)
 
 
-def run_bufr_to_ioda(obsspace_to_convert):
+def run_bufr_to_ioda(obsspace_to_convert, timeout=None):
     logger.info(f"running run_bufr_to_ioda on {obsspace_to_convert['name']}")
     json_output_file = obsspace_to_convert['conversion config file']
     bufr2iodapy = obsspace_to_convert['bufr2ioda converter']
+    return run_converter(obsspace_to_convert, ['python', bufr2iodapy, '-c', json_output_file, '-v'], timeout)
+
+
+def count_locations(ioda_file):
+    """Number of locations in an IODA file, None if it cannot be read."""
     try:
-        subprocess.run(['python', bufr2iodapy, '-c', json_output_file, '-v'], check=True)
-        logger.info(f"ran ioda converter on obs space {obsspace_to_convert['name']} successfully")
-        return 0
-    except subprocess.CalledProcessError as e:
-        logger.warning(f"bufr2ioda converter failed with error {e}, \
-            return code {e.returncode}")
-        return e.returncode
+        with Dataset(ioda_file, 'r') as ncf:
+            return ncf.dimensions['Location'].size
+    except (OSError, KeyError):
+        return None
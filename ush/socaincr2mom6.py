@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 import xarray as xr
 import argparse
+import hashlib
 import os
+import tempfile
 import numpy as np
 from netCDF4 import Dataset
-from scipy.interpolate import griddata
+from scipy.spatial import cKDTree
 import ufsda
 from wxflow import FileHandler, YAMLFile
 
@@ -54,7 +56,7 @@ def socaincr2mom6(incr, bkg, grid, incr_out, nsst_yaml=None):
         nsst_config = YAMLFile(path=nsst_yaml)
         sfc_fcst = nsst_config['sfc_fcst']
         sfc_ana = nsst_config['sfc_ana']
-        tref_incr = trefincr2mom6(sfc_fcst, sfc_ana, grid)
+        tref_incr = trefincr2mom6(sfc_fcst, sfc_ana, grid, cache_dir=nsst_config.get('remap_cache_dir'))
 
         # get the number of layers used to propagate the incr down the water column
         nlayers = nsst_config['nlayers']
@@ -76,7 +78,41 @@ def socaincr2mom6(incr, bkg, grid, incr_out, nsst_yaml=None):
     return
 
 
-def trefincr2mom6(bkgfile, anlfile, ocngridfile):
+def nearest_indices(src_lons, src_lats, dst_lons, dst_lats, cache_dir=None):
+    """
+    Index, in the flattened source grid, of the nearest source point (in the
+    lon/lat plane, as griddata(method='nearest')) of each destination point.
+
+    The grids are fixed for an experiment; with cache_dir the indices are
+    stored in a .npz file keyed by a hash of both grids and reused.
+    """
+    cache_file = None
+    if cache_dir is not None:
+        digest = hashlib.sha256()
+        for coord in (src_lons, src_lats, dst_lons, dst_lats):
+            coord = np.ascontiguousarray(coord, dtype=np.float64)
+            digest.update(str(coord.shape).encode())
+            digest.update(coord)
+        cache_file = os.path.join(cache_dir, f"nearest_{digest.hexdigest()}.npz")
+        if os.path.isfile(cache_file):
+            with np.load(cache_file) as cache:
+                return cache['indices']
+
+    tree = cKDTree(np.column_stack((src_lons.reshape(-1), src_lats.reshape(-1))))
+    _, indices = tree.query(np.column_stack((dst_lons.reshape(-1), dst_lats.reshape(-1))))
+    indices = indices.reshape(dst_lons.shape)
+
+    if cache_file is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(suffix='.npz', dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, indices=indices)
+        os.replace(tmp_file, cache_file)
+
+    return indices
+
+
+def trefincr2mom6(bkgfile, anlfile, ocngridfile, cache_dir=None):
     """
     Create tref increment from FV3 and interpolate it to MOM6 grid.
 
@@ -84,6 +120,7 @@ def trefincr2mom6(bkgfile, anlfile, ocngridfile):
     bkgfile (str): path to FV3 background file with tref (prob. sfcf006)
     anlfile (str): path to FV3 analysis file with tref (prob. sfcanl)
     ocngridfile (str): path to the MOM6 grid file
+    cache_dir (str): directory where the remapping indices are cached
 
     Returns:
     momtrefinc (2D array): FV3 tref increment on MOM6 grid
@@ -102,15 +139,14 @@ def trefincr2mom6(bkgfile, anlfile, ocngridfile):
 
     # get atmos gaussian grid and rotate to match the ocean grid
     fv3lats = ds_bkg['grid_yt'].values
-    fv3lons = ds_bkg['grid_xt'].values
+    fv3lons = ds_bkg['grid_xt'].values.copy()
     momlon_max = np.max(momlons)
     fv3lons[fv3lons >= momlon_max] = fv3lons[fv3lons >= momlon_max] - 360
     fv3longrid, fv3latgrid = np.meshgrid(fv3lons, fv3lats)
 
-    momtrefinc = griddata((fv3longrid.reshape(-1), fv3latgrid.reshape(-1)),
-                          np.squeeze(incval).reshape(-1),
-                          (momlons, momlats),
-                          method='nearest')
+    # nearest neighbour remapping, a single gather once the indices are known
+    indices = nearest_indices(fv3longrid, fv3latgrid, momlons, momlats, cache_dir=cache_dir)
+    momtrefinc = np.squeeze(incval).reshape(-1)[indices]
 
     return momtrefinc
 